@@ -0,0 +1,99 @@
+"""
+Moves ``DONE`` tasks that have not changed for ``TASK_ARCHIVE['AGE_DAYS']``
+from the task table to the archive table, so the task table and its
+indexes only grow with the open work.
+
+Every batch is its own short transaction that copies the rows and deletes
+them from the task table. Archiving is not a deletion: the tasks keep
+counting in the statistics, leave no tombstone and publish no event. They
+only drop out of the search index, the cache and the default task list,
+and can still be read with ``include_archived`` or by id.
+"""
+import datetime
+import time
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+from .models import ArchivedTask, Task
+from .signals import tasks_archived
+
+DEFAULTS = {
+    'AGE_DAYS': 90,
+    'BATCH_SIZE': 1000,
+    'PAUSE_SECONDS': 0.05,
+}
+
+ARCHIVED_STATUS = 'DONE'
+COPIED_FIELDS = ('id', 'title', 'description', 'status', 'created_at', 'updated_at')
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'TASK_ARCHIVE', {})}
+
+
+def get_cutoff(age_days=None, now=None):
+    if age_days is None:
+        age_days = get_options()['AGE_DAYS']
+    return (now or timezone.now()) - datetime.timedelta(days=age_days)
+
+
+def archivable_tasks(cutoff, using):
+    # Answered from task_status_updated_idx.
+    return Task.objects.using(using).filter(status=ARCHIVED_STATUS, updated_at__lt=cutoff)
+
+
+def archive_batch(cutoff, batch_size, using=None):
+    """Archive up to ``batch_size`` tasks last updated before ``cutoff``. Returns their ids."""
+    using = using or router.db_for_write(Task)
+    with transaction.atomic(using=using):
+        rows = list(
+            archivable_tasks(cutoff, using).select_for_update(skip_locked=True)
+            .order_by('updated_at', 'id').values(*COPIED_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return []
+        now = timezone.now()
+        ArchivedTask.objects.using(using).bulk_create([ArchivedTask(**row, archived_at=now) for row in rows])
+        pks = [row['id'] for row in rows]
+        # A plain DELETE: the post_delete receivers would treat the move as a
+        # deletion (tombstones, counters, events). Chunked to stay well below
+        # SQLITE_MAX_VARIABLE_NUMBER on older builds.
+        with connections[using].cursor() as cursor:
+            for start in range(0, len(pks), 500):
+                chunk = pks[start:start + 500]
+                cursor.execute(
+                    f"DELETE FROM {Task._meta.db_table} WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk,
+                )
+        tasks_archived.send(sender=Task, pks=pks, using=using)
+    return pks
+
+
+def archive_tasks(age_days=None, batch_size=None, max_batches=None, pause=None, using=None, progress=None):
+    """
+    Archive batch after batch until no task is old enough or ``max_batches``
+    ran, sleeping ``pause`` seconds between batches to let other writers in.
+    ``progress(archived)`` is called after every batch. Returns the number
+    of tasks archived.
+    """
+    options = get_options()
+    cutoff = get_cutoff(age_days)
+    batch_size = batch_size or options['BATCH_SIZE']
+    pause = options['PAUSE_SECONDS'] if pause is None else pause
+
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        pks = archive_batch(cutoff, batch_size, using)
+        if not pks:
+            break
+        archived += len(pks)
+        batches += 1
+        if progress:
+            progress(archived)
+        if len(pks) < batch_size:
+            break
+        time.sleep(pause)
+    return archived
+
+
+def count_archivable(age_days=None, using=None):
+    return archivable_tasks(get_cutoff(age_days), using or router.db_for_write(Task)).count()
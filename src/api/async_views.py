@@ -0,0 +1,200 @@
+import json
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError, transaction
+from django.http import HttpResponse, QueryDict, StreamingHttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import Throttled, ValidationError
+from .cache import task_cache
+from .conditional import alist_validators, if_match_passes, is_not_modified, not_modified, set_validators, task_validators
+from .envelopes import (
+    task_create_failed, task_created, task_delete_failed, task_deleted, task_list, task_list_failed, task_list_invalid,
+    task_not_found, task_precondition_failed, task_retrieve_failed, task_retrieve_invalid, task_retrieved,
+    task_update_failed, task_updated,
+)
+from .events import TooManySubscribers, event_stream, get_options, task_events
+from .filters import STATUS_VALUES, sparse_fields
+from .models import Task
+from .serializers import TaskSerializer
+from .streaming import dumps
+from .throttling import TokenBucketThrottle, rate_limited
+from .views import get_list_page, get_list_querysets, get_task_data, locked_task, task_pk, task_rows
+
+
+def render(payload, status_code=status.HTTP_200_OK):
+    return HttpResponse(dumps(payload), status=status_code, content_type='application/json')
+
+
+def parse_body(request):
+    if not request.body:
+        return {}
+    if request.content_type == 'application/json':
+        return json.loads(request.body)
+    return QueryDict(request.body, encoding=request.encoding)
+
+
+class AsyncTaskView(View):
+    """
+    ASGI-native counterpart of ``TaskViewSet`` built on the async ORM.
+
+    Responses use the same envelopes, status codes and JSON encoding as the
+    DRF views so clients can switch between ``/api/tasks/`` and
+    ``/api/async/tasks/`` without any other change; reads share their
+    cache entries and both draw on the same rate limits.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        # The same buckets as the DRF views; taking a token may hit the cache.
+        throttle = TokenBucketThrottle()
+        if not await sync_to_async(throttle.allow_request)(request, self):
+            wait = Throttled(throttle.wait()).wait
+            response = render(rate_limited(wait), status.HTTP_429_TOO_MANY_REQUESTS)
+            if wait:
+                response['Retry-After'] = '%d' % wait
+            return response
+        if request.method in ('POST', 'PUT', 'PATCH'):
+            try:
+                request.data = parse_body(request)
+            except ValueError as e:
+                return render({"detail": f"JSON parse error - {e}"}, status.HTTP_400_BAD_REQUEST)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get_task(self, pk):
+        return await Task.objects.aget(pk=task_pk(pk))
+
+
+class AsyncTaskListView(AsyncTaskView):
+    async def get(self, request):
+        try:
+            queryset, *archived = get_list_querysets(request.GET)
+            validators = await alist_validators(queryset, request.GET, *archived)
+            if is_not_modified(request, *validators):
+                return not_modified(*validators)
+            # Pages are shared with TaskViewSet.list through the task cache.
+            page = await sync_to_async(task_cache.get_list)(request.GET, lambda: get_list_page(request.GET))
+
+            return set_validators(render(*task_list(page)), *validators)
+        except ValidationError as e:
+            return render(*task_list_invalid(e.detail))
+        except DatabaseError:
+            raise
+        except Exception as e:
+            return render(*task_list_failed(e))
+
+    def create(self, request):
+        # As in TaskViewSet.create the insert runs inside a transaction, on a
+        # thread since the async ORM cannot hold one open.
+        serializer = TaskSerializer(data=request.data)
+        try:
+            if not serializer.is_valid():
+                return render(*task_create_failed(serializer.errors))
+
+            with transaction.atomic():
+                serializer.save()
+            return render(*task_created(serializer.data))
+        except DatabaseError:
+            raise
+        except Exception as e:
+            return render(*task_create_failed(serializer.errors))
+
+    async def post(self, request):
+        return await sync_to_async(self.create)(request)
+
+
+class AsyncTaskDetailView(AsyncTaskView):
+    async def get(self, request, pk):
+        try:
+            pk = task_pk(pk)
+            fields = sparse_fields(request.GET, task_rows.field_names)
+            data = await sync_to_async(task_cache.get_task)(pk, lambda: get_task_data(pk))
+            validators = task_validators(data["id"], data["updated_at"])
+            if is_not_modified(request, *validators):
+                return not_modified(*validators)
+
+            task = {name: data[name] for name in fields} if fields else data
+            return set_validators(render(*task_retrieved(task)), *validators)
+        except Task.DoesNotExist:
+            return render(*task_not_found())
+        except ValidationError as e:
+            return render(*task_retrieve_invalid(e.detail))
+        except DatabaseError:
+            raise
+        except Exception as e:
+            return render(*task_retrieve_failed(e))
+
+    def save(self, request, pk, partial):
+        # The async ORM cannot hold a transaction open, so the locked
+        # If-Match comparison and the save run on a thread as in TaskViewSet.
+        serializer = None
+        try:
+            with transaction.atomic():
+                task = locked_task(task_pk(pk))
+                if not if_match_passes(request, task_validators(task.pk, task.updated_at)[0]):
+                    return render(*task_precondition_failed())
+                serializer = TaskSerializer(task, data=request.data, partial=partial)
+                if not serializer.is_valid():
+                    return render(*task_update_failed(serializer.errors))
+                task = serializer.save()
+            return set_validators(render(*task_updated(serializer.data)), *task_validators(task.pk, task.updated_at))
+        except Task.DoesNotExist:
+            return render(*task_not_found())
+        except DatabaseError:
+            raise
+        except Exception as e:
+            return render(*task_update_failed(serializer.errors if serializer else {}))
+
+    async def put(self, request, pk):
+        return await sync_to_async(self.save)(request, pk, partial=False)
+
+    async def patch(self, request, pk):
+        return await sync_to_async(self.save)(request, pk, partial=True)
+
+    async def delete(self, request, pk):
+        try:
+            task = await self.get_task(pk)
+            await task.adelete()
+
+            return render(*task_deleted())
+        except Task.DoesNotExist:
+            return render(*task_not_found())
+        except DatabaseError:
+            raise
+        except Exception as e:
+            return render(*task_delete_failed(e))
+
+
+class AsyncTaskEventsView(View):
+    """
+    Server-Sent Events stream of task changes: ``task.created``,
+    ``task.updated`` (with ``previous_status``) and ``task.deleted``.
+
+    ``?status=DONE,PENDING`` limits the stream to events for tasks that are
+    in, or have just left, one of those statuses. A client that falls too far
+    behind receives an ``overflow`` event and is disconnected; it should
+    catch up through ``/api/tasks/changes/`` before reconnecting. Serve this
+    over ASGI: under WSGI every open stream holds a worker thread.
+    """
+
+    async def get(self, request):
+        statuses = [value for value in request.GET.get('status', '').split(',') if value]
+        invalid = [value for value in statuses if value not in STATUS_VALUES]
+        if invalid:
+            return render({
+                "code": "API_TASK_EVENTS_ERROR",
+                "message": "Invalid event stream parameters.",
+                "errors": {"status": [f"Must be one of: {', '.join(STATUS_VALUES)}."]}
+            }, status.HTTP_400_BAD_REQUEST)
+
+        broker = task_events.get()
+        try:
+            subscriber = broker.subscribe(statuses)
+        except TooManySubscribers:
+            return render({
+                "code": "API_TASK_EVENTS_UNAVAILABLE",
+                "message": "Too many event stream clients, retry later."
+            }, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        response = StreamingHttpResponse(event_stream(broker, subscriber, get_options()), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,191 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Latencies are collected in seconds and reported in milliseconds.
+"""
+import asyncio
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test.utils import setup_databases, teardown_databases
+from .models import STATUS_OPTIONS, Task
+from .signals import tasks_bulk_saved
+
+# Benchmarks drive the API from a single client address as fast as they
+# can; override these settings so the rate limits and load shedding do not
+# cut them short.
+NO_LIMITS = {
+    'API_THROTTLE': {'ENABLED': False},
+    'LOAD_SHEDDING': {'ENABLED': False},
+}
+
+# Seeded titles and descriptions are drawn from this vocabulary, plus one
+# rare ``ref<n>`` token per task, so text search sees both broad and
+# selective terms.
+WORDS = (
+    'account', 'admin', 'alert', 'api', 'audit', 'backup', 'billing', 'bug', 'build', 'cache',
+    'client', 'cleanup', 'config', 'crash', 'customer', 'dashboard', 'database', 'deploy', 'design', 'docs',
+    'email', 'error', 'export', 'feature', 'feedback', 'fix', 'frontend', 'import', 'index', 'invoice',
+    'latency', 'login', 'logs', 'meeting', 'metrics', 'migration', 'mobile', 'monitoring', 'network', 'onboarding',
+    'outage', 'password', 'payment', 'performance', 'plan', 'release', 'report', 'review', 'roadmap', 'search',
+    'security', 'server', 'signup', 'storage', 'support', 'sync', 'test', 'ticket', 'timeout', 'upgrade',
+)
+
+
+@contextmanager
+def benchmark_databases():
+    """
+    Run the block against freshly migrated test databases, created and
+    destroyed as the test runner does, so a benchmark neither changes the
+    development data nor depends on what it holds.
+    """
+    config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(config, verbosity=0)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies, default=0) * 1000, 2),
+    }
+
+
+def seed_tasks(count, batch_size=1000):
+    """Insert tasks until the table holds at least ``count`` rows."""
+    statuses = [value for value, _ in STATUS_OPTIONS]
+    existing = Task.objects.count()
+    rng = random.Random(existing)
+    for start in range(existing, count, batch_size):
+        tasks = Task.objects.bulk_create([
+            Task(
+                title=f"{' '.join(rng.choices(WORDS, k=3))} {i}",
+                description=f"{' '.join(rng.choices(WORDS, k=12))} ref{rng.randrange(count)}",
+                status=statuses[i % len(statuses)],
+            )
+            for i in range(start, min(start + batch_size, count))
+        ])
+        tasks_bulk_saved.send(sender=Task, instances=tasks, created=True)
+    return max(count - existing, 0)
+
+
+def seed_users(count, batch_size=1000):
+    """Insert users until the table holds at least ``count`` rows."""
+    password = make_password(None)
+    existing = User.objects.count()
+    for start in range(existing, count, batch_size):
+        User.objects.bulk_create([
+            User(username=f'benchmark-user-{i}', email=f'user{i}@example.com', password=password)
+            for i in range(start, min(start + batch_size, count))
+        ])
+    return max(count - existing, 0)
+
+
+def compare_results(baseline, current, threshold):
+    """
+    Compare two result sets endpoint by endpoint. Returns a list of
+    human-readable regressions: p95 latency or query count above the
+    baseline, or throughput below it, by more than ``threshold``.
+    """
+    regressions = []
+    for name, result in current.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if base['p95_ms'] and result['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms > baseline {base['p95_ms']} ms")
+        if result['throughput_rps'] < base['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{name}: throughput {result['throughput_rps']} rps < baseline {base['throughput_rps']} rps")
+        if result.get('queries', 0) > base.get('queries', 0):
+            regressions.append(f"{name}: {result['queries']} queries > baseline {base.get('queries', 0)}")
+    return regressions
+
+
+def run_threaded(make_call, requests, concurrency):
+    """
+    Run ``requests`` calls spread over ``concurrency`` threads. ``make_call``
+    is invoked once per thread and returns the callable to time; the callable
+    returns a truthy value on success.
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker():
+        nonlocal errors
+        call = make_call()
+        local, failed = [], 0
+        try:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        break
+                started = time.perf_counter()
+                ok = call()
+                local.append(time.perf_counter() - started)
+                failed += not ok
+        finally:
+            connections.close_all()
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def run_async(make_call, requests, concurrency):
+    """Asyncio counterpart of ``run_threaded`` for coroutine callables."""
+    async def main():
+        latencies = []
+        errors = 0
+        remaining = iter(range(requests))
+
+        async def worker():
+            nonlocal errors
+            call = make_call()
+            while next(remaining, None) is not None:
+                started = time.perf_counter()
+                ok = await call()
+                latencies.append(time.perf_counter() - started)
+                errors += not ok
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(latencies, time.perf_counter() - started, errors)
+
+    return asyncio.run(main())
+
+
+def print_table(stdout, results):
+    columns = ['throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'errors']
+    width = max(len(name) for name in results) + 2
+    stdout.write('scenario'.ljust(width) + ''.join(column.rjust(16) for column in columns))
+    for name, result in results.items():
+        stdout.write(name.ljust(width) + ''.join(str(result[column]).rjust(16) for column in columns))
@@ -0,0 +1,268 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .hashing import password_hashing_pool
+from .models import Task
+from .serializers import TaskSerializer, UserSerializer
+from .signals import tasks_bulk_saved
+
+
+class BulkResult:
+    def __init__(self):
+        self.objects = []
+        self.errors = []
+
+    def add_error(self, index, errors, pk=None):
+        error = {"index": index, "errors": errors}
+        if pk is not None:
+            error["id"] = pk
+        self.errors.append(error)
+
+
+def batch_size():
+    return getattr(settings, 'TASK_BULK_BATCH_SIZE', 500)
+
+
+def batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def stamp_tasks(tasks):
+    """
+    Stamp ``updated_at`` on ``tasks`` as the last write to their rows.
+
+    The change feed only holds back the last ``TASK_CHANGES_SETTLE_SECONDS``,
+    while a large bulk transaction can run for much longer. A stamp taken
+    when the rows were first written could already be behind the feed by
+    the time they commit, so the rows are restamped once everything else
+    has been written.
+    """
+    now = timezone.now()
+    for chunk in batches(tasks, batch_size()):
+        Task.objects.filter(id__in=[task.pk for task in chunk]).update(updated_at=now)
+    for task in tasks:
+        task.updated_at = now
+
+
+def get_items(data, key):
+    if not isinstance(data, dict) or not isinstance(data.get(key), list):
+        raise ValidationError({key: ["Expected a list of items."]})
+    items = data[key]
+    max_items = getattr(settings, 'TASK_BULK_MAX_ITEMS', 50000)
+    if len(items) > max_items:
+        raise ValidationError({key: [f"Ensure this list has no more than {max_items} items."]})
+    return items
+
+
+def is_atomic(data):
+    atomic = data.get('atomic', True)
+    if not isinstance(atomic, bool):
+        raise ValidationError({'atomic': ["Must be a boolean."]})
+    return atomic
+
+
+def bulk_create_tasks(items, atomic):
+    """
+    Validate ``items`` with ``TaskSerializer(many=True)`` and insert them with
+    ``bulk_create``. In atomic mode nothing is written if any item is invalid;
+    otherwise the valid items are written and the rest reported.
+    """
+    result = BulkResult()
+    serializer = TaskSerializer(data=items, many=True)
+    if serializer.is_valid():
+        valid = serializer.validated_data
+    else:
+        errors = serializer.errors
+        # Depending on the DRF version, list errors are either a list aligned
+        # with the input or a mapping that only holds the failing indexes.
+        if isinstance(errors, list):
+            errors = dict(enumerate(errors))
+        for index in sorted(errors):
+            if errors[index]:
+                result.add_error(index, errors[index])
+        if atomic:
+            return result
+        failed = {error["index"] for error in result.errors}
+        child = serializer.child
+        valid = [child.run_validation(item) for index, item in enumerate(items) if index not in failed]
+
+    with transaction.atomic():
+        result.objects = Task.objects.bulk_create([Task(**attrs) for attrs in valid], batch_size=batch_size())
+        stamp_tasks(result.objects)
+        tasks_bulk_saved.send(sender=Task, instances=result.objects, created=True)
+    return result
+
+
+def bulk_update_tasks(items, atomic):
+    """
+    Apply partial updates ``[{"id": ..., <fields>}, ...]`` with one
+    ``in_bulk`` lookup and one ``bulk_update`` per batch of tasks that
+    change the same fields, so no row is written a field it was not sent.
+    """
+    result = BulkResult()
+    size = batch_size()
+
+    ids = []
+    for index, item in enumerate(items):
+        pk = item.get('id') if isinstance(item, dict) else None
+        if not isinstance(pk, int) or isinstance(pk, bool):
+            result.add_error(index, {"id": ["A valid integer is required."]})
+            pk = None
+        ids.append(pk)
+
+    tasks = {}
+    valid_ids = [pk for pk in ids if pk is not None]
+    for chunk in batches(valid_ids, size):
+        tasks.update(Task.objects.in_bulk(chunk))
+
+    changed = {}
+    fields = {}
+    for index, item in enumerate(items):
+        pk = ids[index]
+        if pk is None:
+            continue
+        task = tasks.get(pk)
+        if task is None:
+            result.add_error(index, {"id": ["Task does not exist."]}, pk)
+            continue
+        serializer = TaskSerializer(task, data=item, partial=True)
+        if not serializer.is_valid():
+            result.add_error(index, serializer.errors, pk)
+            continue
+        for attr, value in serializer.validated_data.items():
+            setattr(task, attr, value)
+        fields.setdefault(pk, set()).update(serializer.validated_data)
+        changed[pk] = task
+
+    if result.errors and atomic:
+        result.errors.sort(key=lambda error: error["index"])
+        return result
+
+    groups = {}
+    for pk, task in changed.items():
+        if fields[pk]:
+            groups.setdefault(tuple(sorted(fields[pk])), []).append(task)
+    changed = list(changed.values())
+
+    with transaction.atomic():
+        for group_fields, group in groups.items():
+            Task.objects.bulk_update(group, group_fields, batch_size=size)
+        stamp_tasks(changed)
+        tasks_bulk_saved.send(sender=Task, instances=changed, created=False)
+    result.objects = changed
+    result.errors.sort(key=lambda error: error["index"])
+    return result
+
+
+def set_task_status(ids, status):
+    """
+    Move the tasks in ``ids`` that are not in ``status`` yet to ``status``.
+    Returns the number of tasks changed.
+    """
+    with transaction.atomic():
+        tasks = list(Task.objects.select_for_update().filter(id__in=ids).exclude(status=status))
+        for task in tasks:
+            task.status = status
+        Task.objects.bulk_update(tasks, ['status'], batch_size=batch_size())
+        stamp_tasks(tasks)
+        tasks_bulk_saved.send(sender=Task, instances=tasks, created=False)
+    return len(tasks)
+
+
+def bulk_delete_tasks(ids, atomic):
+    """Delete tasks by id with one filtered ``DELETE`` per batch."""
+    result = BulkResult()
+    size = batch_size()
+
+    valid = []
+    for index, pk in enumerate(ids):
+        if not isinstance(pk, int) or isinstance(pk, bool):
+            result.add_error(index, {"id": ["A valid integer is required."]})
+        else:
+            valid.append((index, pk))
+
+    existing = set()
+    for chunk in batches([pk for _, pk in valid], size):
+        existing.update(Task.objects.filter(id__in=chunk).values_list('id', flat=True))
+
+    for index, pk in valid:
+        if pk not in existing:
+            result.add_error(index, {"id": ["Task does not exist."]}, pk)
+
+    if result.errors and atomic:
+        result.errors.sort(key=lambda error: error["index"])
+        return result
+
+    deleted = sorted(existing)
+    with transaction.atomic():
+        for chunk in batches(deleted, size):
+            Task.objects.filter(id__in=chunk).delete()
+    result.objects = deleted
+    result.errors.sort(key=lambda error: error["index"])
+    return result
+
+
+def bulk_create_users(items, atomic, hash_passwords=True):
+    """
+    Validate ``items`` with ``UserSerializer(many=True)``, hash every password
+    in parallel on the password hashing pool and insert the users and their
+    group/permission links with ``bulk_create``. With ``hash_passwords=False``
+    the passwords are taken to be ``make_password`` hashes already.
+    """
+    result = BulkResult()
+    serializer = UserSerializer(data=items, many=True)
+    if serializer.is_valid():
+        valid = list(enumerate(serializer.validated_data))
+    else:
+        errors = serializer.errors
+        if isinstance(errors, list):
+            errors = dict(enumerate(errors))
+        for index in sorted(errors):
+            if errors[index]:
+                result.add_error(index, errors[index])
+        if atomic:
+            return result
+        failed = {error["index"] for error in result.errors}
+        child = serializer.child
+        valid = [(index, child.run_validation(item)) for index, item in enumerate(items) if index not in failed]
+
+    seen = set()
+    unique = []
+    for index, attrs in valid:
+        if attrs['username'] in seen:
+            result.add_error(index, {"username": ["Duplicate username in this request."]})
+        else:
+            seen.add(attrs['username'])
+            unique.append(attrs)
+    if result.errors:
+        result.errors.sort(key=lambda error: error["index"])
+        if atomic:
+            return result
+
+    passwords = [attrs.get('password', '') for attrs in unique]
+    if hash_passwords:
+        passwords = password_hashing_pool.hash_many(passwords)
+
+    users, links = [], []
+    for attrs, password in zip(unique, passwords):
+        attrs = dict(attrs)
+        links.append((attrs.pop('groups', []), attrs.pop('user_permissions', [])))
+        users.append(User(**{**attrs, 'password': password}))
+
+    size = batch_size()
+    with transaction.atomic():
+        users = User.objects.bulk_create(users, batch_size=size)
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=user.pk, group_id=group.pk)
+            for user, (groups, _) in zip(users, links) for group in groups
+        ], batch_size=size)
+        User.user_permissions.through.objects.bulk_create([
+            User.user_permissions.through(user_id=user.pk, permission_id=permission.pk)
+            for user, (_, permissions) in zip(users, links) for permission in permissions
+        ], batch_size=size)
+
+    result.objects = users
+    return result
@@ -0,0 +1,157 @@
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from .metrics import registry
+from .routers import primary_reads
+
+MISSING = object()
+
+DEFAULTS = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LOCK_TIMEOUT': 5,
+    'LOCK_POLL_INTERVAL': 0.05,
+    'KEY_PREFIX': 'api',
+}
+
+
+class TaskCache:
+    """
+    Read-through cache for task payloads on top of Django's cache framework.
+
+    Single tasks are stored under their id. List pages are stored under a
+    hash of the normalized query string combined with a generation number;
+    any write bumps the generation, which orphans every cached page at once
+    and lets the backend evict them through their TTL.
+
+    Misses are computed by a single caller per key: the first caller takes a
+    short-lived lock with ``cache.add`` and the others wait for its result
+    instead of all hitting the database at the same time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    @property
+    def options(self):
+        return {**DEFAULTS, **getattr(settings, 'TASK_CACHE', {})}
+
+    @property
+    def cache(self):
+        return caches[self.options['ALIAS']]
+
+    def make_key(self, *parts):
+        return ':'.join([self.options['KEY_PREFIX'], *map(str, parts)])
+
+    def record(self, kind, outcome):
+        with self.lock:
+            counters = self.stats.setdefault(kind, {'hits': 0, 'misses': 0})
+            counters[outcome] += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {kind: dict(counters) for kind, counters in self.stats.items()}
+
+    def collect_metrics(self):
+        stats = self.get_stats()
+        return [
+            (f'api_task_cache_{outcome}_total', 'counter', f'Task cache {outcome} by entry kind.', [
+                ({'kind': kind}, counters[outcome]) for kind, counters in sorted(stats.items())
+            ])
+            for outcome in ('hits', 'misses')
+        ]
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {}
+
+    def generation(self):
+        # Seeded from the clock so that a generation key lost to eviction
+        # never comes back with a value whose pages are still cached.
+        key = self.make_key('tasks', 'generation')
+        value = self.cache.get(key)
+        if value is None:
+            self.cache.add(key, time.time_ns(), timeout=None)
+            value = self.cache.get(key, 0)
+        return value
+
+    def task_key(self, pk):
+        return self.make_key('task', pk)
+
+    def list_key(self, query_params):
+        normalized = '&'.join(
+            f'{name}={value}'
+            for name in sorted(query_params)
+            for value in sorted(query_params.getlist(name))
+        )
+        digest = hashlib.sha1(normalized.encode()).hexdigest()
+        return self.make_key('tasks', 'list', self.generation(), digest)
+
+    def get_or_compute(self, kind, key, compute):
+        options = self.options
+        if not options['ENABLED']:
+            return compute()
+
+        cache = self.cache
+        value = cache.get(key, MISSING)
+        if value is not MISSING:
+            self.record(kind, 'hits')
+            return value
+        self.record(kind, 'misses')
+
+        lock_key = f'{key}:lock'
+        if not cache.add(lock_key, 1, timeout=options['LOCK_TIMEOUT']):
+            deadline = time.monotonic() + options['LOCK_TIMEOUT']
+            while time.monotonic() < deadline:
+                time.sleep(options['LOCK_POLL_INTERVAL'])
+                value = cache.get(key, MISSING)
+                if value is not MISSING:
+                    return value
+                if cache.add(lock_key, 1, timeout=options['LOCK_TIMEOUT']):
+                    break
+            else:
+                return self.compute_on_primary(compute)
+
+        try:
+            generation = self.generation()
+            value = self.compute_on_primary(compute)
+            cache.set(key, value, timeout=options['TIMEOUT'])
+            # Every write bumps the generation when it commits. If one did
+            # while the value was computed, the value may predate it and its
+            # invalidation may have run before the set, so drop the value.
+            if self.generation() != generation:
+                cache.delete(key)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    def compute_on_primary(self, compute):
+        # A cached value can outlive replication lag, so never fill the
+        # cache from a replica that has not caught up with the last write.
+        with primary_reads():
+            return compute()
+
+    def get_task(self, pk, compute):
+        return self.get_or_compute('task', self.task_key(pk), compute)
+
+    def get_list(self, query_params, compute):
+        return self.get_or_compute('list', self.list_key(query_params), compute)
+
+    def invalidate_lists(self):
+        key = self.make_key('tasks', 'generation')
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, time.time_ns(), timeout=None)
+
+    def invalidate_tasks(self, pks):
+        self.cache.delete_many([self.task_key(pk) for pk in pks])
+        self.invalidate_lists()
+
+
+task_cache = TaskCache()
+registry.register_collector(task_cache.collect_metrics)
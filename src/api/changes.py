@@ -0,0 +1,132 @@
+import datetime
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from .models import Task, TaskTombstone
+from .pagination import PageSizeMixin, decode_cursor, encode_cursor
+
+
+class ResyncRequired(Exception):
+    """Deletions after the resume token may already have been pruned."""
+
+
+def keyset_after(queryset, field, position, upper):
+    """Rows strictly after ``position`` in ``(field, id)`` order, up to ``upper``."""
+    queryset = queryset.filter(**{f'{field}__lte': upper})
+    if position is not None:
+        value, pk = position
+        queryset = queryset.filter(**{f'{field}__gte': value}).filter(
+            Q(**{f'{field}__gt': value}) | Q(id__gt=pk))
+    return queryset.order_by(field, 'id')
+
+
+class TaskChangeFeed(PageSizeMixin):
+    """
+    Merges task updates and deletion tombstones into one stream ordered by
+    time.
+
+    Tasks are read by ``(updated_at, id)`` and tombstones by
+    ``(deleted_at, id)``. Both are keyset scans over an index, so a sync
+    costs time in proportion to the number of changes and not to the size
+    of the table. The resume token carries the last position reached in each
+    stream and only moves forward.
+
+    Changes from the last ``TASK_CHANGES_SETTLE_SECONDS`` are held back, so
+    a transaction that stamped an earlier ``updated_at`` but committed late
+    is not skipped. The bulk writes stamp their rows last (see
+    ``api.bulk.stamp_tasks``), so the window has to cover the end of a
+    transaction rather than all of it.
+    """
+    since_query_param = 'since'
+
+    def decode_position(self, value):
+        if value is None:
+            return None
+        moment, pk = value
+        moment = parse_datetime(moment)
+        if moment is None:
+            raise ValueError(value)
+        return moment, int(pk)
+
+    def decode_token(self, token):
+        try:
+            payload = decode_cursor(token)
+            complete = payload['c'] and parse_datetime(payload['c'])
+            if payload['c'] and complete is None:
+                raise ValueError(payload['c'])
+            return self.decode_position(payload['t']), self.decode_position(payload['d']), complete
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise ValidationError({self.since_query_param: ["Invalid resume token."]})
+
+    def encode_token(self, task_position, tombstone_position, complete):
+        def encode(position):
+            return None if position is None else [position[0].isoformat(), position[1]]
+        return encode_cursor({
+            't': encode(task_position),
+            'd': encode(tombstone_position),
+            'c': complete and complete.isoformat(),
+        })
+
+    def get_changes(self, rows_queryset, params, serialize):
+        """
+        Return ``(changes, next_token, has_more)``. ``rows_queryset`` turns a
+        task queryset into named rows and ``serialize`` renders those rows.
+        """
+        token = params.get(self.since_query_param)
+        task_position, tombstone_position, complete = self.decode_token(token) if token else (None, None, None)
+        page_size = self.get_page_size(params)
+
+        # ``complete`` is the time up to which the client has seen every
+        # tombstone. If tombstones after it may have been pruned, deletions
+        # would be lost, so the client has to start over.
+        now = timezone.now()
+        retention = datetime.timedelta(days=getattr(settings, 'TASK_TOMBSTONE_RETENTION_DAYS', 30))
+        if complete and complete < now - retention:
+            raise ResyncRequired()
+        upper = now - datetime.timedelta(seconds=getattr(settings, 'TASK_CHANGES_SETTLE_SECONDS', 5))
+
+        tasks = list(rows_queryset(keyset_after(Task.objects.all(), 'updated_at', task_position, upper))[:page_size + 1])
+        tombstones = list(
+            keyset_after(TaskTombstone.objects.all(), 'deleted_at', tombstone_position, upper)
+            .values_list('deleted_at', 'id', 'task_id')[:page_size + 1]
+        )
+
+        events = sorted(
+            [(row.updated_at, 0, row.id, row) for row in tasks]
+            + [(deleted_at, 1, pk, task_id) for deleted_at, pk, task_id in tombstones],
+            key=lambda event: event[:3],
+        )
+        has_more = len(events) > page_size
+        events = events[:page_size]
+
+        updated_rows = []
+        consumed_tombstones = 0
+        for moment, kind, pk, payload in events:
+            if kind == 0:
+                task_position = (moment, pk)
+                updated_rows.append(payload)
+            else:
+                tombstone_position = (moment, pk)
+                consumed_tombstones += 1
+        if consumed_tombstones == len(tombstones):
+            complete = upper
+        elif tombstone_position is not None:
+            complete = tombstone_position[0]
+        rendered = iter(serialize(updated_rows))
+
+        changes = []
+        for moment, kind, pk, payload in events:
+            if kind == 0:
+                changes.append({"type": "upsert", "task": next(rendered)})
+            else:
+                changes.append({"type": "delete", "id": payload, "deleted_at": moment})
+        return changes, self.encode_token(task_position, tombstone_position, complete), has_more
+
+
+def prune_tombstones(now=None):
+    now = now or timezone.now()
+    cutoff = now - datetime.timedelta(days=getattr(settings, 'TASK_TOMBSTONE_RETENTION_DAYS', 30))
+    deleted, _ = TaskTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
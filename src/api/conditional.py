@@ -0,0 +1,82 @@
+import hashlib
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+
+LIST_AGGREGATES = {'last_modified': Max('updated_at'), 'count': Count('id')}
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(':'.join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def task_validators(pk, updated_at):
+    """Return ``(etag, last_modified)`` for a single task."""
+    if isinstance(updated_at, str):
+        updated_at = parse_datetime(updated_at)
+    return make_etag('task', pk, updated_at.timestamp()), updated_at.timestamp()
+
+
+def list_validators(queryset, query_params, *querysets):
+    """
+    Return ``(etag, last_modified)`` for a filtered task list.
+
+    The validator is built from ``MAX(updated_at)`` and ``COUNT(*)`` over the
+    filtered queryset plus the query parameters, so it changes whenever a
+    matching task is created, updated or deleted, without loading any rows.
+    Further ``querysets`` listed together with the first are aggregated too.
+    """
+    aggregates = [other.order_by().aggregate(**LIST_AGGREGATES) for other in (queryset, *querysets)]
+    return list_etag(combine_aggregates(aggregates), query_params)
+
+
+async def alist_validators(queryset, query_params, *querysets):
+    aggregates = [await other.order_by().aaggregate(**LIST_AGGREGATES) for other in (queryset, *querysets)]
+    return list_etag(combine_aggregates(aggregates), query_params)
+
+
+def combine_aggregates(aggregates):
+    return {
+        'count': sum(aggregate['count'] for aggregate in aggregates),
+        'last_modified': max(filter(None, [aggregate['last_modified'] for aggregate in aggregates]), default=None),
+    }
+
+
+def list_etag(aggregate, query_params):
+    last_modified = aggregate['last_modified']
+    params = sorted((name, value) for name in query_params for value in query_params.getlist(name))
+    timestamp = last_modified.timestamp() if last_modified else None
+    return make_etag('tasks', aggregate['count'], timestamp, params), timestamp
+
+
+def is_not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags or f'W/{etag}' in etags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    if if_modified_since is not None and last_modified is not None:
+        return int(last_modified) <= if_modified_since
+    return False
+
+
+def if_match_passes(request, etag):
+    if_match = request.META.get('HTTP_IF_MATCH')
+    if not if_match:
+        return True
+    etags = parse_etags(if_match)
+    return '*' in etags or etag in etags
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def not_modified(etag, last_modified):
+    return set_validators(HttpResponseNotModified(), etag, last_modified)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from .metrics import record_query
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """Apply ``SQLITE_PRAGMAS`` to every new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    """Let PerformanceMiddleware time the queries of every connection."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
@@ -0,0 +1,116 @@
+"""
+Response envelopes for single tasks and the task list, shared by the DRF
+views and their async counterparts so both answer with the same codes and
+messages. Each returns ``(payload, status)``, ready for ``Response(*...)``
+or ``render(*...)``.
+"""
+from rest_framework import status
+
+
+def task_created(task):
+    return {
+        "code": "API_TASK_CREATE_SUCCESS",
+        "message": "Task created successfully",
+        "task": task
+    }, status.HTTP_201_CREATED
+
+
+def task_create_failed(errors):
+    return {
+        "code": "API_TASK_CREATE_ERROR",
+        "message": "Failed to create task",
+        "errors": errors
+    }, status.HTTP_400_BAD_REQUEST
+
+
+def task_retrieved(task):
+    return {
+        "code": "API_TASK_RETRIEVE_SUCCESS",
+        "message": "Task retrieved successfully",
+        "task": task
+    }, status.HTTP_200_OK
+
+
+def task_retrieve_invalid(errors):
+    return {
+        "code": "API_TASK_RETRIEVE_ERROR",
+        "message": "Invalid retrieve parameters.",
+        "errors": errors
+    }, status.HTTP_400_BAD_REQUEST
+
+
+def task_retrieve_failed(error):
+    return {
+        "code": "API_TASK_RETRIEVE_ERROR",
+        "message": "Failed to retrieve task.",
+        "error": str(error)
+    }, status.HTTP_400_BAD_REQUEST
+
+
+def task_updated(task):
+    return {
+        "code": "API_TASK_UPDATE_SUCCESS",
+        "message": "Task updated successfully",
+        "task": task
+    }, status.HTTP_200_OK
+
+
+def task_update_failed(errors):
+    return {
+        "code": "API_TASK_UPDATE_ERROR",
+        "message": "Failed to update task",
+        "errors": errors
+    }, status.HTTP_400_BAD_REQUEST
+
+
+def task_precondition_failed():
+    return {
+        "code": "API_TASK_PRECONDITION_FAILED",
+        "message": "Task has been modified since it was retrieved."
+    }, status.HTTP_412_PRECONDITION_FAILED
+
+
+def task_deleted():
+    return {
+        "code": "API_TASK_DELETE_SUCCESS",
+        "message": "Task deleted successfully"
+    }, status.HTTP_204_NO_CONTENT
+
+
+def task_delete_failed(error):
+    return {
+        "code": "API_TASK_DELETE_ERROR",
+        "message": "Failed to delete task.",
+        "error": str(error)
+    }, status.HTTP_400_BAD_REQUEST
+
+
+def task_not_found():
+    return {
+        "code": "API_TASK_NOT_FOUND",
+        "message": "Task not found"
+    }, status.HTTP_404_NOT_FOUND
+
+
+def task_list(page):
+    return {
+        "code": "API_TASK_LIST_SUCCESS",
+        "message": "Tasks retrieved successfully",
+        **page
+    }, status.HTTP_200_OK
+
+
+def task_list_invalid(errors):
+    return {
+        "code": "API_TASK_LIST_ERROR",
+        "message": "Invalid list parameters.",
+        "errors": errors
+    }, status.HTTP_400_BAD_REQUEST
+
+
+def task_list_failed(error):
+    return {
+        "code": "API_TASK_LIST_ERROR",
+        "message": "Failed to retrieve tasks.",
+        "error": str(error)
+    }, status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import threading
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from .metrics import registry
+from .streaming import dumps
+
+DEFAULTS = {
+    'BROKER': 'api.events.InMemoryBroker',
+    'BROKER_URL': '',
+    'CHANNEL': 'api:task-events',
+    'QUEUE_SIZE': 256,
+    'MAX_SUBSCRIBERS': 10000,
+    'HEARTBEAT_SECONDS': 15,
+    'RETRY_MILLISECONDS': 3000,
+}
+
+# Put on a subscriber queue in place of events that did not fit.
+OVERFLOW = object()
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'TASK_EVENTS', {})}
+
+
+def make_event(kind, data, statuses):
+    """
+    Build a broker message. ``data`` is encoded once here rather than once
+    per subscriber, and ``statuses`` lists the statuses the event is
+    relevant to, for the subscribers' status filters.
+    """
+    return {
+        'event': f'task.{kind}',
+        'statuses': sorted(set(statuses)),
+        'data': dumps(data),
+    }
+
+
+class Subscriber:
+    """
+    One streaming client. Events are delivered on the subscriber's own event
+    loop into a bounded queue; a client that falls ``QUEUE_SIZE`` events
+    behind is cut off with an overflow marker instead of buffering without
+    limit.
+    """
+
+    def __init__(self, loop, statuses, queue_size):
+        self.loop = loop
+        self.statuses = set(statuses)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def wants(self, event):
+        return not self.statuses or not self.statuses.isdisjoint(event['statuses'])
+
+    def deliver(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+            registry.inc('api_task_event_overflows_total', {})
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class InMemoryBroker:
+    """
+    Fans events out to the subscribers of this process.
+
+    ``publish`` may be called from any thread. Other brokers share events
+    between worker processes by overriding ``publish`` to send the message
+    to an external bus and calling ``dispatch`` for every message received
+    from it.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.lock = threading.Lock()
+        self.subscribers = set()
+
+    def subscribe(self, statuses=()):
+        with self.lock:
+            if len(self.subscribers) >= self.options['MAX_SUBSCRIBERS']:
+                raise TooManySubscribers()
+            subscriber = Subscriber(asyncio.get_running_loop(), statuses, self.options['QUEUE_SIZE'])
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def publish(self, event):
+        self.dispatch(event)
+
+    def dispatch(self, event):
+        with self.lock:
+            subscribers = [subscriber for subscriber in self.subscribers if subscriber.wants(event)]
+        loops = {}
+        for subscriber in subscribers:
+            loops.setdefault(subscriber.loop, []).append(subscriber)
+        # One callback per event loop rather than one per subscriber.
+        for loop, targets in loops.items():
+            try:
+                loop.call_soon_threadsafe(deliver_all, targets, event)
+            except RuntimeError:
+                # The loop was closed under a subscriber that never left.
+                for subscriber in targets:
+                    self.unsubscribe(subscriber)
+        registry.inc('api_task_events_published_total', {'event': event['event']})
+
+    def close(self):
+        pass
+
+
+def deliver_all(subscribers, event):
+    for subscriber in subscribers:
+        subscriber.deliver(event)
+
+
+class RedisBroker(InMemoryBroker):
+    """
+    Shares events between processes through a Redis pub/sub channel. Every
+    process publishes to the channel and a listener thread dispatches what
+    it receives, its own messages included, to the local subscribers.
+    """
+
+    def __init__(self, options):
+        super().__init__(options)
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("RedisBroker requires the 'redis' package.")
+        if not options['BROKER_URL']:
+            raise ImproperlyConfigured("RedisBroker requires TASK_EVENTS['BROKER_URL'].")
+        self.client = redis.Redis.from_url(options['BROKER_URL'])
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(**{options['CHANNEL']: self.receive})
+        self.listener = self.pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def publish(self, event):
+        self.client.publish(self.options['CHANNEL'], json.dumps(event))
+
+    def receive(self, message):
+        self.dispatch(json.loads(message['data']))
+
+    def close(self):
+        self.listener.stop()
+        self.pubsub.close()
+
+
+class BrokerHandle:
+    """Lazily builds the broker configured in ``TASK_EVENTS``."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.broker = None
+
+    def get(self):
+        with self.lock:
+            if self.broker is None:
+                options = get_options()
+                self.broker = import_string(options['BROKER'])(options)
+            return self.broker
+
+    def reset(self):
+        with self.lock:
+            if self.broker is not None:
+                self.broker.close()
+            self.broker = None
+
+
+task_events = BrokerHandle()
+registry.describe('api_task_events_published_total', 'counter', 'Task events published to the broker.')
+registry.describe('api_task_event_overflows_total', 'counter', 'Event stream clients disconnected for falling behind.')
+registry.register_collector(lambda: [(
+    'api_task_event_subscribers', 'gauge', 'Event stream clients connected to this process.',
+    [({}, task_events.broker.subscriber_count() if task_events.broker else 0)],
+)])
+
+
+def format_sse(event):
+    return f"event: {event['event']}\ndata: {event['data']}\n\n".encode()
+
+
+async def event_stream(broker, subscriber, options):
+    """
+    Yield Server-Sent Events for ``subscriber`` until the client goes away,
+    with a comment line every ``HEARTBEAT_SECONDS`` to keep idle
+    connections and proxies alive.
+    """
+    try:
+        yield f"retry: {options['RETRY_MILLISECONDS']}\n\n".encode()
+        while True:
+            try:
+                event = await subscriber.get(options['HEARTBEAT_SECONDS'])
+            except asyncio.TimeoutError:
+                yield b': heartbeat\n\n'
+                continue
+            if event is OVERFLOW:
+                yield format_sse({'event': 'overflow', 'data': dumps({
+                    "code": "API_TASK_EVENTS_OVERFLOW",
+                    "message": "Too many pending events. Resync with /api/tasks/changes/ and reconnect."
+                })})
+                return
+            yield format_sse(event)
+    finally:
+        broker.unsubscribe(subscriber)
@@ -0,0 +1,118 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from .models import STATUS_OPTIONS
+
+STATUS_VALUES = [value for value, _ in STATUS_OPTIONS]
+
+# Actions that accept ?fields= (see sparse_fields)
+SPARSE_FIELDS_ACTIONS = ('list', 'search', 'changes', 'export')
+
+DATETIME_FILTERS = {
+    'created_after': 'created_at__gte',
+    'created_before': 'created_at__lt',
+    'updated_after': 'updated_at__gte',
+    'updated_before': 'updated_at__lt',
+}
+
+
+def parse_datetime_param(name, value):
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: ["Enter a valid ISO 8601 datetime."]})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def task_filter_kwargs(params):
+    """
+    Translate query parameters into ORM lookups for the task list.
+
+    Every lookup is a plain equality or range on an indexed column so the
+    resulting query can be answered from the task indexes.
+    """
+    lookups = {}
+
+    task_status = params.get('status')
+    if task_status:
+        if task_status not in STATUS_VALUES:
+            raise ValidationError({'status': [f"Must be one of: {', '.join(STATUS_VALUES)}."]})
+        lookups['status'] = task_status
+
+    for param, lookup in DATETIME_FILTERS.items():
+        value = params.get(param)
+        if value:
+            lookups[lookup] = parse_datetime_param(param, value)
+
+    return lookups
+
+
+def include_archived(params):
+    """Whether the task list should include archived tasks (see api/archive.py)."""
+    value = params.get('include_archived', '').lower()
+    if value in ('', '0', 'false'):
+        return False
+    if value in ('1', 'true'):
+        return True
+    raise ValidationError({'include_archived': ["Must be true or false."]})
+
+
+def sparse_fields(params, allowed):
+    """
+    The task fields requested with ``?fields=id,title,status``, in the
+    order given, or an empty list for every field.
+    """
+    value = params.get('fields', '').strip()
+    if not value:
+        return []
+    names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown or not names:
+        raise ValidationError({'fields': [f"Must be a comma separated list of: {', '.join(allowed)}."]})
+    return names
+
+
+class TaskFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        return queryset.filter(**task_filter_kwargs(request.query_params))
+
+    def get_schema_operation_parameters(self, view):
+        parameters = [{
+            'name': 'status',
+            'required': False,
+            'in': 'query',
+            'description': 'Only return tasks with this status.',
+            'schema': {'type': 'string', 'enum': STATUS_VALUES},
+        }]
+        for param, lookup in DATETIME_FILTERS.items():
+            field, operator = lookup.split('__')
+            bound = 'at or after' if operator == 'gte' else 'before'
+            parameters.append({
+                'name': param,
+                'required': False,
+                'in': 'query',
+                'description': f'Only return tasks whose {field} is {bound} this ISO 8601 datetime.',
+                'schema': {'type': 'string', 'format': 'date-time'},
+            })
+        if getattr(view, 'action', None) == 'list':
+            parameters.append({
+                'name': 'include_archived',
+                'required': False,
+                'in': 'query',
+                'description': 'Also return archived DONE tasks.',
+                'schema': {'type': 'boolean'},
+            })
+        if getattr(view, 'action', None) in SPARSE_FIELDS_ACTIONS:
+            parameters.append({
+                'name': 'fields',
+                'required': False,
+                'in': 'query',
+                'description': 'Comma separated task fields to return, e.g. id,title,status. Defaults to all.',
+                'schema': {'type': 'string'},
+            })
+        return parameters
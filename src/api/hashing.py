@@ -0,0 +1,87 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+DEFAULTS = {
+    'EXECUTOR': 'thread',
+    'WORKERS': None,
+    'MAX_PENDING': 256,
+}
+
+
+def init_process_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+class PasswordHashingPool:
+    """
+    Runs ``make_password`` on a bounded pool, so that however many requests
+    hash at once, at most ``WORKERS`` hashes compete for the CPU with the
+    rest of the API. Callers still wait for their hashes: ``hash`` takes as
+    long as hashing inline, and only ``hash_many`` gains by spreading one
+    batch over the workers.
+
+    ``EXECUTOR`` is ``"thread"`` (hashlib releases the GIL while hashing, so
+    threads use every core), ``"process"`` or ``"inline"`` to hash on the
+    calling thread. At most ``MAX_PENDING`` hashes are queued at once;
+    further callers block until a slot frees up.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.slots = None
+
+    @property
+    def options(self):
+        return {**DEFAULTS, **getattr(settings, 'PASSWORD_HASHING_POOL', {})}
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                options = self.options
+                workers = options['WORKERS'] or os.cpu_count() or 1
+                if options['EXECUTOR'] == 'process':
+                    self.executor = ProcessPoolExecutor(
+                        max_workers=workers,
+                        initializer=init_process_worker,
+                        initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'task.settings'),),
+                    )
+                else:
+                    self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+                self.slots = threading.BoundedSemaphore(options['MAX_PENDING'])
+            return self.executor
+
+    def submit(self, password):
+        executor = self.get_executor()
+        self.slots.acquire()
+        try:
+            future = executor.submit(make_password, password)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def hash(self, password):
+        if self.options['EXECUTOR'] == 'inline':
+            return make_password(password)
+        return self.submit(password).result()
+
+    def hash_many(self, passwords):
+        if self.options['EXECUTOR'] == 'inline':
+            return [make_password(password) for password in passwords]
+        return [future.result() for future in [self.submit(password) for password in passwords]]
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+
+password_hashing_pool = PasswordHashingPool()
@@ -0,0 +1,268 @@
+"""
+Idempotency keys for writes.
+
+A POST, PUT or PATCH sent with an ``Idempotency-Key`` header runs at most
+once per client and key. The first request inserts an
+``IdempotencyRecord``; the unique constraint on ``(owner, key)`` makes
+that insert a lock, so of several concurrent duplicates exactly one runs.
+Its response is stored and replayed to every retry until the record
+expires after ``TTL_SECONDS``. Duplicates that arrive while it is still
+running wait up to ``WAIT_SECONDS`` for it, then get a 409.
+
+Only successes and client errors are stored. Server errors, redirects
+and transient rejections are not: the record is removed so that a retry
+runs the request again. Views let database errors propagate as 500s
+rather than turn them into 400s that would be replayed. A record whose request
+never finished, e.g. because its worker died, is taken over by a retry
+once ``LOCK_SECONDS`` have passed, so that should exceed the longest
+request. `manage.py prune_idempotency_keys` deletes expired records.
+"""
+import asyncio
+import hashlib
+import time
+from datetime import timedelta
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from .metrics import registry
+from .models import IdempotencyRecord
+from .routers import primary_reads
+
+DEFAULTS = {
+    'ENABLED': True,
+    'METHODS': ('POST', 'PUT', 'PATCH'),
+    'TTL_SECONDS': 24 * 60 * 60,
+    'LOCK_SECONDS': 60,
+    'WAIT_SECONDS': 5,
+    'POLL_SECONDS': 0.05,
+}
+
+MAX_KEY_LENGTH = 255
+
+# Response headers stored with the body and replayed with it.
+REPLAYED_HEADERS = ('Content-Type', 'Location', 'ETag', 'Last-Modified')
+
+# Rejections a retry could get past, so they are not replayed.
+TRANSIENT_STATUSES = (408, 409, 423, 425, 429)
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+def get_owner(request):
+    """Who a key belongs to: the user, the credentials sent or the client address."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if authorization:
+        return 'auth:' + hashlib.sha256(authorization.encode()).hexdigest()
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def get_request_hash(request):
+    digest = hashlib.sha256(f'{request.method} {request.get_full_path()}\n'.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def acquire(owner, key, request_hash, options):
+    """
+    Return ``(record, owned)`` for the key. When ``owned`` the caller runs
+    the request and must ``store`` or ``release`` the record.
+    """
+    while True:
+        now = timezone.now()
+        locked_until = now + timedelta(seconds=options['LOCK_SECONDS'])
+        try:
+            with transaction.atomic():
+                return IdempotencyRecord.objects.create(
+                    owner=owner, key=key, request_hash=request_hash, locked_until=locked_until,
+                    expires_at=now + timedelta(seconds=options['TTL_SECONDS']),
+                ), True
+        except IntegrityError:
+            pass
+
+        record = IdempotencyRecord.objects.filter(owner=owner, key=key).first()
+        if record is None:
+            # Released or pruned since the insert failed.
+            continue
+        if record.expires_at <= now:
+            IdempotencyRecord.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+            continue
+        if record.status_code is None and record.locked_until <= now and record.request_hash == request_hash:
+            # The request holding the key stopped without storing a response.
+            if IdempotencyRecord.objects.filter(
+                pk=record.pk, status_code=None, locked_until=record.locked_until,
+            ).update(locked_until=locked_until):
+                record.locked_until = locked_until
+                return record, True
+            continue
+        return record, False
+
+
+def store(record, response):
+    headers = {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)}
+    # Nothing is stored when another request took the key over in the meantime.
+    IdempotencyRecord.objects.filter(pk=record.pk, locked_until=record.locked_until).update(
+        status_code=response.status_code, headers=headers, body=response.content,
+    )
+
+
+def release(record):
+    IdempotencyRecord.objects.filter(pk=record.pk, locked_until=record.locked_until, status_code=None).delete()
+
+
+def is_final(response):
+    """Whether a response is the view's deliberate answer to the request."""
+    status = response.status_code
+    if response.streaming or status in TRANSIENT_STATUSES:
+        return False
+    return 200 <= status < 300 or 400 <= status < 500
+
+
+def replay(record):
+    response = HttpResponse(bytes(record.body), status=record.status_code)
+    for name, value in record.headers.items():
+        response[name] = value
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def prune_idempotency_records(now=None):
+    deleted, _ = IdempotencyRecord.objects.filter(expires_at__lt=now or timezone.now()).delete()
+    return deleted
+
+
+registry.describe('api_idempotent_requests_total', 'counter', 'Requests with an Idempotency-Key, by outcome.')
+
+
+class IdempotencyMiddleware:
+    """
+    Runs writes with an ``Idempotency-Key`` header once and replays their
+    response to retries. It comes last in ``MIDDLEWARE`` so that replayed
+    responses still pass through every other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def error(self, code, message, status):
+        return JsonResponse({"code": code, "message": message}, status=status)
+
+    def get_key(self, request, options):
+        """The request's key, or ``None`` when the request is not covered."""
+        if not options['ENABLED'] or request.method not in options['METHODS']:
+            return None
+        return request.headers.get('Idempotency-Key')
+
+    def invalid_key(self, key):
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return self.error(
+                "API_IDEMPOTENCY_KEY_INVALID",
+                f"The Idempotency-Key header must be 1 to {MAX_KEY_LENGTH} characters.", 400,
+            )
+        return None
+
+    def try_acquire(self, owner, key, request_hash, options, deadline):
+        """
+        Returns ``(record, None)`` when this request holds the key and runs,
+        ``(None, response)`` when it is answered without running, and
+        ``(None, None)`` when it should wait for the request holding the key.
+        """
+        # A replica could lag behind the record just written by another request.
+        with primary_reads():
+            record, owned = acquire(owner, key, request_hash, options)
+        if owned:
+            return record, None
+        if record.request_hash != request_hash:
+            registry.inc('api_idempotent_requests_total', {'outcome': 'mismatch'})
+            return None, self.error(
+                "API_IDEMPOTENCY_KEY_REUSED",
+                "This Idempotency-Key was already used for a different request.", 422,
+            )
+        if record.status_code is not None:
+            registry.inc('api_idempotent_requests_total', {'outcome': 'replayed'})
+            return None, replay(record)
+        if time.monotonic() >= deadline:
+            registry.inc('api_idempotent_requests_total', {'outcome': 'conflict'})
+            response = self.error(
+                "API_IDEMPOTENCY_IN_PROGRESS",
+                "A request with this Idempotency-Key is still being processed. Retry later.", 409,
+            )
+            response['Retry-After'] = str(max(int(options['WAIT_SECONDS']), 1))
+            return None, response
+        return None, None
+
+    def finish(self, record, response):
+        if is_final(response):
+            store(record, response)
+        else:
+            release(record)
+        registry.inc('api_idempotent_requests_total', {'outcome': 'executed'})
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        options = get_options()
+        key = self.get_key(request, options)
+        if key is None:
+            return self.get_response(request)
+        invalid = self.invalid_key(key)
+        if invalid is not None:
+            return invalid
+
+        owner, request_hash = get_owner(request), get_request_hash(request)
+        deadline = time.monotonic() + options['WAIT_SECONDS']
+        record, response = self.try_acquire(owner, key, request_hash, options, deadline)
+        while record is None and response is None:
+            time.sleep(options['POLL_SECONDS'])
+            record, response = self.try_acquire(owner, key, request_hash, options, deadline)
+        if response is not None:
+            return response
+
+        try:
+            response = self.get_response(request)
+        except Exception:
+            release(record)
+            raise
+        return self.finish(record, response)
+
+    async def __acall__(self, request):
+        options = get_options()
+        key = self.get_key(request, options)
+        if key is None:
+            return await self.get_response(request)
+        invalid = self.invalid_key(key)
+        if invalid is not None:
+            return invalid
+
+        # request.user may still have to be loaded, which cannot happen on
+        # the event loop. The database work runs in a thread and the wait
+        # between attempts does not block the loop.
+        owner = await sync_to_async(get_owner)(request)
+        request_hash = get_request_hash(request)
+        deadline = time.monotonic() + options['WAIT_SECONDS']
+        try_acquire = sync_to_async(self.try_acquire)
+        record, response = await try_acquire(owner, key, request_hash, options, deadline)
+        while record is None and response is None:
+            await asyncio.sleep(options['POLL_SECONDS'])
+            record, response = await try_acquire(owner, key, request_hash, options, deadline)
+        if response is not None:
+            return response
+
+        try:
+            response = await self.get_response(request)
+        except Exception:
+            await sync_to_async(release)(record)
+            raise
+        return await sync_to_async(self.finish)(record, response)
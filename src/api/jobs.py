@@ -0,0 +1,389 @@
+"""
+Background jobs stored in the ``Job`` table and run by `manage.py run_jobs`.
+
+Jobs are enqueued through /api/jobs/ with a ``kind`` registered below and a
+payload validated when the job is created. A worker claims one job at a
+time: with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database
+supports it, otherwise with a conditional UPDATE that only succeeds for the
+worker that saw the job in its current state, which is safe on SQLite.
+Failed jobs are retried with exponential backoff up to ``max_attempts``.
+"""
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .archive import archive_tasks, count_archivable
+from .bulk import batch_size, batches, bulk_create_users, set_task_status
+from .hashing import password_hashing_pool
+from .models import STATUS_OPTIONS, Job, Task
+from .routers import primary_reads
+
+DEFAULTS = {
+    'LEASE_SECONDS': 300,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BASE_SECONDS': 10,
+    'RETRY_MAX_SECONDS': 3600,
+    'POLL_SECONDS': 1,
+    'CLAIM_CANDIDATES': 10,
+    'PROCESSES': None,
+    'MAX_IMPORT_USERS': 10000,
+}
+
+STATUS_VALUES = [value for value, _ in STATUS_OPTIONS]
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'JOBS', {})}
+
+
+class JobFailed(Exception):
+    """Raised by a handler to fail the job without retrying it."""
+
+
+class LeaseLost(Exception):
+    """The job was claimed by another worker after this one's lease ran out."""
+
+
+class JobKind:
+    def __init__(self, name, validate, run, redact=None):
+        self.name = name
+        self.validate = validate
+        self.run = run
+        self.redact = redact
+
+
+KINDS = {}
+
+
+def register(name, validate, redact=None):
+    """
+    Register the decorated function as the handler for jobs of kind
+    ``name``. ``validate(payload)`` returns the payload to store or raises
+    ``ValidationError``; ``redact(payload)`` strips secrets from the payload
+    once the job has finished.
+    """
+    def decorator(run):
+        KINDS[name] = JobKind(name, validate, run, redact)
+        return run
+    return decorator
+
+
+def enqueue(kind, payload, max_attempts=None):
+    if kind not in KINDS:
+        raise ValidationError({'kind': [f"Must be one of: {', '.join(sorted(KINDS))}."]})
+    if not isinstance(payload, dict):
+        raise ValidationError({'payload': ["Expected an object."]})
+    if max_attempts is None:
+        max_attempts = get_options()['MAX_ATTEMPTS']
+    elif not isinstance(max_attempts, int) or isinstance(max_attempts, bool) or max_attempts < 1:
+        raise ValidationError({'max_attempts': ["Must be a positive integer."]})
+    return Job.objects.create(
+        kind=kind,
+        payload=KINDS[kind].validate(payload),
+        max_attempts=max_attempts,
+        run_after=timezone.now(),
+    )
+
+
+def cancel(job_id):
+    """Cancel a job that no worker has started yet. Returns whether it was cancelled."""
+    return bool(Job.objects.filter(pk=job_id, status='QUEUED').update(
+        status='CANCELLED', finished_at=timezone.now(),
+    ))
+
+
+def get_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claimable_jobs(now, kinds=None):
+    # Queued jobs that are due, and running jobs whose worker stopped
+    # renewing its lease.
+    jobs = Job.objects.filter(
+        Q(status='QUEUED', run_after__lte=now) | Q(status='RUNNING', locked_until__lt=now)
+    )
+    if kinds:
+        jobs = jobs.filter(kind__in=kinds)
+    return jobs.order_by('run_after', 'id')
+
+
+def claim(worker_id, kinds=None):
+    """Claim the next due job for ``worker_id``, or return ``None``."""
+    options = get_options()
+    now = timezone.now()
+    changes = {
+        'status': 'RUNNING',
+        'locked_by': worker_id,
+        'locked_until': now + timedelta(seconds=options['LEASE_SECONDS']),
+        'started_at': now,
+    }
+    jobs = claimable_jobs(now, kinds)
+
+    if connections[DEFAULT_DB_ALIAS].features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = jobs.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            changes['attempts'] = job.attempts + 1
+            Job.objects.filter(pk=job.pk).update(**changes)
+    else:
+        for job in jobs[:options['CLAIM_CANDIDATES']]:
+            changes['attempts'] = job.attempts + 1
+            if Job.objects.filter(pk=job.pk, status=job.status, attempts=job.attempts).update(**changes):
+                break
+        else:
+            return None
+
+    for field, value in changes.items():
+        setattr(job, field, value)
+    return job
+
+
+class RunningJob:
+    """
+    What a handler gets to report progress. Every update renews the lease
+    and fails with ``LeaseLost`` once another worker has taken the job over.
+    """
+
+    def __init__(self, job, worker_id):
+        self.job = job
+        self.worker_id = worker_id
+
+    @property
+    def payload(self):
+        return self.job.payload
+
+    def update(self, **changes):
+        updated = Job.objects.filter(
+            pk=self.job.pk, locked_by=self.worker_id, attempts=self.job.attempts,
+        ).update(**changes)
+        if not updated:
+            raise LeaseLost()
+        for field, value in changes.items():
+            setattr(self.job, field, value)
+
+    def lease_expiry(self):
+        return timezone.now() + timedelta(seconds=get_options()['LEASE_SECONDS'])
+
+    def set_progress(self, progress, total=None, result=None):
+        """Record progress, and optionally a partial ``result`` to resume from after a retry."""
+        changes = {
+            'progress': progress,
+            'locked_until': self.lease_expiry(),
+        }
+        if total is not None:
+            changes['total'] = total
+        if result is not None:
+            changes['result'] = result
+        self.update(**changes)
+
+
+def retry_delay(attempts):
+    options = get_options()
+    return min(options['RETRY_BASE_SECONDS'] * 2 ** (attempts - 1), options['RETRY_MAX_SECONDS'])
+
+
+def finish(running, kind, status, **changes):
+    job = running.job
+    if kind and kind.redact:
+        changes['payload'] = kind.redact(job.payload)
+    running.update(status=status, finished_at=timezone.now(), locked_until=None, **changes)
+
+
+def run_job(job, worker_id):
+    """Run a claimed job and record how it ended."""
+    running = RunningJob(job, worker_id)
+    kind = KINDS.get(job.kind)
+    try:
+        if kind is None:
+            raise JobFailed(f"Unknown job kind {job.kind!r}.")
+        if job.attempts > job.max_attempts:
+            raise JobFailed("The job's workers stopped responding too many times.")
+        result = kind.run(running)
+    except LeaseLost:
+        return
+    except JobFailed as e:
+        finish(running, kind, 'FAILED', error=str(e))
+    except Exception:
+        error = traceback.format_exc()
+        try:
+            if job.attempts < job.max_attempts:
+                running.update(
+                    status='QUEUED', error=error, locked_until=None,
+                    run_after=timezone.now() + timedelta(seconds=retry_delay(job.attempts)),
+                )
+            else:
+                finish(running, kind, 'FAILED', error=error)
+        except LeaseLost:
+            pass
+    else:
+        try:
+            finish(running, kind, 'SUCCEEDED', result=result, progress=job.total or job.progress, error='')
+        except LeaseLost:
+            pass
+
+
+def work(worker_id=None, kinds=None, once=False, stop=None):
+    """
+    Claim and run jobs until ``stop`` (a ``threading.Event`` or
+    ``multiprocessing.Event``) is set or, with ``once``, until no job is due.
+    Returns the number of jobs run.
+    """
+    worker_id = worker_id or get_worker_id()
+    poll = get_options()['POLL_SECONDS']
+    processed = 0
+    # A replica could still show jobs that were already claimed.
+    with primary_reads():
+        while stop is None or not stop.is_set():
+            close_old_connections()
+            job = claim(worker_id, kinds)
+            if job is None:
+                if once:
+                    break
+                if stop is None:
+                    time.sleep(poll)
+                else:
+                    stop.wait(poll)
+                continue
+            run_job(job, worker_id)
+            processed += 1
+    return processed
+
+
+def validate_set_status(payload):
+    status = payload.get('status')
+    if status not in STATUS_VALUES:
+        raise ValidationError({'payload': {'status': [f"Must be one of: {', '.join(STATUS_VALUES)}."]}})
+    ids = payload.get('ids')
+    from_status = payload.get('from_status')
+    if ids is None and from_status is None:
+        raise ValidationError({'payload': ["Provide 'ids' or 'from_status' to select the tasks."]})
+    if ids is not None and (
+        not isinstance(ids, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)
+    ):
+        raise ValidationError({'payload': {'ids': ["Expected a list of integers."]}})
+    if from_status is not None and from_status not in STATUS_VALUES:
+        raise ValidationError({'payload': {'from_status': [f"Must be one of: {', '.join(STATUS_VALUES)}."]}})
+    return {'status': status, 'ids': ids, 'from_status': from_status}
+
+
+@register('tasks.set_status', validate_set_status)
+def run_set_status(running):
+    """
+    Move the selected tasks to ``status`` in batches. Tasks that already
+    have it are skipped, so a retry only redoes the unfinished batches.
+    """
+    payload = running.payload
+    size = batch_size()
+    updated = 0
+    if payload['ids'] is not None:
+        ids = payload['ids']
+        if payload['from_status']:
+            ids = list(Task.objects.filter(id__in=ids, status=payload['from_status']).values_list('id', flat=True))
+        for done, chunk in enumerate(batches(ids, size), start=1):
+            updated += set_task_status(chunk, payload['status'])
+            running.set_progress(min(done * size, len(ids)), total=len(ids))
+        return {"updated": updated}
+
+    tasks = Task.objects.filter(status=payload['from_status']).exclude(status=payload['status'])
+    total = tasks.count()
+    last = 0
+    while True:
+        chunk = list(tasks.filter(id__gt=last).order_by('id').values_list('id', flat=True)[:size])
+        if not chunk:
+            break
+        updated += set_task_status(chunk, payload['status'])
+        last = chunk[-1]
+        running.set_progress(min(updated, total), total=total)
+    return {"updated": updated}
+
+
+def validate_import_users(payload):
+    users = payload.get('users')
+    if not isinstance(users, list) or not all(isinstance(user, dict) for user in users):
+        raise ValidationError({'payload': {'users': ["Expected a list of users."]}})
+    max_users = get_options()['MAX_IMPORT_USERS']
+    if len(users) > max_users:
+        raise ValidationError({'payload': {'users': [f"Ensure this list has no more than {max_users} items."]}})
+    errors = {}
+    for index, user in enumerate(users):
+        password = user.get('password')
+        if password is None:
+            errors[index] = {'password': ["This field is required."]}
+        elif not isinstance(password, str):
+            errors[index] = {'password': ["Not a valid string."]}
+        elif not password:
+            errors[index] = {'password': ["This field may not be blank."]}
+    if errors:
+        raise ValidationError({'payload': {'users': errors}})
+    return {'users': users, 'hashed': 0}
+
+
+def redact_import_users(payload):
+    return {**payload, 'users': [
+        {key: value for key, value in user.items() if key != 'password'} for user in payload['users']
+    ]}
+
+
+def hash_import_passwords(running):
+    """
+    Replace the plaintext passwords in the payload with their hashes, one
+    batch at a time, before any user is created. Plaintext passwords only
+    stay in the job table until a worker picks the job up, and the request
+    that queued the job does not pay for hashing. ``hashed`` counts the
+    users done, so a retry carries on from there.
+    """
+    payload = running.payload
+    users = list(payload['users'])
+    size = batch_size()
+    for start in range(payload.get('hashed', 0), len(users), size):
+        batch = users[start:start + size]
+        hashes = password_hashing_pool.hash_many([user['password'] for user in batch])
+        users[start:start + size] = [{**user, 'password': password} for user, password in zip(batch, hashes)]
+        running.update(
+            payload={**payload, 'users': users, 'hashed': start + len(batch)}, locked_until=running.lease_expiry(),
+        )
+    return users
+
+
+@register('users.import', validate_import_users, redact=redact_import_users)
+def run_import_users(running):
+    """
+    Hash the passwords, then create the users batch by batch. Invalid users
+    are reported in the result instead of failing the job. Progress and the
+    result so far are saved after each batch so that a retry resumes where
+    the last attempt stopped.
+    """
+    users = hash_import_passwords(running)
+    result = running.job.result or {"created": 0, "errors": []}
+    start = running.job.progress
+    size = batch_size()
+    for offset in range(start, len(users), size):
+        batch = bulk_create_users(users[offset:offset + size], atomic=False, hash_passwords=False)
+        result["created"] += len(batch.objects)
+        result["errors"] += [{**error, "index": error["index"] + offset} for error in batch.errors]
+        running.set_progress(min(offset + size, len(users)), total=len(users), result=result)
+    return result
+
+
+def validate_archive(payload):
+    age_days = payload.get('age_days')
+    if age_days is not None and (not isinstance(age_days, int) or isinstance(age_days, bool) or age_days < 0):
+        raise ValidationError({'payload': {'age_days': ["Must be a non-negative integer."]}})
+    return {'age_days': age_days}
+
+
+@register('tasks.archive', validate_archive)
+def run_archive(running):
+    """Archive old DONE tasks like `manage.py archive_tasks`; a retry picks up the tasks left."""
+    age_days = running.payload['age_days']
+    total = count_archivable(age_days)
+    running.set_progress(0, total=total)
+    archived = archive_tasks(age_days, progress=lambda archived: running.set_progress(min(archived, total)))
+    return {"archived": archived}
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from api.archive import archive_tasks, get_options
+
+
+class Command(BaseCommand):
+    help = (
+        "Move DONE tasks not updated for TASK_ARCHIVE['AGE_DAYS'] days to the "
+        "archive table in short batches. Safe to interrupt and to run again; "
+        "each run continues with the tasks that are left."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--age-days', type=int, help='Archive tasks older than this (default TASK_ARCHIVE["AGE_DAYS"]).')
+        parser.add_argument('--batch-size', type=int, help='Tasks moved per transaction.')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches.')
+        parser.add_argument('--pause', type=float, help='Seconds to sleep between batches.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to archive.')
+
+    def handle(self, *args, **options):
+        age_days = get_options()['AGE_DAYS'] if options['age_days'] is None else options['age_days']
+
+        def report(archived):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Archived {archived} task(s)...")
+
+        archived = archive_tasks(
+            age_days=age_days,
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+            using=options['database'],
+            progress=report,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} task(s) older than {age_days} days."))
@@ -0,0 +1,56 @@
+import json
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment
+from api.benchmarks import NO_LIMITS, benchmark_databases, print_table, run_async, run_threaded, seed_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput and latency of the task list endpoint served by the "
+        "WSGI handler with the ASGI handler, for both the DRF views and the "
+        "async views, on a temporary test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=10000, help='Tasks to seed into the temporary test database.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=64, help='Concurrent clients per scenario.')
+        parser.add_argument('--query', default='page_size=50', help='Query string sent to the list endpoint.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with benchmark_databases():
+            seeded = seed_tasks(options['tasks'])
+            if seeded and not options['json']:
+                self.stdout.write(f"Seeded {seeded} tasks.")
+
+            requests, concurrency, query = options['requests'], options['concurrency'], options['query']
+
+            def wsgi_call():
+                client = Client()
+                return lambda: client.get(f'/api/tasks/?{query}').status_code == 200
+
+            def asgi_call(path):
+                def make_call():
+                    client = AsyncClient()
+
+                    async def call():
+                        response = await client.get(f'{path}?{query}')
+                        return response.status_code == 200
+                    return call
+                return make_call
+
+            # Compare the request paths themselves, not the read-through cache.
+            with override_settings(TASK_CACHE={'ENABLED': False}, **NO_LIMITS):
+                results = {
+                    'wsgi (DRF views)': run_threaded(wsgi_call, requests, concurrency),
+                    'asgi (DRF views)': run_async(asgi_call('/api/tasks/'), requests, concurrency),
+                    'asgi (async views)': run_async(asgi_call('/api/async/tasks/'), requests, concurrency),
+                }
+
+            if options['json']:
+                self.stdout.write(json.dumps(results, indent=2))
+            else:
+                print_table(self.stdout, results)
@@ -0,0 +1,80 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+from api.benchmarks import NO_LIMITS, print_table, run_threaded
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent task writers under each database profile. Every "
+        "profile runs in its own process against a fresh database so the "
+        "connect-time configuration is exactly what the server would use."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='sqlite-basic,sqlite', help='Comma separated DATABASE_PROFILE values.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per profile.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients per profile.')
+        parser.add_argument('--read-ratio', type=float, default=0.5, help='Share of requests that list tasks instead of creating one.')
+        parser.add_argument('--worker', action='store_true', help='Run one profile in this process (used internally).')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def run_worker(self, options):
+        setup_test_environment()
+        call_command('migrate', verbosity=0)
+        counter = iter(range(options['requests'] * 2))
+        every = round(1 / options['read_ratio']) if options['read_ratio'] else 0
+
+        def make_call():
+            client = Client()
+
+            def call():
+                index = next(counter)
+                if every and index % every == 0:
+                    return client.get('/api/tasks/?page_size=20').status_code == 200
+                response = client.post('/api/tasks/', {
+                    'title': f'Writer task {index}', 'description': 'Written by bench_db_writers',
+                }, content_type='application/json')
+                return response.status_code == 201
+            return call
+
+        with override_settings(TASK_CACHE={'ENABLED': False}, **NO_LIMITS):
+            result = run_threaded(make_call, options['requests'], options['concurrency'])
+        result['profile'] = settings.DATABASE_PROFILE
+        self.stdout.write(json.dumps(result))
+
+    def run_profile(self, profile, options, directory):
+        env = {**os.environ, 'DATABASE_PROFILE': profile}
+        if profile.startswith('sqlite'):
+            env['DATABASE_NAME'] = os.path.join(directory, f'{profile}.sqlite3')
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'bench_db_writers', '--worker',
+            '--requests', str(options['requests']),
+            '--concurrency', str(options['concurrency']),
+            '--read-ratio', str(options['read_ratio']),
+        ]
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+        if completed.returncode:
+            raise CommandError(f"Profile {profile} failed:\n{completed.stderr}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            return self.run_worker(options)
+
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in options['profiles'].split(','):
+                results[profile] = self.run_profile(profile, options, directory)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            print_table(self.stdout, results)
@@ -0,0 +1,100 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+from rest_framework.renderers import JSONRenderer
+from api.benchmarks import NO_LIMITS, benchmark_databases, percentile, seed_tasks
+from api.middleware import brotli
+from api.renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+
+COLUMNS = ['bytes', 'p50_ms', 'p95_ms']
+RENDER_COLUMNS = ['bytes', 'best_ms']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare bytes on the wire and latency of large task list pages "
+        "with all fields or ?fields=, as JSON or MessagePack, uncompressed "
+        "or with gzip/brotli, plus the render time of each renderer, on a "
+        "temporary test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=5000, help='Tasks to seed into the temporary test database.')
+        parser.add_argument('--page-size', type=int, default=500, help='Tasks per page.')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per variant.')
+        parser.add_argument('--fields', default='id,title,status', help='Sparse fieldset to compare with all fields.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def get_variants(self, options):
+        base = f"/api/tasks/?page_size={options['page_size']}"
+        sparse = f"{base}&fields={options['fields']}"
+        variants = {
+            'json': (base, {}),
+            'json gzip': (base, {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+            'fields json': (sparse, {}),
+            'fields gzip': (sparse, {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+        }
+        if brotli is not None:
+            variants['json br'] = (base, {'HTTP_ACCEPT_ENCODING': 'br'})
+            variants['fields br'] = (sparse, {'HTTP_ACCEPT_ENCODING': 'br'})
+        if msgpack is not None:
+            variants['msgpack'] = (base, {'HTTP_ACCEPT': 'application/msgpack'})
+            variants['fields msgpack'] = (sparse, {'HTTP_ACCEPT': 'application/msgpack'})
+        return variants
+
+    def measure_requests(self, client, path, headers, count):
+        latencies, size = [], 0
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.get(path, **headers)
+            latencies.append(time.perf_counter() - started)
+            size = len(response.content)
+        return {
+            'bytes': size,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        }
+
+    def measure_render(self, renderer, data, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            content = renderer.render(data)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return {'bytes': len(content), 'best_ms': round(best * 1000, 3)}
+
+    def write_table(self, title, results, columns):
+        width = max(len(name) for name in results) + 2
+        self.stdout.write(title.ljust(width) + ''.join(column.rjust(12) for column in columns))
+        for name, result in results.items():
+            self.stdout.write(name.ljust(width) + ''.join(str(result[column]).rjust(12) for column in columns))
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with benchmark_databases():
+            seed_tasks(options['tasks'])
+            client = Client()
+
+            requests = {}
+            with override_settings(TASK_CACHE={'ENABLED': False}, TASK_LIST_MAX_PAGE_SIZE=options['page_size'], **NO_LIMITS):
+                for name, (path, headers) in self.get_variants(options).items():
+                    client.get(path, **headers)
+                    requests[name] = self.measure_requests(client, path, headers, options['requests'])
+                page = client.get(f"/api/tasks/?page_size={options['page_size']}").json()
+
+            renderers = {'JSONRenderer': JSONRenderer(), 'ORJSONRenderer': ORJSONRenderer()}
+            if msgpack is not None:
+                renderers['MessagePackRenderer'] = MessagePackRenderer()
+            rendering = {
+                name: self.measure_render(renderer, page, options['requests']) for name, renderer in renderers.items()
+            }
+
+            if options['json']:
+                self.stdout.write(json.dumps({'requests': requests, 'rendering': rendering}, indent=2))
+                return
+            self.write_table('variant', requests, COLUMNS)
+            self.stdout.write('')
+            self.write_table('renderer', rendering, RENDER_COLUMNS)
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_test_environment
+from api.benchmarks import percentile
+from api.events import make_event, task_events
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class StreamClient:
+    """Drives one event stream request straight through the ASGI handler."""
+
+    def __init__(self, application, path, query):
+        self.application = application
+        self.scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': [(b'host', b'testserver'), (b'accept', b'text/event-stream')],
+            'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+        self.connected = asyncio.Event()
+        self.disconnected = asyncio.Event()
+        self.requested = False
+        self.buffer = b''
+        self.latencies = []
+        self.status = None
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            return
+        if message['type'] != 'http.response.body':
+            return
+        self.connected.set()
+        received = time.time()
+        self.buffer += message.get('body', b'')
+        while b'\n\n' in self.buffer:
+            block, self.buffer = self.buffer.split(b'\n\n', 1)
+            for line in block.split(b'\n'):
+                if line.startswith(b'data: '):
+                    self.latencies.append(received - json.loads(line[6:])['sent'])
+
+    async def run(self):
+        await self.application(self.scope, self.receive, self.send)
+        self.connected.set()
+
+
+class Command(BaseCommand):
+    help = (
+        "Open many concurrent /api/async/tasks/events/ streams on one ASGI "
+        "worker, publish events to them and report connection memory and "
+        "delivery latency per subscriber count."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', default='100,1000,5000', help='Comma separated subscriber counts.')
+        parser.add_argument('--events', type=int, default=20, help='Events published per run.')
+        parser.add_argument('--interval', type=float, default=0.05, help='Seconds between published events.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    async def run_level(self, application, count, options):
+        rss_before = rss_bytes()
+        clients = [StreamClient(application, '/api/async/tasks/events/', '') for _ in range(count)]
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(client.run()) for client in clients]
+        await asyncio.gather(*(client.connected.wait() for client in clients))
+        connect_s = time.perf_counter() - started
+        rss_connected = rss_bytes()
+        streaming = sum(client.status == 200 for client in clients)
+
+        def publish():
+            broker = task_events.get()
+            for index in range(options['events']):
+                broker.publish(make_event('updated', {"sent": time.time(), "index": index}, ['PENDING']))
+                time.sleep(options['interval'])
+
+        publisher = threading.Thread(target=publish)
+        publisher.start()
+        expected = options['events'] * streaming
+        deadline = time.perf_counter() + options['events'] * options['interval'] + 30
+        while publisher.is_alive() or sum(len(client.latencies) for client in clients) < expected:
+            if time.perf_counter() > deadline:
+                break
+            await asyncio.sleep(0.05)
+        publisher.join()
+
+        for client in clients:
+            client.disconnected.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        latencies = [latency for client in clients for latency in client.latencies]
+        return {
+            'subscribers': count,
+            'streaming': streaming,
+            'connect_s': round(connect_s, 2),
+            'kib_per_subscriber': round((rss_connected - rss_before) / max(count, 1) / 1024, 1),
+            'delivered': len(latencies),
+            'expected': expected,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(max(latencies, default=0) * 1000, 2),
+        }
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        application = get_asgi_application()
+
+        async def main():
+            return [
+                await self.run_level(application, int(count), options)
+                for count in options['subscribers'].split(',')
+            ]
+
+        results = asyncio.run(main())
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        columns = ['streaming', 'connect_s', 'kib_per_subscriber', 'delivered', 'p50_ms', 'p99_ms', 'max_ms']
+        self.stdout.write('subscribers'.ljust(14) + ''.join(column.rjust(20) for column in columns))
+        for result in results:
+            self.stdout.write(str(result['subscribers']).ljust(14) + ''.join(str(result[column]).rjust(20) for column in columns))
@@ -0,0 +1,71 @@
+import json
+import random
+import time
+from django.core.management.base import BaseCommand
+from api.benchmarks import WORDS, benchmark_databases, percentile, seed_tasks
+from api.models import Task
+from api.search import fallback_backend, get_backend, get_terms
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare /api/tasks/search/ queries on the full-text index against a "
+        "naive icontains scan over the same tasks, seeded into a temporary test "
+        "database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1000000, help='Tasks to seed into the temporary test database.')
+        parser.add_argument('--queries', type=int, default=50, help='Queries per backend.')
+        parser.add_argument('--page-size', type=int, default=50, help='Rows fetched per query.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the query terms.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def measure(self, backend, queries, page_size):
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            list(backend.search(Task.objects.all(), get_terms(query)).values_list('id', flat=True)[:page_size])
+            latencies.append(time.perf_counter() - started)
+        return {
+            'queries': len(latencies),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'max_ms': round(max(latencies) * 1000, 2),
+        }
+
+    def handle(self, *args, **options):
+        with benchmark_databases():
+            seed_tasks(options['tasks'])
+            rng = random.Random(options['seed'])
+            count = Task.objects.count()
+            # Broad queries combine common words and match a large share of the
+            # table; selective ones look up a rare reference token.
+            workloads = {
+                'broad': [' '.join(rng.sample(WORDS, k=2)) for _ in range(options['queries'])],
+                'selective': [f'ref{rng.randrange(count)}' for _ in range(options['queries'])],
+            }
+
+            index = get_backend(Task.objects.db)
+            results = {}
+            for workload, queries in workloads.items():
+                results[workload] = {
+                    'index': self.measure(index, queries, options['page_size']),
+                    'icontains': self.measure(fallback_backend, queries, options['page_size']),
+                }
+                results[workload]['speedup_p50'] = round(
+                    results[workload]['icontains']['p50_ms'] / max(results[workload]['index']['p50_ms'], 0.01), 1)
+
+            if options['json']:
+                self.stdout.write(json.dumps(results, indent=2))
+                return
+            self.stdout.write(f"{count} tasks, index backend: {index.__class__.__name__}")
+            for workload in workloads:
+                for name in ('index', 'icontains'):
+                    result = results[workload][name]
+                    self.stdout.write(
+                        f"{workload + ' ' + name:<22}{result['p50_ms']:>10} ms p50"
+                        f"{result['p95_ms']:>10} ms p95{result['max_ms']:>10} ms max"
+                    )
+                self.stdout.write(f"{workload} speedup (p50): {results[workload]['speedup_p50']}x")
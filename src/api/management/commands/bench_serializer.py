@@ -0,0 +1,57 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from api.benchmarks import benchmark_databases, seed_tasks
+from api.models import Task
+from api.serializers import TaskRowSerializer, TaskSerializer
+from api.streaming import dumps
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure rows/sec of TaskSerializer against the TaskRowSerializer fast "
+        "path over tasks seeded into a temporary test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Number of tasks to serialize.')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per path; the best run is reported.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def measure(self, run, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        with benchmark_databases():
+            seed_tasks(rows)
+            queryset = Task.objects.order_by('id')[:rows]
+            fast = TaskRowSerializer()
+
+            paths = {
+                'TaskSerializer': lambda: dumps(TaskSerializer(list(queryset), many=True).data),
+                'TaskRowSerializer': lambda: dumps(fast.serialize(fast.values_list(queryset))),
+            }
+            count = queryset.count()
+            results = {}
+            for name, run in paths.items():
+                elapsed = self.measure(run, repeat)
+                results[name] = {
+                    'rows': count,
+                    'best_s': round(elapsed, 4),
+                    'rows_per_s': round(count / elapsed),
+                }
+            results['speedup'] = round(results['TaskSerializer']['best_s'] / results['TaskRowSerializer']['best_s'], 2)
+
+            if options['json']:
+                self.stdout.write(json.dumps(results, indent=2))
+                return
+            for name in paths:
+                self.stdout.write(f"{name:<20}{results[name]['rows_per_s']:>12} rows/s  ({results[name]['best_s']} s for {count} rows)")
+            self.stdout.write(f"speedup: {results['speedup']}x")
@@ -0,0 +1,106 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from django.apps import apps
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+from api.benchmarks import NO_LIMITS, percentile
+from api.schema import write_schema
+
+COLUMNS = ['startup_ms', 'first_request_ms', 'p50_us', 'p95_us', 'modules', 'apps', 'middleware']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare settings profiles by cold start time (interpreter start to "
+        "the first response) and per-request overhead. Every run is a fresh "
+        "process, as a newly scaled worker would be."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settings-modules', default='task.settings,task.settings_api', help='Comma separated settings modules.')
+        parser.add_argument('--runs', type=int, default=5, help='Cold starts per settings module.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests timed per run after the first.')
+        parser.add_argument('--path', default='/api/tasks/?page_size=1', help='Endpoint to request.')
+        parser.add_argument('--started', type=float, help='Process launch time (used internally).')
+        parser.add_argument('--worker', action='store_true', help='Run one cold start in this process (used internally).')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def run_worker(self, options):
+        # Everything before this point, from the interpreter starting to
+        # django.setup() and loading this command, is startup.
+        startup = time.time() - options['started']
+        setup_test_environment()
+        started = time.perf_counter()
+        WSGIHandler()
+        client = Client()
+        with override_settings(TASK_CACHE={'ENABLED': False}, **NO_LIMITS):
+            if client.get(options['path']).status_code != 200:
+                raise CommandError(f"GET {options['path']} failed")
+            first_request = time.perf_counter() - started + startup
+
+            latencies = []
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                client.get(options['path'])
+                latencies.append(time.perf_counter() - started)
+
+        self.stdout.write(json.dumps({
+            'startup_ms': startup * 1000,
+            'first_request_ms': first_request * 1000,
+            'p50_us': percentile(latencies, 50) * 1e6,
+            'p95_us': percentile(latencies, 95) * 1e6,
+            'modules': len(sys.modules),
+            'apps': len(list(apps.get_app_configs())),
+            'middleware': len(settings.MIDDLEWARE),
+        }))
+
+    def run_once(self, module, options, env):
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'bench_startup', '--worker',
+            '--settings', module, '--requests', str(options['requests']), '--path', options['path'],
+        ]
+        completed = subprocess.run(command + ['--started', str(time.time())], env=env, capture_output=True, text=True)
+        if completed.returncode:
+            raise CommandError(f"{module} failed:\n{completed.stderr}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            return self.run_worker(options)
+        if not apps.is_installed('drf_spectacular'):
+            raise CommandError("Run the benchmark with task.settings; it builds the schema for the API-only profile.")
+
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ,
+                'DATABASE_NAME': os.path.join(directory, 'startup.sqlite3'),
+                'API_SCHEMA_DIR': os.path.join(directory, 'schema'),
+            }
+            write_schema(env['API_SCHEMA_DIR'])
+            subprocess.run(
+                [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'migrate', '--verbosity', '0'],
+                env=env, check=True,
+            )
+            for module in options['settings_modules'].split(','):
+                runs = [self.run_once(module, options, env) for _ in range(options['runs'])]
+                # Medians, so one run disturbed by the machine does not skew the comparison.
+                results[module] = {
+                    column: round(statistics.median(run[column] for run in runs), 1) for column in COLUMNS
+                }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        width = max(len(module) for module in results) + 2
+        self.stdout.write('settings'.ljust(width) + ''.join(column.rjust(18) for column in COLUMNS))
+        for module, result in results.items():
+            self.stdout.write(module.ljust(width) + ''.join(str(result[column]).rjust(18) for column in COLUMNS))
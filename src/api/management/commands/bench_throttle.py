@@ -0,0 +1,112 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+from api.benchmarks import benchmark_databases, percentile, seed_tasks
+from api.middleware import request_load
+from api.throttling import get_options, token_buckets
+
+CLIENT_ADDRESS = '10.0.1.{}'
+ABUSIVE_ADDRESS = '10.0.0.66'
+COLUMNS = ['elapsed_s', 'good_p50_ms', 'good_p99_ms', 'good_rps', 'good_errors', 'abusive_requests', 'abusive_ok', 'abusive_429']
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the rate limits: well-behaved clients list tasks at a "
+        "steady pace while one abusive client floods the same endpoint from "
+        "many threads. Reports the well-behaved clients' latency with the "
+        "limits off and on, on a temporary test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=2000, help='Tasks to seed into the temporary test database.')
+        parser.add_argument('--clients', type=int, default=8, help='Well-behaved clients.')
+        parser.add_argument('--client-rate', type=float, default=5, help='Requests per second of each well-behaved client.')
+        parser.add_argument('--abusive-threads', type=int, default=8, help='Threads of the abusive client.')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per scenario.')
+        parser.add_argument('--path', default='/api/tasks/?page_size=50', help='Endpoint every client requests.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def reset_buckets(self, options):
+        # Only drop the buckets of the benchmark's own clients; the cache can
+        # be shared with other processes.
+        throttle = get_options()
+        addresses = [ABUSIVE_ADDRESS] + [CLIENT_ADDRESS.format(index) for index in range(options['clients'])]
+        token_buckets.reset(
+            [f'{scope}:ip:{address}' for scope in throttle['SCOPES'] for address in addresses],
+            throttle['CACHE_ALIAS'],
+        )
+
+    def run_scenario(self, options):
+        self.reset_buckets(options)
+        request_load.reset()
+        stop = threading.Event()
+        lock = threading.Lock()
+        latencies, good, abusive = [], Counter(), Counter()
+
+        def well_behaved(index):
+            client = Client(REMOTE_ADDR=CLIENT_ADDRESS.format(index))
+            interval = 1 / options['client_rate']
+            next_at = time.perf_counter() + random.random() * interval
+            while not stop.is_set():
+                time.sleep(max(next_at - time.perf_counter(), 0))
+                next_at += interval
+                started = time.perf_counter()
+                response = client.get(options['path'])
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    good[response.status_code] += 1
+
+        def abusive_client():
+            client = Client(REMOTE_ADDR=ABUSIVE_ADDRESS)
+            while not stop.is_set():
+                response = client.get(options['path'])
+                with lock:
+                    abusive[response.status_code] += 1
+
+        threads = [threading.Thread(target=well_behaved, args=(index,)) for index in range(options['clients'])]
+        threads += [threading.Thread(target=abusive_client) for _ in range(options['abusive_threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'good_p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'good_p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'good_rps': round(len(latencies) / elapsed, 1),
+            'elapsed_s': round(elapsed, 1),
+            'good_errors': sum(count for code, count in good.items() if code != 200),
+            'abusive_requests': sum(abusive.values()),
+            'abusive_ok': abusive[200],
+            'abusive_429': abusive[429],
+        }
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with benchmark_databases():
+            seed_tasks(options['tasks'])
+
+            results = {}
+            with override_settings(TASK_CACHE={'ENABLED': False}):
+                with override_settings(API_THROTTLE={'ENABLED': False}, LOAD_SHEDDING={'ENABLED': False}):
+                    results['limits off'] = self.run_scenario(options)
+                results['limits on'] = self.run_scenario(options)
+
+            if options['json']:
+                self.stdout.write(json.dumps(results, indent=2))
+                return
+            width = max(len(name) for name in results) + 2
+            self.stdout.write('scenario'.ljust(width) + ''.join(column.rjust(18) for column in COLUMNS))
+            for name, result in results.items():
+                self.stdout.write(name.ljust(width) + ''.join(str(result[column]).rjust(18) for column in COLUMNS))
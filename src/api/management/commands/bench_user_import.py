@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+from api.benchmarks import NO_LIMITS, benchmark_databases, seed_tasks, summarize
+from api.hashing import password_hashing_pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users through /api/users/bulk/ with each password hashing "
+        "executor while probing /api/tasks/ latency from concurrent clients, on a "
+        "temporary test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=64, help='Users imported per scenario.')
+        parser.add_argument('--batch', type=int, default=16, help='Users per bulk request.')
+        parser.add_argument('--probes', type=int, default=4, help='Concurrent task-list clients.')
+        parser.add_argument('--tasks', type=int, default=1000, help='Tasks to seed into the temporary test database.')
+        parser.add_argument('--executors', default='inline,thread,process', help='Comma separated executors to compare.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def probe_tasks(self, stop, latencies):
+        client = Client()
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                client.get('/api/tasks/?page_size=50')
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+
+    def import_users(self, prefix, count, batch):
+        client = Client()
+        for start in range(0, count, batch):
+            users = [
+                {'username': f'{prefix}-{i}', 'password': f'benchmark-password-{i}'}
+                for i in range(start, min(start + batch, count))
+            ]
+            response = client.post('/api/users/bulk/', {'users': users}, content_type='application/json')
+            if response.status_code != 201:
+                raise RuntimeError(response.content)
+
+    def run_scenario(self, options, executor=None):
+        stop = threading.Event()
+        latencies = []
+        probes = [
+            threading.Thread(target=self.probe_tasks, args=(stop, latencies))
+            for _ in range(options['probes'])
+        ]
+        for probe in probes:
+            probe.start()
+
+        started = time.perf_counter()
+        if executor is None:
+            time.sleep(2)
+        else:
+            with override_settings(PASSWORD_HASHING_POOL={'EXECUTOR': executor}):
+                password_hashing_pool.shutdown()
+                self.import_users(f'bench-{executor}-{time.time_ns()}', options['users'], options['batch'])
+                password_hashing_pool.shutdown()
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        for probe in probes:
+            probe.join()
+
+        result = summarize(latencies, elapsed)
+        result['users_per_s'] = round(options['users'] / elapsed, 1) if executor else 0.0
+        return result
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with benchmark_databases():
+            seed_tasks(options['tasks'])
+
+            # Keep the read-through cache out of the task latency probes.
+            with override_settings(TASK_CACHE={'ENABLED': False}, **NO_LIMITS):
+                results = {'idle (no import)': self.run_scenario(options)}
+                for executor in options['executors'].split(','):
+                    results[f'import ({executor})'] = self.run_scenario(options, executor)
+
+            if options['json']:
+                self.stdout.write(json.dumps(results, indent=2))
+                return
+            columns = ['users_per_s', 'p50_ms', 'p95_ms', 'p99_ms', 'requests']
+            width = max(len(name) for name in results) + 2
+            self.stdout.write('scenario'.ljust(width) + ''.join(column.rjust(14) for column in columns))
+            for name, result in results.items():
+                self.stdout.write(name.ljust(width) + ''.join(str(result[column]).rjust(14) for column in columns))
@@ -0,0 +1,150 @@
+import itertools
+import json
+import platform
+import random
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.utils import timezone
+from api.benchmarks import (
+    NO_LIMITS, benchmark_databases, compare_results, print_table, run_threaded, seed_tasks, seed_users,
+)
+from api.models import Task
+from api.pagination import encode_cursor
+
+BENCHMARK_TITLE = 'benchmark-created'
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed tasks and users into a temporary test database, drive the API "
+        "routes with a concurrent in-process load generator and report "
+        "throughput, p50/p95/p99 latency and query counts per endpoint. Results "
+        "can be saved as a JSON baseline and later compared against it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=10000, help='Tasks to seed.')
+        parser.add_argument('--users', type=int, default=1000, help='Users to seed.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients per endpoint.')
+        parser.add_argument('--endpoints', default='', help='Comma separated subset of endpoints to run.')
+        parser.add_argument('--with-cache', action='store_true', help='Keep the read-through task cache enabled.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the ids and values requested.')
+        parser.add_argument('--save', metavar='PATH', help='Write the results to PATH as a JSON baseline.')
+        parser.add_argument('--compare', metavar='PATH', help='Compare against the JSON baseline at PATH.')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Allowed relative regression (0.2 = 20%%).')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def check_options(self, options):
+        for name in ('tasks', 'users', 'requests', 'concurrency'):
+            if options[name] < 1:
+                raise CommandError(f"--{name} must be at least 1.")
+        if options['threshold'] < 0:
+            raise CommandError("--threshold must not be negative.")
+
+    def get_endpoints(self):
+        """Each endpoint is called with a test client and the calling thread's random generator."""
+        task_ids = list(Task.objects.values_list('id', flat=True)[:10000])
+        user_ids = list(User.objects.values_list('id', flat=True)[:10000])
+        middle = Task.objects.order_by('created_at', 'id')[Task.objects.count() // 2]
+        deep_cursor = encode_cursor({'o': 'created_at', 'p': [middle.created_at.isoformat(), middle.id], 'r': 0, 's': 50})
+        since = (timezone.now() - timezone.timedelta(days=1)).isoformat()
+
+        return {
+            'tasks.list': lambda c, rng: c.get('/api/tasks/'),
+            'tasks.list.status': lambda c, rng: c.get('/api/tasks/', {'status': rng.choice(['DONE', 'PENDING', 'IN_PROGRESS'])}),
+            'tasks.list.deep_page': lambda c, rng: c.get('/api/tasks/', {'cursor': deep_cursor}),
+            'tasks.list.updated_since': lambda c, rng: c.get('/api/tasks/', {'updated_after': since, 'ordering': '-updated_at'}),
+            'tasks.retrieve': lambda c, rng: c.get(f'/api/tasks/{rng.choice(task_ids)}/'),
+            'tasks.create': lambda c, rng: c.post('/api/tasks/', {
+                'title': BENCHMARK_TITLE, 'description': 'Created by the benchmark',
+            }, content_type='application/json'),
+            'tasks.partial_update': lambda c, rng: c.patch(f'/api/tasks/{rng.choice(task_ids)}/', {
+                'status': rng.choice(['DONE', 'PENDING', 'IN_PROGRESS']),
+            }, content_type='application/json'),
+            'users.list': lambda c, rng: c.get('/api/users/'),
+            'users.retrieve': lambda c, rng: c.get(f'/api/users/{rng.choice(user_ids)}/'),
+        }
+
+    def count_queries(self, request, rng):
+        with CaptureQueriesContext(connection) as captured:
+            request(Client(), rng)
+        return len(captured)
+
+    def run_endpoint(self, name, request, options):
+        # A generator per thread, seeded from --seed, the endpoint and the
+        # thread's number: a shared one would hand out values in whatever
+        # order the threads happened to run.
+        streams = itertools.count()
+
+        def make_call():
+            client = Client()
+            rng = random.Random(f"{options['seed']}:{name}:{next(streams)}")
+            return lambda: request(client, rng).status_code < 400
+
+        queries = self.count_queries(request, random.Random(f"{options['seed']}:{name}:queries"))
+        run_threaded(make_call, min(20, options['requests']), options['concurrency'])
+        result = run_threaded(make_call, options['requests'], options['concurrency'])
+        result['queries'] = queries
+        return result
+
+    def handle(self, *args, **options):
+        self.check_options(options)
+        setup_test_environment()
+        with benchmark_databases():
+            seed_tasks(options['tasks'])
+            seed_users(options['users'])
+
+            endpoints = self.get_endpoints()
+            if options['endpoints']:
+                selected = options['endpoints'].split(',')
+                unknown = set(selected) - set(endpoints)
+                if unknown:
+                    raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}. Choose from: {', '.join(endpoints)}.")
+                endpoints = {name: endpoints[name] for name in selected}
+
+            cache = {} if options['with_cache'] else {'ENABLED': False}
+            results = {}
+            with override_settings(TASK_CACHE=cache, **NO_LIMITS):
+                for name, request in endpoints.items():
+                    results[name] = self.run_endpoint(name, request, options)
+
+        report = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'tasks': options['tasks'],
+                'users': options['users'],
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'seed': options['seed'],
+                'cache': options['with_cache'],
+            },
+            'endpoints': results,
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            print_table(self.stdout, results)
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(report, f, indent=2)
+                f.write('\n')
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = compare_results(baseline['endpoints'], results, options['threshold'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f"{len(regressions)} regression(s) against {options['compare']}.")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}."))
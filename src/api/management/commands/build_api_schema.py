@@ -0,0 +1,21 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.schema import write_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the OpenAPI schema served on /api/schema/ to API_SCHEMA_DIR. "
+        "Run it at build time with the full settings; the API-only profile "
+        "serves the files without generating anything."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Directory to write to instead of API_SCHEMA_DIR.')
+
+    def handle(self, *args, **options):
+        if not apps.is_installed('drf_spectacular'):
+            raise CommandError("Building the schema requires drf_spectacular; run this with task.settings.")
+        for path in write_schema(options['output'] or settings.API_SCHEMA_DIR):
+            self.stdout.write(f"Wrote {path}")
@@ -0,0 +1,94 @@
+from urllib.parse import urlencode
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from api.filters import STATUS_VALUES
+from api.models import Task
+from api.pagination import TaskCursorPagination, encode_cursor
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the queries issued by the task list endpoint and fail "
+        "if any of them falls back to a full table scan or an unindexed sort."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/tasks/', help='URL of the task list endpoint.')
+
+    def list_requests(self):
+        now = timezone.now().isoformat()
+        orderings = [
+            prefix + field
+            for field in TaskCursorPagination.ordering_fields
+            for prefix in ('', '-')
+        ]
+        for ordering in orderings:
+            field = ordering.lstrip('-')
+            cursor = encode_cursor({'o': ordering, 'p': [now, 0], 'r': 0, 's': 50})
+            yield {'ordering': ordering}
+            yield {'cursor': cursor}
+            yield {'ordering': ordering, field.replace('_at', '_after'): now}
+            for task_status in STATUS_VALUES:
+                yield {'ordering': ordering, 'status': task_status}
+                yield {'cursor': cursor, 'status': task_status}
+
+    def capture_queries(self, path, params):
+        request = RequestFactory().get(path, params)
+        match = resolve(path)
+        # A cached page would skip the very query this command checks.
+        with override_settings(TASK_CACHE={'ENABLED': False}), CaptureQueriesContext(connection) as captured:
+            response = match.func(request, *match.args, **match.kwargs)
+        if response.status_code != 200:
+            raise CommandError(f"GET {path}?{urlencode(params)} returned {response.status_code}")
+        queries = [
+            query['sql'] for query in captured.captured_queries
+            if Task._meta.db_table in query['sql'] and query['sql'].lstrip().upper().startswith('SELECT')
+        ]
+        if not any(' LIMIT ' in sql.upper() for sql in queries):
+            raise CommandError(f"GET {path}?{urlencode(params)} did not query a page of tasks")
+        return queries
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+                problems = [
+                    line for line in plan
+                    if (line.startswith('SCAN') and 'USING' not in line) or 'TEMP B-TREE' in line
+                ]
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+                plan = [row[0] for row in cursor.fetchall()]
+                problems = [line for line in plan if 'Seq Scan' in line]
+            else:
+                raise CommandError(f"Query plan checks are not supported on {connection.vendor}.")
+        return plan, problems
+
+    def handle(self, *args, **options):
+        failures = 0
+        checked = 0
+        for params in self.list_requests():
+            for sql in self.capture_queries(options['path'], params):
+                with transaction.atomic():
+                    plan, problems = self.explain(sql)
+                checked += 1
+                label = urlencode(params) or '(no parameters)'
+                if problems:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(f"FAIL {label}"))
+                    for line in plan:
+                        self.stdout.write(f"    {line}")
+                elif options['verbosity'] > 1:
+                    self.stdout.write(self.style.SUCCESS(f"ok   {label}"))
+                    for line in plan:
+                        self.stdout.write(f"    {line}")
+
+        if failures:
+            raise CommandError(f"{failures} of {checked} queries are not served by an index.")
+        self.stdout.write(self.style.SUCCESS(f"All {checked} queries are served by an index."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.idempotency import prune_idempotency_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete idempotency records older than IDEMPOTENCY['TTL_SECONDS']. "
+        "Retries with their keys run the request again."
+    )
+
+    def handle(self, *args, **options):
+        deleted = prune_idempotency_records()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} expired idempotency record(s)."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from api.search import get_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the task full-text search index from the task table, e.g. "
+        "after rows were written with raw SQL or QuerySet.update()."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to rebuild.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        backend = get_backend(using)
+        with transaction.atomic(using=using):
+            backend.rebuild(using)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the {backend.__class__.__name__} index on '{using}'."))
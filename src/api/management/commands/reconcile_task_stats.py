@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from api.models import TaskDailyCount, TaskStatusCount
+from api.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the task status and daily counters from the task and archive "
+        "tables and report any drift from the incrementally maintained values."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to reconcile.')
+        parser.add_argument('--check', action='store_true', help='Fail if the counters had drifted.')
+
+    def snapshot(self, using):
+        return (
+            {row.status: row.count for row in TaskStatusCount.objects.using(using)},
+            {row.day: (row.created, row.completed) for row in TaskDailyCount.objects.using(using)},
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        before_statuses, before_days = self.snapshot(using)
+        rebuild(using)
+        after_statuses, after_days = self.snapshot(using)
+
+        drift = []
+        for task_status in sorted(set(before_statuses) | set(after_statuses)):
+            old, new = before_statuses.get(task_status, 0), after_statuses.get(task_status, 0)
+            if old != new:
+                drift.append(f"status {task_status}: {old} -> {new}")
+        for day in sorted(set(before_days) | set(after_days)):
+            old, new = before_days.get(day, (0, 0)), after_days.get(day, (0, 0))
+            if old != new:
+                drift.append(f"{day} created/completed: {old[0]}/{old[1]} -> {new[0]}/{new[1]}")
+
+        for line in drift:
+            self.stdout.write(line)
+        if drift and options['check']:
+            raise CommandError(f"{len(drift)} counter(s) had drifted and were rebuilt.")
+        self.stdout.write(self.style.SUCCESS(f"Counters rebuilt, {len(drift)} corrected."))
@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+import signal
+from django.core.management.base import BaseCommand, CommandError
+from api.hashing import init_process_worker
+
+# Spawned workers import this module before Django is set up, so nothing
+# that loads models may be imported at the top.
+
+
+def run_worker_process(settings_module, kinds, once, stop):
+    init_process_worker(settings_module)
+    from api.jobs import work
+
+    # Finish the running job on SIGTERM; Ctrl+C is handled by the parent.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    work(kinds=kinds, once=once, stop=stop)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from /api/jobs/ on a pool of worker processes. "
+        "Each process claims one job at a time, so any number of these "
+        "commands can run side by side, on one machine or several."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, help='Worker processes (default JOBS["PROCESSES"] or the number of CPUs).')
+        parser.add_argument('--kinds', default='', help='Comma separated job kinds to run (default all).')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due instead of waiting for more.')
+
+    def handle(self, *args, **options):
+        from api.jobs import get_options, get_worker_id, work
+
+        processes = options['processes'] or get_options()['PROCESSES'] or os.cpu_count() or 1
+        kinds = [kind for kind in options['kinds'].split(',') if kind]
+
+        if processes == 1:
+            stop = multiprocessing.Event()
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            try:
+                processed = work(get_worker_id(), kinds, options['once'], stop)
+            except KeyboardInterrupt:
+                return
+            self.stdout.write(f"Ran {processed} jobs.")
+            return
+
+        # Spawned rather than forked so that no database connection or lock
+        # of this process is shared with the workers.
+        context = multiprocessing.get_context('spawn')
+        stop = context.Event()
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'task.settings')
+        workers = [
+            context.Process(target=run_worker_process, args=(settings_module, kinds, options['once'], stop))
+            for _ in range(processes)
+        ]
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {processes} job workers.")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            # Workers finish the job they are running before they exit.
+            stop.set()
+            for worker in workers:
+                worker.join()
+        failed = sum(1 for worker in workers if worker.exitcode)
+        if failed:
+            raise CommandError(f"{failed} job workers exited with an error.")
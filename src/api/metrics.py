@@ -0,0 +1,186 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'SERVER_TIMING': False,
+}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'PERFORMANCE_METRICS', {})}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """
+    In-process metric store rendered in the Prometheus text format.
+
+    Each worker process keeps its own registry; Prometheus aggregates them
+    when it scrapes every worker.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.help = {}
+        self.collectors = []
+
+    def describe(self, name, kind, help_text, buckets=None):
+        self.help[name] = (kind, help_text, buckets)
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.help[name][2])
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def register_collector(self, collector):
+        """``collector()`` returns ``[(name, kind, help, [(labels, value), ...]), ...]``."""
+        self.collectors.append(collector)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self):
+        with self.lock:
+            histograms = {key: (list(h.counts), h.sum, h.count, h.buckets) for key, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = []
+        for name, (kind, help_text, _) in sorted(self.help.items()):
+            series = sorted(
+                (key, value) for key, value in (histograms if kind == 'histogram' else counters).items()
+                if key[0] == name
+            )
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (_, labels), value in series:
+                if kind == 'histogram':
+                    counts, total, count, buckets = value
+                    cumulative = 0
+                    for bound, bucket_count in zip([*buckets, '+Inf'], counts):
+                        cumulative += bucket_count
+                        lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+                    lines.append(f'{name}_sum{format_labels(labels)} {total}')
+                    lines.append(f'{name}_count{format_labels(labels)} {count}')
+                else:
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+
+        for collector in self.collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{format_labels(tuple(sorted(labels.items())))} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+registry = Registry()
+registry.describe('api_requests_total', 'counter', 'Requests handled, by route, action and status.')
+registry.describe('api_request_duration_seconds', 'histogram', 'Wall time spent handling sampled requests.', DURATION_BUCKETS)
+registry.describe('api_request_db_duration_seconds', 'histogram', 'Time spent in database queries per sampled request.', DURATION_BUCKETS)
+registry.describe('api_request_queries', 'histogram', 'Database queries per sampled request.', COUNT_BUCKETS)
+registry.describe('api_request_duplicate_queries', 'histogram', 'Repeated identical SQL statements per sampled request.', COUNT_BUCKETS)
+registry.describe('api_request_serializer_duration_seconds', 'histogram', 'Time spent serializing per sampled request.', DURATION_BUCKETS)
+registry.describe('api_response_size_bytes', 'histogram', 'Response body size of sampled, non-streaming requests.', SIZE_BUCKETS)
+
+
+class RequestMetrics:
+    """Per-request measurements collected while a sampled request runs."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = {}
+        self.timers = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            key = (sql, str(params))
+            self.statements[key] = self.statements.get(key, 0) + 1
+
+    @property
+    def duplicate_queries(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def add_time(self, name, elapsed):
+        self.timers[name] = self.timers.get(name, 0.0) + elapsed
+
+
+current_request = ContextVar('current_request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection (see api/db.py). It finds
+    the sampled request through ``current_request``, which also reaches the
+    threads an async request runs its ORM calls on.
+    """
+    state = current_request.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    return state(execute, sql, params, many, context)
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent in the block to ``name`` on the current sampled request."""
+    state = current_request.get()
+    if state is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        state.add_time(name, time.perf_counter() - started)
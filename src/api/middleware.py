@@ -0,0 +1,361 @@
+import gzip
+import random
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from .metrics import current_request, get_options, registry, RequestMetrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def route_labels(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return {'route': 'unmatched', 'action': ''}
+    actions = getattr(match.func, 'actions', None) or {}
+    return {
+        'route': match.view_name or match.route,
+        'action': actions.get(request.method.lower(), request.method.lower()),
+    }
+
+
+class PerformanceMiddleware:
+    """
+    Records wall time, database time, query and duplicate query counts,
+    serializer time and response size per route and action.
+
+    Only a ``SAMPLE_RATE`` fraction of requests is measured in detail; the
+    rest only increment the request counter, which keeps the overhead
+    negligible at high request rates. Works under WSGI and ASGI alike.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def start(self, options):
+        """The ``RequestMetrics`` to collect, or None if the request is not sampled."""
+        if options['SAMPLE_RATE'] < 1 and random.random() >= options['SAMPLE_RATE']:
+            return None
+        return RequestMetrics()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        options = get_options()
+        if not options['ENABLED']:
+            return self.get_response(request)
+        state = self.start(options)
+        token = current_request.set(state)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, state, time.perf_counter() - started, options)
+
+    async def __acall__(self, request):
+        options = get_options()
+        if not options['ENABLED']:
+            return await self.get_response(request)
+        state = self.start(options)
+        token = current_request.set(state)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, state, time.perf_counter() - started, options)
+
+    def finish(self, request, response, state, elapsed, options):
+        labels = route_labels(request)
+        registry.inc('api_requests_total', {**labels, 'status': response.status_code})
+        if state is None:
+            return response
+
+        registry.observe('api_request_duration_seconds', labels, elapsed)
+        registry.observe('api_request_db_duration_seconds', labels, state.db_time)
+        registry.observe('api_request_queries', labels, state.queries)
+        registry.observe('api_request_duplicate_queries', labels, state.duplicate_queries)
+        serializer_time = state.timers.get('serializer', 0.0)
+        registry.observe('api_request_serializer_duration_seconds', labels, serializer_time)
+        if not response.streaming:
+            registry.observe('api_response_size_bytes', labels, len(response.content))
+
+        if options['SERVER_TIMING']:
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={elapsed * 1000:.2f}',
+                f'db;dur={state.db_time * 1000:.2f};desc="{state.queries} queries"',
+                f'serializer;dur={serializer_time * 1000:.2f}',
+            ])
+        return response
+
+
+SHEDDING_DEFAULTS = {
+    'ENABLED': True,
+    'MAX_IN_FLIGHT': 64,
+    'TARGET_LATENCY_MS': 500,
+    'MAX_QUEUE_MS': 2000,
+    'RETRY_AFTER_SECONDS': 1,
+    'EXEMPT_PATHS': ('/api/metrics/',),
+}
+
+
+def get_shedding_options():
+    return {**SHEDDING_DEFAULTS, **getattr(settings, 'LOAD_SHEDDING', {})}
+
+
+def parse_request_start(value):
+    """
+    Parse an ``X-Request-Start`` header set by the proxy (``t=<time>`` in
+    seconds, milliseconds or microseconds) into seconds since the epoch.
+    """
+    try:
+        start = float(value.removeprefix('t='))
+    except (AttributeError, ValueError):
+        return None
+    if start > 1e14:
+        return start / 1_000_000
+    if start > 1e11:
+        return start / 1000
+    return start
+
+
+class RequestLoad:
+    """Requests in flight and the moving average latency of this process."""
+    # Weight of the latest request in the moving average.
+    smoothing = 0.1
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.latency = 0.0
+
+    def enter(self, limit, target_latency):
+        """Count a new request unless ``limit`` are running (half as many above ``target_latency``)."""
+        with self.lock:
+            if self.latency > target_latency:
+                limit = max(limit // 2, 1)
+            if self.in_flight >= limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self, elapsed):
+        with self.lock:
+            self.in_flight -= 1
+            self.latency += self.smoothing * (elapsed - self.latency)
+
+    def reset(self):
+        with self.lock:
+            self.in_flight = 0
+            self.latency = 0.0
+
+    def collect_metrics(self):
+        return [
+            ('api_requests_in_flight', 'gauge', 'Requests being handled by this process.', [({}, self.in_flight)]),
+            ('api_request_latency_average_seconds', 'gauge', 'Moving average request latency used for load shedding.', [
+                ({}, self.latency),
+            ]),
+        ]
+
+
+request_load = RequestLoad()
+registry.register_collector(request_load.collect_metrics)
+registry.describe('api_requests_shed_total', 'counter', 'Requests rejected with 503 because the process was overloaded, by reason.')
+
+
+class LoadSheddingMiddleware:
+    """
+    Answers with a fast 503 instead of queueing more work when this process
+    is overloaded: when ``MAX_IN_FLIGHT`` requests are already running (half
+    as many while the average latency is above ``TARGET_LATENCY_MS``), or
+    when the proxy's ``X-Request-Start`` header shows the request already
+    waited longer than ``MAX_QUEUE_MS`` for a worker.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def shed(self, reason, options):
+        registry.inc('api_requests_shed_total', {'reason': reason})
+        response = JsonResponse({
+            "code": "API_OVERLOADED",
+            "message": "The server is overloaded. Retry later."
+        }, status=503)
+        response['Retry-After'] = str(options['RETRY_AFTER_SECONDS'])
+        return response
+
+    def check(self, request, options):
+        """Return a 503 response if ``request`` is shed, else count it in flight and return ``None``."""
+        queued_since = parse_request_start(request.headers.get('X-Request-Start'))
+        if queued_since is not None and (time.time() - queued_since) * 1000 > options['MAX_QUEUE_MS']:
+            return self.shed('queue_time', options)
+        if not request_load.enter(options['MAX_IN_FLIGHT'], options['TARGET_LATENCY_MS'] / 1000):
+            return self.shed('in_flight', options)
+        return None
+
+    def is_exempt(self, request, options):
+        return not options['ENABLED'] or request.path.startswith(tuple(options['EXEMPT_PATHS']))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        options = get_shedding_options()
+        if self.is_exempt(request, options):
+            return self.get_response(request)
+        rejected = self.check(request, options)
+        if rejected is not None:
+            return rejected
+
+        started = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            request_load.leave(time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        options = get_shedding_options()
+        if self.is_exempt(request, options):
+            return await self.get_response(request)
+        rejected = self.check(request, options)
+        if rejected is not None:
+            return rejected
+
+        started = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            request_load.leave(time.perf_counter() - started)
+
+
+COMPRESSION_DEFAULTS = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+}
+
+
+def get_compression_options():
+    return {**COMPRESSION_DEFAULTS, **getattr(settings, 'RESPONSE_COMPRESSION', {})}
+
+
+def accepted_encodings(header):
+    """The content codings of an ``Accept-Encoding`` header that have a non-zero quality."""
+    codings = set()
+    for part in header.split(','):
+        coding, *params = part.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip() and quality > 0:
+            codings.add(coding.strip().lower())
+    return codings
+
+
+def brotli_sequence(chunks, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in chunks:
+        # Flushed per chunk so streamed rows reach the client as they are read.
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+registry.describe('api_responses_compressed_total', 'counter', 'Responses compressed by CompressionMiddleware, by content coding.')
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least ``MIN_SIZE`` bytes with brotli when
+    the client accepts it and the brotli package is installed, otherwise
+    with gzip. Streamed responses are compressed chunk by chunk; event
+    streams are left alone.
+
+    The ETag is kept as it is. It names the representation the views
+    produced rather than its encoded bytes, and clients send it back in
+    ``If-Match`` to update a task, which only accepts strong ETags.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def get_coding(self, request):
+        codings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in codings:
+            return 'br'
+        if 'gzip' in codings:
+            return 'gzip'
+        return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        options = get_compression_options()
+        if (
+            not options['ENABLED']
+            or response.has_header('Content-Encoding')
+            or response.get('Content-Type', '').startswith('text/event-stream')
+            or (response.streaming and response.is_async)
+        ):
+            return response
+        if not response.streaming and len(response.content) < options['MIN_SIZE']:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = self.get_coding(request)
+        if coding is None:
+            return response
+
+        if response.streaming:
+            if coding == 'br':
+                response.streaming_content = brotli_sequence(response.streaming_content, options['BROTLI_QUALITY'])
+            else:
+                response.streaming_content = compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if coding == 'br':
+                content = brotli.compress(response.content, quality=options['BROTLI_QUALITY'])
+            else:
+                content = gzip.compress(response.content, compresslevel=options['GZIP_LEVEL'], mtime=0)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        response['Content-Encoding'] = coding
+        registry.inc('api_responses_compressed_total', {'encoding': coding})
+        return response
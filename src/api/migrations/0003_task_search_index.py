@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# The index as api/search.py used it when this migration was written. It is
+# copied here so that later changes to that module cannot change how an
+# existing database migrates.
+FTS_TABLE = 'api_task_fts'
+GIN_INDEX = 'task_search_gin_idx'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"title, description, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) SELECT id, title, description FROM api_task'
+        )
+    elif vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        from django.contrib.postgres.search import SearchVector
+        vector = (
+            SearchVector('title', weight='A', config='english')
+            + SearchVector('description', weight='B', config='english')
+        )
+        schema_editor.add_index(apps.get_model('api', 'Task'), GinIndex(vector, name=GIN_INDEX))
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {GIN_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_task_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
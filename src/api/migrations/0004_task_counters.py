@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:15
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+# The counters as api/stats.py rebuilt them when this migration was written,
+# before the archive table existed. They are copied here so that later changes
+# to that module cannot change how an existing database migrates.
+STATUSES = ['DONE', 'IN_PROGRESS', 'PENDING']
+COMPLETED_STATUS = 'DONE'
+
+
+def build_counters(apps, schema_editor):
+    using = schema_editor.connection.alias
+    Task = apps.get_model('api', 'Task')
+    TaskStatusCount = apps.get_model('api', 'TaskStatusCount')
+    TaskDailyCount = apps.get_model('api', 'TaskDailyCount')
+
+    tasks = Task.objects.using(using)
+    by_status = dict(tasks.values_list('status').annotate(count=Count('id')).order_by())
+    created = dict(
+        tasks.annotate(day=TruncDate('created_at')).values_list('day').annotate(count=Count('id')).order_by()
+    )
+    completed = dict(
+        tasks.filter(status=COMPLETED_STATUS).annotate(day=TruncDate('updated_at'))
+        .values_list('day').annotate(count=Count('id')).order_by()
+    )
+
+    TaskStatusCount.objects.using(using).bulk_create([
+        TaskStatusCount(status=task_status, count=by_status.get(task_status, 0))
+        for task_status in STATUSES
+    ])
+    TaskDailyCount.objects.using(using).bulk_create([
+        TaskDailyCount(day=day, created=created.get(day, 0), completed=completed.get(day, 0))
+        for day in sorted(set(created) | set(completed))
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_task_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('created', models.BigIntegerField(default=0)),
+                ('completed', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TaskStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('DONE', 'Done'), ('IN_PROGRESS', 'In Progress'), ('PENDING', 'Pending')], max_length=20, unique=True)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
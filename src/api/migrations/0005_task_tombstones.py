@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_task_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx')],
+            },
+        ),
+    ]
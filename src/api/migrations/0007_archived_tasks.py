@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('status', models.CharField(choices=[('DONE', 'Done'), ('IN_PROGRESS', 'In Progress'), ('PENDING', 'Pending')], default='DONE', max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='archived_task_created_idx'), models.Index(fields=['updated_at'], name='archived_task_updated_idx')],
+            },
+        ),
+    ]
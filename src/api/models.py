@@ -8,8 +8,162 @@ STATUS_OPTIONS = [
 
 
 class Task(models.Model):
+    # Fields whose values as loaded from the database are remembered on the
+    # instance, so write hooks can tell what a save or delete changed.
+    tracked_fields = ('status', 'created_at', 'updated_at')
+
     title = models.CharField(max_length=255)
     description = models.TextField()
     status = models.CharField(max_length=20, choices=STATUS_OPTIONS, default="PENDING")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='task_created_idx'),
+            models.Index(fields=['updated_at'], name='task_updated_idx'),
+            models.Index(fields=['status', 'created_at'], name='task_status_created_idx'),
+            models.Index(fields=['status', 'updated_at'], name='task_status_updated_idx'),
+            models.Index(
+                fields=['updated_at'],
+                name='task_open_updated_idx',
+                condition=~models.Q(status='DONE'),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_values()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Refreshed only after the post_save receivers ran, so every one of
+        # them sees the values the save replaced.
+        self.remember_loaded_values()
+
+    def remember_loaded_values(self):
+        loaded = self.get_deferred_fields()
+        self._loaded_values = {
+            field: getattr(self, field)
+            for field in self.tracked_fields if field not in loaded
+        }
+
+
+class ArchivedTask(models.Model):
+    """
+    A ``DONE`` task moved out of the task table by `manage.py archive_tasks`
+    (see api/archive.py). It keeps its id and timestamps, so the task reads
+    the same whether it is archived or not.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_OPTIONS, default="DONE")
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='archived_task_created_idx'),
+            models.Index(fields=['updated_at'], name='archived_task_updated_idx'),
+        ]
+
+
+class TaskStatusCount(models.Model):
+    """Number of tasks per status, kept up to date by the task write paths."""
+    status = models.CharField(max_length=20, choices=STATUS_OPTIONS, unique=True)
+    count = models.BigIntegerField(default=0)
+
+
+class TaskDailyCount(models.Model):
+    """
+    Per-day task counts, kept up to date by the task write paths.
+
+    ``created`` counts the tasks created on that day. ``completed`` counts the
+    tasks currently ``DONE`` whose last update happened on that day.
+    """
+    day = models.DateField(unique=True)
+    created = models.BigIntegerField(default=0)
+    completed = models.BigIntegerField(default=0)
+
+
+class TaskTombstone(models.Model):
+    """Records a deleted task so the change feed can report the deletion."""
+    task_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+        ]
+
+
+JOB_STATUS_OPTIONS = [
+    ("QUEUED", "Queued"),
+    ("RUNNING", "Running"),
+    ("SUCCEEDED", "Succeeded"),
+    ("FAILED", "Failed"),
+    ("CANCELLED", "Cancelled"),
+]
+
+
+class Job(models.Model):
+    """
+    A background operation run by `manage.py run_jobs` (see api/jobs.py).
+
+    A worker owns a ``RUNNING`` job until ``locked_until``; a job whose
+    lease ran out is claimed again as if its worker had died. ``attempts``
+    counts the claims and doubles as the version checked by every update a
+    worker makes, so a worker that lost its lease cannot overwrite the job.
+    """
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=JOB_STATUS_OPTIONS, default="QUEUED")
+    payload = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+            models.Index(fields=['status', 'locked_until'], name='job_status_locked_idx'),
+        ]
+
+
+class IdempotencyRecord(models.Model):
+    """
+    A write sent with an ``Idempotency-Key`` header (see api/idempotency.py).
+
+    The unique ``(owner, key)`` row is inserted before the request runs and
+    acts as its lock until ``locked_until``; ``status_code`` stays null until
+    the response to replay is stored.
+    """
+    owner = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    headers = models.JSONField(default=dict)
+    body = models.BinaryField(default=b'')
+    locked_until = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'key'], name='idempotency_owner_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
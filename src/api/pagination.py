@@ -0,0 +1,248 @@
+import base64
+import json
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+
+
+def encode_cursor(payload):
+    data = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError):
+        raise ValidationError({'cursor': ["Invalid cursor."]})
+
+
+class PageSizeMixin:
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, params, default=None):
+        page_size = default or getattr(settings, 'TASK_LIST_PAGE_SIZE', 50)
+        max_page_size = getattr(settings, 'TASK_LIST_MAX_PAGE_SIZE', 500)
+        value = params.get(self.page_size_query_param)
+        if value:
+            try:
+                page_size = int(value)
+            except ValueError:
+                raise ValidationError({self.page_size_query_param: ["A valid integer is required."]})
+            if page_size < 1:
+                raise ValidationError({self.page_size_query_param: ["Must be a positive integer."]})
+        return min(page_size, max_page_size)
+
+
+class TaskCursorPagination(PageSizeMixin, BasePagination):
+    """
+    Keyset pagination over ``(<ordering field>, id)``.
+
+    Each page is fetched with a range condition on the ordering column
+    instead of an OFFSET, so the cost of a page does not depend on how deep
+    the client has paged. Cursors are opaque tokens that carry the ordering,
+    the page size and the position of the boundary row; filters are not part
+    of the cursor and must be sent again with every page.
+    """
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    ordering_fields = ('created_at', 'updated_at')
+    default_ordering = 'created_at'
+
+    def get_ordering(self, params):
+        ordering = params.get(self.ordering_query_param) or self.default_ordering
+        if ordering.lstrip('-') not in self.ordering_fields:
+            allowed = ', '.join(self.ordering_fields)
+            raise ValidationError({self.ordering_query_param: [f"Must be one of: {allowed} (prefix with '-' to reverse)."]})
+        return ordering
+
+    def decode_position(self, token):
+        payload = decode_cursor(token)
+        try:
+            ordering = payload['o']
+            value, pk = payload['p']
+            reverse = bool(payload['r'])
+            page_size = int(payload['s'])
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError({self.cursor_query_param: ["Invalid cursor."]})
+        if (
+            value is None or page_size < 1 or not isinstance(ordering, str)
+            or ordering.lstrip('-') not in self.ordering_fields
+        ):
+            raise ValidationError({self.cursor_query_param: ["Invalid cursor."]})
+        return ordering, (value, pk), reverse, page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.get_page(list(self.get_page_queryset(queryset, request.query_params)))
+
+    def get_page_queryset(self, queryset, params):
+        """
+        Return the sliced queryset for the requested page. It fetches one row
+        more than the page size so ``get_page`` can tell whether more follow.
+        """
+        token = params.get(self.cursor_query_param)
+        if token:
+            self.ordering, position, reverse, page_size = self.decode_position(token)
+            self.page_size = self.get_page_size(params, default=page_size)
+        else:
+            self.ordering, position, reverse = self.get_ordering(params), None, False
+            self.page_size = self.get_page_size(params)
+        self.position, self.reverse = position, reverse
+
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-') != reverse
+
+        if position is not None:
+            value, pk = position
+            if descending:
+                queryset = queryset.filter(**{f'{field}__lte': value}).filter(
+                    Q(**{f'{field}__lt': value}) | Q(id__lt=pk))
+            else:
+                queryset = queryset.filter(**{f'{field}__gte': value}).filter(
+                    Q(**{f'{field}__gt': value}) | Q(id__gt=pk))
+
+        if descending:
+            queryset = queryset.order_by(f'-{field}', '-id')
+        else:
+            queryset = queryset.order_by(field, 'id')
+
+        return queryset[:self.page_size + 1]
+
+    def paginate_querysets(self, querysets, params):
+        """
+        Paginate several querysets with the same columns as if they were one,
+        e.g. tasks and archived tasks. Each is read with the same range
+        condition and the pages are merged.
+        """
+        rows = []
+        for queryset in querysets:
+            rows += self.get_page_queryset(queryset, params)
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-') != self.reverse
+        rows.sort(key=lambda row: (getattr(row, field), row.id), reverse=descending)
+        return self.get_page(rows[:self.page_size + 1])
+
+    def get_page(self, rows):
+        field, position, reverse = self.ordering.lstrip('-'), self.position, self.reverse
+        has_extra = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_extra
+        else:
+            self.has_next, self.has_previous = has_extra, position is not None
+
+        if rows:
+            self.next_position = (getattr(rows[-1], field), rows[-1].id)
+            self.previous_position = (getattr(rows[0], field), rows[0].id)
+        else:
+            self.next_position = self.previous_position = position
+        return rows
+
+    def make_cursor(self, position, reverse):
+        value, pk = position
+        return encode_cursor({
+            'o': self.ordering,
+            'p': [value.isoformat(), pk],
+            'r': int(reverse),
+            's': self.page_size,
+        })
+
+    def get_next_cursor(self):
+        if not self.has_next or self.next_position is None:
+            return None
+        return self.make_cursor(self.next_position, reverse=False)
+
+    def get_previous_cursor(self):
+        if not self.has_previous or self.previous_position is None:
+            return None
+        return self.make_cursor(self.previous_position, reverse=True)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor taken from the "next" or "previous" field of a previous page.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of tasks to return per page.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.ordering_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Sort key, ties broken by id. Ignored when a cursor is given.',
+                'schema': {'type': 'string', 'enum': [
+                    prefix + field for field in self.ordering_fields for prefix in ('', '-')
+                ]},
+            },
+        ]
+
+
+class TaskSearchPagination(PageSizeMixin, BasePagination):
+    """
+    Numbered pages for search results. Ranked results have no stable key to
+    seek on, so pages are read with LIMIT/OFFSET; one extra row is fetched to
+    tell whether another page follows instead of counting every match.
+    """
+    page_query_param = 'page'
+
+    def get_page_number(self, params):
+        value = params.get(self.page_query_param) or '1'
+        try:
+            page = int(value)
+        except ValueError:
+            raise ValidationError({self.page_query_param: ["A valid integer is required."]})
+        if page < 1:
+            raise ValidationError({self.page_query_param: ["Must be a positive integer."]})
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page = self.get_page_number(request.query_params)
+        self.page_size = self.get_page_size(request.query_params)
+        offset = (self.page - 1) * self.page_size
+        rows = list(queryset[offset:offset + self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        return rows[:self.page_size]
+
+    def get_next_page(self):
+        return self.page + 1 if self.has_next else None
+
+    def get_previous_page(self):
+        return self.page - 1 if self.page > 1 else None
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.page_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Page number, starting at 1.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of tasks to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class JobPagination(TaskSearchPagination):
+    """Numbered pages of jobs, newest first."""
@@ -0,0 +1,45 @@
+"""
+Compact encodings for API responses, picked by the Accept header.
+
+``ORJSONRenderer`` serves the same ``application/json`` as DRF's
+``JSONRenderer``, several times faster when orjson is installed.
+``MessagePackRenderer`` serves ``application/msgpack`` (or ``?format=msgpack``)
+when msgpack is installed; the settings leave it out otherwise.
+Compression is done by ``api.middleware.CompressionMiddleware``.
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from .streaming import dumps_bytes, json_encoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Indented output, e.g. for the browsable API, is left to DRF.
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = dumps_bytes(data)
+        # Escaped by JSONRenderer too, for JSON embedded in JavaScript.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Values msgpack has no type for, datetimes included, are encoded
+        # as they would be in JSON.
+        return msgpack.packb(data, default=json_encoder.default, datetime=False)
+
@@ -0,0 +1,136 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Set while the current request or block must read from the primary.
+read_primary = ContextVar('read_primary', default=False)
+
+
+@contextmanager
+def primary_reads():
+    """Route every read in the block to the primary database."""
+    token = read_primary.set(True)
+    try:
+        yield
+    finally:
+        read_primary.reset(token)
+
+
+# Models read by the task and user endpoints, where a page that lags the
+# primary by a moment is acceptable. Auto-created many-to-many tables follow
+# the model that declares them.
+REPLICA_READ_MODELS = [
+    'api.task',
+    'api.archivedtask',
+    'api.tasktombstone',
+    'auth.user',
+    'auth.group',
+    'auth.permission',
+    'contenttypes.contenttype',
+]
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def reads_from_replica(model):
+    opts = model._meta
+    if opts.auto_created:
+        opts = opts.auto_created._meta
+    return opts.label_lower in getattr(settings, 'REPLICA_READ_MODELS', REPLICA_READ_MODELS)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads of the ``REPLICA_READ_MODELS`` to a random alias from
+    ``DATABASE_REPLICAS`` and everything else to the primary. Jobs,
+    idempotency records, counters and sessions are read back right after
+    they are written, often by another request, so they stay on the primary.
+
+    Reads stay on the primary while ``read_primary`` is set (see
+    ``ReplicaRoutingMiddleware``) and inside a transaction on the primary,
+    where a replica would not see the transaction's own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or read_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if not reads_from_replica(model):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Pins requests to the primary when they write, or when the client wrote
+    within the last ``REPLICA_STICKY_SECONDS``, so clients read their own
+    writes despite replication lag. Writing requests set a cookie that
+    expires at the end of that window.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not get_replicas():
+            return self.get_response(request)
+
+        token = read_primary.set(self.pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            read_primary.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        if not get_replicas():
+            return await self.get_response(request)
+
+        # The variable is copied into the threads that sync_to_async runs
+        # the views' database work in.
+        token = read_primary.set(self.pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_primary.reset(token)
+        return self.finish(request, response)
+
+    def pinned(self, request):
+        return request.method not in self.safe_methods or self.is_sticky(request.COOKIES.get(self.cookie_name()))
+
+    def finish(self, request, response):
+        if request.method not in self.safe_methods:
+            window = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+            response.set_cookie(
+                self.cookie_name(), str(int(time.time() + window)), max_age=window, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def cookie_name(self):
+        return getattr(settings, 'REPLICA_STICKY_COOKIE', 'api_read_primary')
+
+    def is_sticky(self, value):
+        try:
+            return float(value) > time.time()
+        except (TypeError, ValueError):
+            return False
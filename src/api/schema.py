@@ -0,0 +1,90 @@
+"""
+OpenAPI schema for /api/schema/, built once instead of on every request.
+
+``manage.py build_api_schema`` writes the schema to ``API_SCHEMA_DIR`` at
+build time and the view serves those files. Without them the schema is
+generated on the first request and kept in memory, which needs
+drf_spectacular in ``INSTALLED_APPS``.
+"""
+import threading
+from pathlib import Path
+from django.apps import apps
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+FORMATS = {
+    'yaml': ('openapi.yaml', 'application/vnd.oai.openapi; charset=utf-8'),
+    'json': ('openapi.json', 'application/vnd.oai.openapi+json; charset=utf-8'),
+}
+
+
+def generate_schema():
+    """Return the rendered schema as ``{format: bytes}``."""
+    from drf_spectacular.generators import SchemaGenerator
+    from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+
+    schema = SchemaGenerator().get_schema(request=None, public=True)
+    return {
+        'yaml': OpenApiYamlRenderer().render(schema, renderer_context={}),
+        'json': OpenApiJsonRenderer().render(schema, renderer_context={}),
+    }
+
+
+def write_schema(directory):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for fmt, content in generate_schema().items():
+        path = directory / FORMATS[fmt][0]
+        path.write_bytes(content)
+        paths.append(path)
+    return paths
+
+
+class SchemaCache:
+    """Holds the rendered schema for the lifetime of the process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.content = None
+
+    def load(self):
+        directory = getattr(settings, 'API_SCHEMA_DIR', None)
+        if directory:
+            paths = {fmt: Path(directory) / name for fmt, (name, _) in FORMATS.items()}
+            if all(path.exists() for path in paths.values()):
+                return {fmt: path.read_bytes() for fmt, path in paths.items()}
+        if apps.is_installed('drf_spectacular'):
+            return generate_schema()
+        return None
+
+    def get(self, fmt):
+        with self.lock:
+            if self.content is None:
+                self.content = self.load()
+        return self.content and self.content[fmt]
+
+    def reset(self):
+        with self.lock:
+            self.content = None
+
+
+schema_cache = SchemaCache()
+
+
+def get_format(request):
+    fmt = request.GET.get('format')
+    if fmt in FORMATS:
+        return fmt
+    return 'json' if 'json' in request.headers.get('Accept', '') else 'yaml'
+
+
+def schema(request):
+    fmt = get_format(request)
+    content = schema_cache.get(fmt)
+    if content is None:
+        return JsonResponse({
+            "code": "API_SCHEMA_UNAVAILABLE",
+            "message": "The API schema has not been built. Run `manage.py build_api_schema`.",
+        }, status=503)
+    return HttpResponse(content, content_type=FORMATS[fmt][1])
@@ -0,0 +1,154 @@
+import re
+from django.db import connections, router
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from .models import Task
+
+FTS_TABLE = 'api_task_fts'
+GIN_INDEX = 'task_search_gin_idx'
+SEARCH_CONFIG = 'english'
+
+# Column weights for ranking: a match in the title counts more than the same
+# match in the description.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def get_terms(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+class IcontainsSearchBackend:
+    """
+    Fallback for databases without a supported full-text index: every term
+    must appear in the title or the description. Results are unranked and
+    returned newest first.
+    """
+    vendor = None
+
+    def search(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+        return queryset.order_by('-id')
+
+    def index_tasks(self, tasks, using):
+        pass
+
+    def remove_tasks(self, pks, using):
+        pass
+
+    def rebuild(self, using):
+        pass
+
+
+class SqliteSearchBackend(IcontainsSearchBackend):
+    """
+    FTS5 table, created by migration 0003, holding a copy of each task's
+    title and description keyed by the task id. Rows are written in the same transaction as the task, so the
+    index never sees uncommitted or rolled back text. Results are ranked with
+    bm25, best match first.
+    """
+    vendor = 'sqlite'
+
+    def search(self, queryset, terms):
+        # Every term is quoted, which makes it a literal phrase for FTS5 and
+        # keeps operators such as NEAR, OR or column filters out of user input.
+        match = ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+        table = queryset.model._meta.db_table
+        # bm25() only works in a query with MATCH, so the rank is looked up
+        # per matching task; FTS5 answers MATCH plus a rowid by seeking.
+        rank = RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = "{table}"."id"',
+            [match], output_field=FloatField(),
+        )
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        return queryset.filter(id__in=matches).annotate(search_rank=rank).order_by('search_rank', 'id')
+
+    def index_tasks(self, tasks, using):
+        if not tasks:
+            return
+        with connections[using].cursor() as cursor:
+            self.delete_rows(cursor, [task.pk for task in tasks])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)',
+                [(task.pk, task.title, task.description) for task in tasks],
+            )
+
+    def remove_tasks(self, pks, using):
+        if not pks:
+            return
+        with connections[using].cursor() as cursor:
+            self.delete_rows(cursor, pks)
+
+    def delete_rows(self, cursor, pks):
+        # Stay well below SQLITE_MAX_VARIABLE_NUMBER on older builds.
+        for start in range(0, len(pks), 500):
+            chunk = pks[start:start + 500]
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(chunk))})',
+                chunk,
+            )
+
+    def rebuild(self, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description) SELECT id, title, description FROM api_task'
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+
+class PostgresSearchBackend(IcontainsSearchBackend):
+    """
+    Matches against a weighted ``tsvector`` expression covered by the GIN
+    expression index of migration 0003. PostgreSQL maintains the index itself, so there is
+    nothing to do on writes. Results are ranked with ``ts_rank``.
+    """
+    vendor = 'postgresql'
+
+    def get_vector(self):
+        from django.contrib.postgres.search import SearchVector
+        return (
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        )
+
+    def search(self, queryset, terms):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        query = SearchQuery(' '.join(terms), config=SEARCH_CONFIG, search_type='plain')
+        return queryset.annotate(
+            search_vector=self.get_vector(),
+            search_rank=SearchRank(self.get_vector(), query),
+        ).filter(search_vector=query).order_by('-search_rank', 'id')
+
+
+BACKENDS = {
+    backend.vendor: backend
+    for backend in (SqliteSearchBackend(), PostgresSearchBackend())
+}
+fallback_backend = IcontainsSearchBackend()
+
+
+def get_backend(using):
+    return BACKENDS.get(connections[using].vendor, fallback_backend)
+
+
+def search_tasks(queryset, query):
+    """Filter and order ``queryset`` by relevance to the free-text ``query``."""
+    terms = get_terms(query)
+    if not terms:
+        return queryset.none()
+    return get_backend(queryset.db).search(queryset, terms)
+
+
+def index_tasks(tasks, using=None):
+    using = using or router.db_for_write(Task)
+    get_backend(using).index_tasks(list(tasks), using)
+
+
+def remove_tasks(pks, using=None):
+    using = using or router.db_for_write(Task)
+    get_backend(using).remove_tasks(list(pks), using)
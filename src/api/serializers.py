@@ -1,15 +1,167 @@
 from django.contrib.auth.models import User
-from rest_framework import serializers
-from .models import Task
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+from rest_framework.settings import api_settings
+from .metrics import timed
+from .models import Job, Task
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TimedDataMixin:
+    """Report the time spent building ``.data`` to the performance metrics."""
+
+    @property
+    def data(self):
+        with timed('serializer'):
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
+class TaskSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Task
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
+
+
+class JobSerializer(serializers.ModelSerializer):
+    # The payload is left out: it can hold secrets such as the passwords of
+    # a user import until the job finishes.
+    class Meta:
+        model = Job
+        exclude = ['payload', 'locked_by', 'locked_until']
+
+
+class TaskRowSerializer:
+    """
+    Read-only fast path that renders ``TaskSerializer`` output from
+    ``values_list()`` rows.
+
+    The field list and output names come from ``TaskSerializer`` itself.
+    Per-field converters are resolved once per call: datetimes are formatted
+    inline, and fields whose database value is already their JSON value
+    (text, integers, choices) are passed through untouched. Any other field
+    type falls back to its own ``to_representation``.
+
+    ``select(names)`` returns a serializer for a subset of the fields, for
+    sparse fieldsets: only those columns and the ``key_sources`` that
+    pagination and the change feed read from the rows are selected.
+    """
+    passthrough_fields = (
+        serializers.CharField,
+        serializers.ChoiceField,
+        serializers.IntegerField,
+        serializers.BooleanField,
+    )
+    key_sources = ('id', 'created_at', 'updated_at')
+
+    def __init__(self, serializer_class=TaskSerializer, fields=None):
+        self.fields = fields if fields is not None else serializer_class().fields
+        self.field_names = list(self.fields)
+        self.sources = [field.source for field in self.fields.values()]
+
+    def select(self, names):
+        """Return a serializer for the fields ``names``, or this one when ``names`` is empty."""
+        if not names:
+            return self
+        return TaskRowSerializer(fields={name: self.fields[name] for name in names})
+
+    def values_list(self, queryset, **kwargs):
+        # Key columns the output leaves out are selected after the output
+        # columns, where iter_serialize ignores them.
+        keys = [source for source in self.key_sources if source not in self.sources]
+        return queryset.values_list(*self.sources, *keys, **kwargs)
+
+    def datetime_converter(self, field):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+            return field.to_representation
+
+        def convert(value):
+            if value.tzinfo is None:
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+
+    def get_converters(self):
+        converters = []
+        for name, field in self.fields.items():
+            if isinstance(field, serializers.DateTimeField):
+                converters.append((name, self.datetime_converter(field)))
+            elif not isinstance(field, self.passthrough_fields):
+                converters.append((name, field.to_representation))
+        return converters
+
+    def iter_serialize(self, rows):
+        names = self.field_names
+        converters = self.get_converters()
+        for row in rows:
+            item = dict(zip(names, row))
+            for name, convert in converters:
+                value = item[name]
+                if value is not None:
+                    item[name] = convert(value)
+            yield item
+
+    def serialize(self, rows):
+        with timed('serializer'):
+            return list(self.iter_serialize(rows))
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    ``ManyRelatedField`` that resolves every primary key in one ``in_bulk``
+    query instead of one ``get()`` per item.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        queryset = child.get_queryset()
+        model_pk = queryset.model._meta.pk
+        pks = []
+        for item in data:
+            if child.pk_field is not None:
+                item = child.pk_field.to_internal_value(item)
+            if isinstance(item, bool):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+            try:
+                pks.append(model_pk.to_python(item))
+            except DjangoValidationError:
+                child.fail('incorrect_type', data_type=type(item).__name__)
+
+        objects = queryset.in_bulk(set(pks))
+        for pk in pks:
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
 
+class UserSerializer(TimedDataMixin, serializers.ModelSerializer):
+    serializer_related_field = BulkPrimaryKeyRelatedField
 
-class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
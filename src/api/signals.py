@@ -0,0 +1,112 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from .cache import task_cache
+from .events import make_event, task_events
+from .models import Task, TaskTombstone
+from .search import index_tasks, remove_tasks
+from .serializers import TaskSerializer
+from .stats import record_deleted, record_saved
+
+# Sent by the bulk write paths, which bypass the per-instance model signals.
+# Receivers get ``instances`` (the saved tasks) and ``created`` (bool).
+tasks_bulk_saved = Signal()
+
+# Sent by api.archive after moving tasks to the archive table, with ``pks``
+# and ``using``. Archived tasks still exist, so only the receivers that
+# track the task table itself react to it.
+tasks_archived = Signal()
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_cache(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: task_cache.invalidate_tasks([pk]))
+
+
+@receiver(tasks_bulk_saved, sender=Task)
+def invalidate_bulk_task_cache(sender, instances, **kwargs):
+    pks = [instance.pk for instance in instances]
+    transaction.on_commit(lambda: task_cache.invalidate_tasks(pks))
+
+
+@receiver(tasks_archived, sender=Task)
+def invalidate_archived_task_cache(sender, pks, **kwargs):
+    transaction.on_commit(lambda: task_cache.invalidate_tasks(pks))
+
+
+@receiver(post_save, sender=Task)
+def index_task(sender, instance, using, **kwargs):
+    index_tasks([instance], using)
+
+
+@receiver(post_delete, sender=Task)
+def unindex_task(sender, instance, using, **kwargs):
+    remove_tasks([instance.pk], using)
+
+
+@receiver(tasks_archived, sender=Task)
+def unindex_archived_tasks(sender, pks, using, **kwargs):
+    remove_tasks(pks, using)
+
+
+@receiver(tasks_bulk_saved, sender=Task)
+def index_bulk_tasks(sender, instances, **kwargs):
+    index_tasks(instances)
+
+
+@receiver(post_save, sender=Task)
+def count_saved_task(sender, instance, created, using, **kwargs):
+    record_saved([instance], created, using)
+
+
+@receiver(post_delete, sender=Task)
+def count_deleted_task(sender, instance, using, **kwargs):
+    record_deleted([instance], using)
+
+
+@receiver(tasks_bulk_saved, sender=Task)
+def count_bulk_saved_tasks(sender, instances, created, **kwargs):
+    record_saved(instances, created)
+
+
+@receiver(post_delete, sender=Task)
+def record_tombstone(sender, instance, using, **kwargs):
+    TaskTombstone.objects.using(using).create(task_id=instance.pk, deleted_at=timezone.now())
+
+
+def publish_on_commit(event):
+    transaction.on_commit(lambda: task_events.get().publish(event))
+
+
+def saved_event(task, created):
+    data = {"task": TaskSerializer(task).data}
+    statuses = [task.status]
+    if not created:
+        previous = getattr(task, '_loaded_values', {}).get('status', task.status)
+        data["previous_status"] = previous
+        statuses.append(previous)
+    return make_event('created' if created else 'updated', data, statuses)
+
+
+@receiver(post_save, sender=Task)
+def publish_saved_task(sender, instance, created, **kwargs):
+    publish_on_commit(saved_event(instance, created))
+
+
+@receiver(post_delete, sender=Task)
+def publish_deleted_task(sender, instance, **kwargs):
+    publish_on_commit(make_event('deleted', {"id": instance.pk, "status": instance.status}, [instance.status]))
+
+
+@receiver(tasks_bulk_saved, sender=Task)
+def publish_bulk_saved_tasks(sender, instances, created, **kwargs):
+    # Rendering a large batch takes longer than writing it, so it happens
+    # after the commit instead of keeping the transaction open.
+    def publish():
+        broker = task_events.get()
+        for instance in instances:
+            broker.publish(saved_event(instance, created))
+    transaction.on_commit(publish)
@@ -0,0 +1,165 @@
+import datetime
+from collections import Counter
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .filters import STATUS_VALUES
+from .models import ArchivedTask, Task, TaskDailyCount, TaskStatusCount
+
+COMPLETED_STATUS = 'DONE'
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 366
+
+
+class CounterDelta:
+    """Accumulates counter changes for a batch of task writes."""
+
+    def __init__(self):
+        self.statuses = Counter()
+        self.days = {}
+
+    def add_day(self, day, field, amount):
+        counts = self.days.setdefault(day, Counter())
+        counts[field] += amount
+
+    def add(self, values, sign):
+        """Add (``sign=1``) or remove (``sign=-1``) one task's contribution."""
+        self.statuses[values['status']] += sign
+        self.add_day(timezone.localdate(values['created_at']), 'created', sign)
+        if values['status'] == COMPLETED_STATUS:
+            self.add_day(timezone.localdate(values['updated_at']), 'completed', sign)
+
+    def apply(self, using):
+        for task_status, amount in self.statuses.items():
+            if amount:
+                increment(TaskStatusCount, {'status': task_status}, {'count': amount}, using)
+        for day, counts in sorted(self.days.items()):
+            counts = {field: amount for field, amount in counts.items() if amount}
+            if counts:
+                increment(TaskDailyCount, {'day': day}, counts, using)
+
+
+def increment(model, lookup, amounts, using):
+    """Add ``amounts`` to the row matching ``lookup``, creating it if needed."""
+    manager = model.objects.using(using)
+    updates = {field: F(field) + amount for field, amount in amounts.items()}
+    if manager.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic(using=using):
+            manager.create(**lookup, **amounts)
+    except IntegrityError:
+        # Another writer created the row first.
+        manager.filter(**lookup).update(**updates)
+
+
+def current_values(task):
+    return {field: getattr(task, field) for field in Task.tracked_fields}
+
+
+def loaded_values(task):
+    """Values as last read from or written to the database, if complete."""
+    loaded = getattr(task, '_loaded_values', {})
+    if all(field in loaded for field in Task.tracked_fields):
+        return loaded
+    return None
+
+
+def record_saved(tasks, created, using=None):
+    using = using or router.db_for_write(Task)
+    delta = CounterDelta()
+    for task in tasks:
+        if not created:
+            previous = loaded_values(task)
+            if previous is None:
+                # The instance was not loaded from the database, so what it
+                # replaced is unknown; leave it to the next reconciliation.
+                continue
+            delta.add(previous, -1)
+        delta.add(current_values(task), 1)
+    delta.apply(using)
+
+
+def record_deleted(tasks, using=None):
+    using = using or router.db_for_write(Task)
+    delta = CounterDelta()
+    for task in tasks:
+        delta.add(loaded_values(task) or current_values(task), -1)
+    delta.apply(using)
+
+
+def rebuild(using=None):
+    """Recompute every counter from the task and archive tables."""
+    using = using or router.db_for_write(Task)
+    sources = [Task.objects.using(using), ArchivedTask.objects.using(using)]
+
+    by_status, created, completed = Counter(), Counter(), Counter()
+    for tasks in sources:
+        by_status.update(dict(tasks.values_list('status').annotate(count=Count('id')).order_by()))
+        created.update(dict(
+            tasks.annotate(day=TruncDate('created_at')).values_list('day').annotate(count=Count('id')).order_by()
+        ))
+        completed.update(dict(
+            tasks.filter(status=COMPLETED_STATUS).annotate(day=TruncDate('updated_at'))
+            .values_list('day').annotate(count=Count('id')).order_by()
+        ))
+
+    with transaction.atomic(using=using):
+        TaskStatusCount.objects.using(using).all().delete()
+        TaskStatusCount.objects.using(using).bulk_create([
+            TaskStatusCount(status=task_status, count=by_status.get(task_status, 0))
+            for task_status in STATUS_VALUES
+        ])
+        TaskDailyCount.objects.using(using).all().delete()
+        TaskDailyCount.objects.using(using).bulk_create([
+            TaskDailyCount(day=day, created=created.get(day, 0), completed=completed.get(day, 0))
+            for day in sorted(set(created) | set(completed))
+        ], batch_size=500)
+    return {'statuses': by_status, 'days': len(set(created) | set(completed))}
+
+
+def get_days(params):
+    value = params.get('days')
+    if not value:
+        return DEFAULT_DAYS
+    try:
+        days = int(value)
+    except ValueError:
+        raise ValidationError({'days': ["A valid integer is required."]})
+    if not 1 <= days <= MAX_DAYS:
+        raise ValidationError({'days': [f"Must be between 1 and {MAX_DAYS}."]})
+    return days
+
+
+def get_stats(days=DEFAULT_DAYS):
+    """
+    Read the dashboard aggregates from the counter tables. The cost depends
+    on the number of statuses and days requested, not on the number of tasks.
+    """
+    counts = dict(TaskStatusCount.objects.values_list('status', 'count'))
+    by_status = {task_status: counts.get(task_status, 0) for task_status in STATUS_VALUES}
+
+    end = timezone.localdate()
+    start = end - datetime.timedelta(days=days - 1)
+    rows = {
+        row.day: row
+        for row in TaskDailyCount.objects.filter(day__gte=start, day__lte=end)
+    }
+    daily = []
+    for offset in range(days):
+        day = start + datetime.timedelta(days=offset)
+        row = rows.get(day)
+        daily.append({
+            "date": day.isoformat(),
+            "created": row.created if row else 0,
+            "completed": row.completed if row else 0,
+        })
+
+    return {
+        "total": sum(by_status.values()),
+        "by_status": by_status,
+        "daily": daily,
+    }
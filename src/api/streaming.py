@@ -0,0 +1,70 @@
+import json
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Flush to the client once this many bytes have been buffered.
+STREAM_BUFFER_SIZE = 64 * 1024
+
+# Datetimes are left to DRF's encoder, which shortens them to milliseconds.
+ORJSON_OPTIONS = orjson and orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+json_encoder = encoders.JSONEncoder()
+
+
+def dumps_bytes(data):
+    """
+    Encode ``data`` to UTF-8 exactly like DRF's default JSONRenderer does,
+    with orjson when it is installed.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=json_encoder.default, option=ORJSON_OPTIONS)
+        except TypeError:
+            # Values orjson cannot encode, such as integers beyond 64 bits.
+            pass
+    return json.dumps(data, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def dumps(data):
+    return dumps_bytes(data).decode()
+
+
+def buffered(chunks):
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= STREAM_BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def ndjson_stream(items):
+    return buffered(dumps(item) + '\n' for item in items)
+
+
+def json_array_stream(items, envelope, key):
+    """
+    Stream ``envelope`` as a JSON object whose ``key`` member is the array
+    of ``items``. The opening of the document is sent on its own so that
+    clients receive the first byte before the first row is fetched.
+    """
+    head = dumps(envelope)[:-1]
+    yield head + ('' if head == '{' else ',') + dumps(key) + ':['
+
+    def body():
+        separator = ''
+        for item in items:
+            yield separator + dumps(item)
+            separator = ','
+        yield ']}'
+
+    yield from buffered(body())
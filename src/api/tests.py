@@ -1,3 +1,1677 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from .archive import archive_batch, get_cutoff
+from .cache import task_cache
+from .conditional import task_validators
+from .events import OVERFLOW, InMemoryBroker, event_stream, get_options, make_event, task_events
+from .hashing import PasswordHashingPool
+from .idempotency import IdempotencyMiddleware, prune_idempotency_records
+from .jobs import KINDS, JobKind, LeaseLost, RunningJob, claim, claimable_jobs, enqueue, retry_delay, run_job
+from .middleware import CompressionMiddleware, LoadSheddingMiddleware, PerformanceMiddleware, request_load
+from .models import ArchivedTask, IdempotencyRecord, Job, Task, TaskDailyCount, TaskStatusCount, TaskTombstone
+from .pagination import encode_cursor
+from .renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+from .routers import PrimaryReplicaRouter, ReplicaRoutingMiddleware, primary_reads, read_primary
+from .search import search_tasks
+from .serializers import TaskRowSerializer, TaskSerializer
+from .signals import tasks_bulk_saved
+from .streaming import dumps
+from .throttling import CacheBuckets, TokenBuckets
 
-# Create your tests here.
+
+class ClearCacheMixin:
+    """Start every test with an empty cache: no cached tasks and full rate limit buckets."""
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+
+
+class TaskCursorPaginationTests(ClearCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now() - timedelta(days=1)
+        # Tasks 2 and 3 share a creation time, so ties are broken by id.
+        offsets = [0, 1, 1, 2, 3, 4, 5]
+        cls.tasks = []
+        for index, offset in enumerate(offsets):
+            task = Task.objects.create(title=f'Task {index}', description='', status='DONE' if index % 2 else 'PENDING')
+            Task.objects.filter(pk=task.pk).update(created_at=start + timedelta(minutes=offset))
+            cls.tasks.append(task.pk)
+
+    def get_page(self, query):
+        response = APIClient().get(f'/api/tasks/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def walk(self, query, filters=''):
+        # Filters are not part of the cursor and are sent with every page.
+        pages = [self.get_page(f'{query}&{filters}')]
+        while pages[-1]['next']:
+            pages.append(self.get_page(f"cursor={pages[-1]['next']}&{filters}"))
+        return pages
+
+    def ids(self, page):
+        return [task['id'] for task in page['tasks']]
+
+    def test_next_cursors_return_every_task_once_in_order(self):
+        pages = self.walk('page_size=3')
+        self.assertEqual([len(page['tasks']) for page in pages], [3, 3, 1])
+        self.assertEqual([pk for page in pages for pk in self.ids(page)], self.tasks)
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_descending_ordering(self):
+        pages = self.walk('page_size=3&ordering=-created_at')
+        self.assertEqual([pk for page in pages for pk in self.ids(page)], self.tasks[::-1])
+
+    def test_previous_cursor_returns_the_previous_page(self):
+        pages = self.walk('page_size=3')
+        for before, after in zip(pages, pages[1:]):
+            previous = self.get_page(f"cursor={after['previous']}")
+            self.assertEqual(self.ids(previous), self.ids(before))
+            self.assertEqual(previous['next'] is not None, True)
+
+    def test_cursor_keeps_the_page_size(self):
+        first = self.get_page('page_size=2')
+        self.assertEqual(len(self.get_page(f"cursor={first['next']}")['tasks']), 2)
+
+    def test_filters_apply_to_every_page(self):
+        pages = self.walk('page_size=2', 'status=DONE')
+        expected = list(Task.objects.filter(status='DONE').order_by('created_at', 'id').values_list('id', flat=True))
+        self.assertEqual([pk for page in pages for pk in self.ids(page)], expected)
+
+        created = Task.objects.get(pk=self.tasks[3]).created_at.isoformat()
+        page = self.get_page(f"created_after={created.replace('+', '%2B')}")
+        self.assertEqual(self.ids(page), self.tasks[3:])
+        page = self.get_page(f"created_before={created.replace('+', '%2B')}")
+        self.assertEqual(self.ids(page), self.tasks[:3])
+
+    def test_invalid_parameters_are_rejected(self):
+        bad_cursors = [
+            'not-a-cursor',
+            encode_cursor({'o': 1, 'p': [timezone.now().isoformat(), 1], 'r': 0, 's': 2}),
+            encode_cursor({'o': 'title', 'p': [timezone.now().isoformat(), 1], 'r': 0, 's': 2}),
+            encode_cursor({'o': 'created_at', 'p': ['yesterday', 1], 'r': 0, 's': 2}),
+            encode_cursor({'o': 'created_at', 'p': [timezone.now().isoformat(), 1], 'r': 0, 's': 0}),
+            encode_cursor(['created_at']),
+        ]
+        for cursor in bad_cursors:
+            response = APIClient().get(f'/api/tasks/?cursor={cursor}')
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(response.json()['errors'], {'cursor': ['Invalid cursor.']})
+        for query in ('ordering=title', 'page_size=0', 'status=LATE', 'created_after=yesterday'):
+            response = APIClient().get(f'/api/tasks/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertEqual(response.json()['code'], 'API_TASK_LIST_ERROR')
+            self.assertIn('errors', response.json())
+
+    def test_query_plans_are_checked_past_the_cache(self):
+        Task.objects.create(title='Task', description='Body')
+        # The first page the command requests, now cached.
+        APIClient().get('/api/tasks/', {'ordering': 'created_at'})
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('served by an index', out.getvalue())
+        with self.assertRaisesMessage(CommandError, 'did not query a page of tasks'):
+            call_command('check_query_plans', '--path', '/api/tasks/cache-stats/', stdout=StringIO())
+
+
+class BulkTaskTests(ClearCacheMixin, TestCase):
+    def bulk(self, method, data):
+        return getattr(APIClient(), method)('/api/tasks/bulk/', data, format='json')
+
+    def counts(self):
+        return dict(TaskStatusCount.objects.filter(count__gt=0).values_list('status', 'count'))
+
+    def test_create_all_or_nothing(self):
+        response = self.bulk('post', {'tasks': [
+            {'title': 'A', 'description': 'Body'}, {'description': 'No title'}, {'title': 'C', 'description': 'Body'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['code'], 'API_TASK_BULK_CREATE_ERROR')
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_create_partial(self):
+        response = self.bulk('post', {'atomic': False, 'tasks': [
+            {'title': 'A', 'description': 'Body'}, {'description': 'No title'}, {'title': 'C', 'description': 'Body'},
+        ]})
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['code'], 'API_TASK_BULK_CREATE_PARTIAL')
+        self.assertEqual([task['title'] for task in response.json()['tasks']], ['A', 'C'])
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1])
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_update_all_or_nothing_and_partial(self):
+        task = Task.objects.create(title='A', description='')
+        items = [{'id': task.pk, 'title': 'B'}, {'id': task.pk + 100, 'title': 'X'}, {'id': 'one'}]
+        response = self.bulk('patch', {'tasks': items})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1, 2])
+        self.assertEqual(Task.objects.get().title, 'A')
+
+        response = self.bulk('patch', {'tasks': items, 'atomic': False})
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['code'], 'API_TASK_BULK_UPDATE_PARTIAL')
+        self.assertEqual(response.json()['errors'][0]['id'], task.pk + 100)
+        self.assertEqual(Task.objects.get().title, 'B')
+
+    def test_update_only_writes_the_fields_sent_for_each_task(self):
+        first = Task.objects.create(title='A', description='', status='PENDING')
+        second = Task.objects.create(title='B', description='', status='PENDING')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk('patch', {'tasks': [
+                {'id': first.pk, 'title': 'A2'}, {'id': second.pk, 'status': 'DONE'},
+            ]})
+        self.assertEqual(response.status_code, 200)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "api_task"')]
+        # One update per set of fields, then the updated_at stamp for both.
+        self.assertEqual(len(updates), 3)
+        self.assertFalse(any('"title"' in sql and '"status"' in sql for sql in updates))
+        self.assertFalse(any('"title"' in sql or '"status"' in sql for sql in updates[2:]))
+        self.assertEqual(
+            list(Task.objects.order_by('id').values_list('title', 'status')), [('A2', 'PENDING'), ('B', 'DONE')],
+        )
+
+    def test_delete_all_or_nothing_and_partial(self):
+        task = Task.objects.create(title='A', description='')
+        response = self.bulk('delete', {'ids': [task.pk, task.pk + 100]})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Task.objects.exists())
+        response = self.bulk('delete', {'ids': [task.pk, task.pk + 100], 'atomic': False})
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['ids'], [task.pk])
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASK_BULK_MAX_ITEMS=2)
+    def test_size_limit(self):
+        for method, key, items in (
+            ('post', 'tasks', [{'title': 'A', 'description': 'Body'}] * 3),
+            ('patch', 'tasks', [{'id': 1}] * 3),
+            ('delete', 'ids', [1, 2, 3]),
+        ):
+            response = self.bulk(method, {key: items})
+            self.assertEqual(response.status_code, 400, method)
+            self.assertIn(key, response.json()['errors'])
+        self.assertEqual(self.bulk('post', {'tasks': 'A'}).status_code, 400)
+        self.assertEqual(self.bulk('post', {'tasks': [], 'atomic': 'yes'}).status_code, 400)
+
+    def test_bulk_saves_run_the_write_hooks(self):
+        received = []
+
+        def receiver(sender, instances, created, **kwargs):
+            received.append(([instance.title for instance in instances], created))
+        tasks_bulk_saved.connect(receiver, sender=Task)
+        self.addCleanup(tasks_bulk_saved.disconnect, receiver, sender=Task)
+
+        client = APIClient()
+        self.bulk('post', {'tasks': [{'title': 'Quarterly report', 'description': 'Body'}]})
+        pk = Task.objects.get().pk
+        self.assertEqual(client.get(f'/api/tasks/{pk}/').json()['task']['status'], 'PENDING')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bulk('patch', {'tasks': [{'id': pk, 'status': 'DONE', 'title': 'Annual report'}]})
+
+        self.assertEqual(received, [(['Quarterly report'], True), (['Annual report'], False)])
+        self.assertEqual(self.counts(), {'DONE': 1})
+        self.assertEqual(client.get(f'/api/tasks/{pk}/').json()['task']['status'], 'DONE')
+        self.assertEqual(list(search_tasks(Task.objects.all(), 'annual').values_list('id', flat=True)), [pk])
+        self.assertFalse(search_tasks(Task.objects.all(), 'quarterly').exists())
+
+
+@override_settings(TASK_CHANGES_SETTLE_SECONDS=0)
+class TaskChangeFeedTests(ClearCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.start = timezone.now() - timedelta(hours=1)
+
+    def task(self, title, minutes):
+        task = Task.objects.create(title=title, description='Body')
+        Task.objects.filter(pk=task.pk).update(updated_at=self.start + timedelta(minutes=minutes))
+        return task.pk
+
+    def tombstone(self, task_id, minutes):
+        TaskTombstone.objects.create(task_id=task_id, deleted_at=self.start + timedelta(minutes=minutes))
+
+    def get_changes(self, query=''):
+        response = APIClient().get(f'/api/tasks/changes/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def describe(self, changes):
+        return [
+            ('upsert', change['task']['title']) if change['type'] == 'upsert' else ('delete', change['id'])
+            for change in changes
+        ]
+
+    def test_updates_and_deletions_are_merged_in_time_order(self):
+        self.task('A', 0)
+        self.tombstone(100, 1)
+        self.task('B', 2)
+        self.tombstone(101, 2)
+        self.task('C', 3)
+        self.assertEqual(self.describe(self.get_changes()['changes']), [
+            ('upsert', 'A'), ('delete', 100), ('upsert', 'B'), ('delete', 101), ('upsert', 'C'),
+        ])
+
+    def test_resume_token_walks_every_change_once(self):
+        for minutes in range(5):
+            self.task(f'T{minutes}', minutes)
+            self.tombstone(100 + minutes, minutes)
+        seen = []
+        page = self.get_changes('page_size=3')
+        while True:
+            seen += self.describe(page['changes'])
+            if not page['has_more']:
+                break
+            page = self.get_changes(f'page_size=3&since={page["next"]}')
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(len(set(seen)), 10)
+
+        # Only what changed after the token is reported.
+        token = page['next']
+        self.task('Late', 10)
+        self.tombstone(200, 11)
+        self.assertEqual(self.describe(self.get_changes(f'since={token}')['changes']), [('upsert', 'Late'), ('delete', 200)])
+
+    @override_settings(TASK_CHANGES_SETTLE_SECONDS=60)
+    def test_recent_changes_are_held_back(self):
+        self.task('Settled', 0)
+        Task.objects.create(title='Recent', description='Body')
+        page = self.get_changes()
+        self.assertEqual(self.describe(page['changes']), [('upsert', 'Settled')])
+
+        # The token stops before the held back change, so it is reported
+        # once it has settled.
+        Task.objects.filter(title='Recent').update(updated_at=self.start + timedelta(minutes=5))
+        self.assertEqual(self.describe(self.get_changes(f'since={page["next"]}')['changes']), [('upsert', 'Recent')])
+
+    def test_bulk_writes_stamp_rows_after_writing_them(self):
+        pk = self.task('A', 0)
+        before = timezone.now()
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().patch('/api/tasks/bulk/', {'tasks': [{'id': pk, 'status': 'DONE'}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "api_task"')]
+        self.assertNotIn('"updated_at"', updates[0])
+        self.assertIn('"updated_at"', updates[-1])
+        task = Task.objects.get(pk=pk)
+        self.assertGreaterEqual(task.updated_at, before)
+        self.assertEqual(response.json()['tasks'][0]['updated_at'], TaskSerializer(task).data['updated_at'])
+
+    def test_invalid_and_expired_tokens(self):
+        response = APIClient().get('/api/tasks/changes/?since=garbage')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['code'], 'API_TASK_CHANGES_ERROR')
+
+        expired = encode_cursor({'t': None, 'd': None, 'c': (timezone.now() - timedelta(days=31)).isoformat()})
+        response = APIClient().get(f'/api/tasks/changes/?since={expired}')
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()['code'], 'API_TASK_CHANGES_RESYNC_REQUIRED')
+
+
+class TaskSearchTests(ClearCacheMixin, TestCase):
+    def found(self, query):
+        return list(search_tasks(Task.objects.all(), query).values_list('title', flat=True))
+
+    def test_created_updated_and_deleted_tasks_are_indexed(self):
+        client = APIClient()
+        pk = client.post('/api/tasks/', {'title': 'Quarterly report', 'description': 'Body'}, format='json').json()['task']['id']
+        self.assertEqual(self.found('quarterly'), ['Quarterly report'])
+        client.patch(f'/api/tasks/{pk}/', {'title': 'Annual report'}, format='json')
+        self.assertEqual(self.found('quarterly'), [])
+        self.assertEqual(self.found('annual'), ['Annual report'])
+        client.delete(f'/api/tasks/{pk}/')
+        self.assertEqual(self.found('annual'), [])
+
+    def test_bulk_saves_and_deletes_are_indexed(self):
+        client = APIClient()
+        client.post('/api/tasks/bulk/', {'tasks': [
+            {'title': 'Fix login', 'description': 'Body'},
+            {'title': 'Fix signup', 'description': 'Body'},
+        ]}, format='json')
+        self.assertEqual(self.found('fix'), ['Fix login', 'Fix signup'])
+        login, signup = Task.objects.order_by('id').values_list('id', flat=True)
+        client.patch('/api/tasks/bulk/', {'tasks': [{'id': login, 'title': 'Fix password'}]}, format='json')
+        self.assertEqual(self.found('login'), [])
+        self.assertEqual(self.found('password'), ['Fix password'])
+        client.delete('/api/tasks/bulk/', {'ids': [login, signup]}, format='json')
+        self.assertEqual(self.found('fix'), [])
+
+    def test_rolled_back_writes_are_not_indexed(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Task.objects.create(title='Migration plan', description='Body')
+            raise RuntimeError
+        self.assertEqual(self.found('migration'), [])
+
+    def test_title_matches_rank_first_and_every_term_must_match(self):
+        Task.objects.create(title='Backup', description='Check the storage server')
+        Task.objects.create(title='Storage server', description='Upgrade')
+        Task.objects.create(title='Storage', description='Nothing else')
+        self.assertEqual(self.found('storage server'), ['Storage server', 'Backup'])
+        response = APIClient().get('/api/tasks/search/', {'q': 'storage server'})
+        self.assertEqual([task['title'] for task in response.json()['tasks']], ['Storage server', 'Backup'])
+
+@override_settings(API_THROTTLE={'ENABLED': False})
+class TaskExportTests(ClearCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tasks = [
+            Task.objects.create(title=f'Task {i}', description='Body', status=task_status)
+            for i, task_status in enumerate(['PENDING', 'DONE', 'DONE'])
+        ]
+        Task.objects.filter(pk=cls.tasks[0].pk).update(created_at=timezone.now() - timedelta(days=2))
+
+    def export(self, **params):
+        response = APIClient().get('/api/tasks/export/', params, HTTP_ACCEPT='application/msgpack')
+        return response, b''.join(response.streaming_content)
+
+    def test_streams_ndjson_whatever_the_accept_header(self):
+        response, content = self.export()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(rows, TaskSerializer(Task.objects.order_by('id'), many=True).data)
+
+    def test_json_output_is_one_document(self):
+        response, content = self.export(output='json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        document = json.loads(content)
+        self.assertEqual(document['code'], 'API_TASK_EXPORT_SUCCESS')
+        self.assertEqual([task['id'] for task in document['tasks']], [task.pk for task in self.tasks])
+
+    def test_list_filters_apply(self):
+        _, content = self.export(status='DONE')
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [self.tasks[1].pk, self.tasks[2].pk])
+        _, content = self.export(status='DONE', created_before=(timezone.now() - timedelta(days=1)).isoformat(), output='json')
+        self.assertEqual(json.loads(content)['tasks'], [])
+        _, content = self.export(created_before=(timezone.now() - timedelta(days=1)).isoformat())
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [self.tasks[0].pk])
+
+    def test_fields_trim_every_row(self):
+        _, content = self.export(fields='title,id')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(rows, [{'title': task.title, 'id': task.pk} for task in self.tasks])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params, field in (({'output': 'csv'}, 'output'), ({'status': 'LATE'}, 'status'), ({'fields': 'owner'}, 'fields')):
+            response = APIClient().get('/api/tasks/export/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertEqual(response.json()['code'], 'API_TASK_EXPORT_ERROR')
+            self.assertEqual(list(response.json()['errors']), [field])
+
+class TaskStatsTests(ClearCacheMixin, TestCase):
+    def counts(self):
+        return dict(TaskStatusCount.objects.filter(count__gt=0).values_list('status', 'count'))
+
+    def today(self):
+        row = TaskDailyCount.objects.filter(day=timezone.localdate()).first()
+        return (row.created, row.completed) if row else (0, 0)
+
+    def test_counters_follow_single_writes(self):
+        client = APIClient()
+        pk = client.post('/api/tasks/', {'title': 'Task', 'description': 'Body'}, format='json').json()['task']['id']
+        client.post('/api/tasks/', {'title': 'Other', 'description': 'Body'}, format='json')
+        self.assertEqual(self.counts(), {'PENDING': 2})
+        self.assertEqual(self.today(), (2, 0))
+
+        client.patch(f'/api/tasks/{pk}/', {'status': 'DONE'}, format='json')
+        self.assertEqual(self.counts(), {'PENDING': 1, 'DONE': 1})
+        self.assertEqual(self.today(), (2, 1))
+        client.patch(f'/api/tasks/{pk}/', {'title': 'Renamed'}, format='json')
+        self.assertEqual(self.counts(), {'PENDING': 1, 'DONE': 1})
+        self.assertEqual(self.today(), (2, 1))
+
+        client.delete(f'/api/tasks/{pk}/')
+        self.assertEqual(self.counts(), {'PENDING': 1})
+        self.assertEqual(self.today(), (1, 0))
+
+    def test_stats_endpoint_reads_the_counters(self):
+        Task.objects.create(title='Task', description='Body', status='DONE')
+        Task.objects.create(title='Task', description='Body')
+        response = APIClient().get('/api/tasks/stats/', {'days': 1})
+        stats = response.json()['stats']
+        self.assertEqual(stats['total'], 2)
+        self.assertEqual(stats['by_status'], {'DONE': 1, 'IN_PROGRESS': 0, 'PENDING': 1})
+        self.assertEqual(stats['daily'], [{'date': timezone.localdate().isoformat(), 'created': 2, 'completed': 1}])
+        self.assertEqual(APIClient().get('/api/tasks/stats/', {'days': 0}).status_code, 400)
+
+    def test_reconcile_repairs_drift(self):
+        Task.objects.create(title='Task', description='Body', status='DONE')
+        Task.objects.create(title='Task', description='Body')
+        # Writes that bypass the signals, as raw SQL or a restored backup would.
+        Task.objects.update(status='IN_PROGRESS')
+        TaskDailyCount.objects.all().delete()
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('reconcile_task_stats', '--check', stdout=out)
+        self.assertIn('status IN_PROGRESS: 0 -> 2', out.getvalue())
+        self.assertEqual(self.counts(), {'IN_PROGRESS': 2})
+        self.assertEqual(self.today(), (2, 0))
+
+        out = StringIO()
+        call_command('reconcile_task_stats', '--check', stdout=out)
+        self.assertIn('0 corrected', out.getvalue())
+
+
+class TaskArchiveTests(ClearCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        start = timezone.now() - timedelta(days=200)
+        # Odd tasks are old DONE tasks and get archived, so archived and live
+        # tasks alternate in creation order.
+        self.tasks = []
+        for index in range(8):
+            task = Task.objects.create(title=f'Task {index}', description='Body', status='DONE' if index % 2 else 'PENDING')
+            Task.objects.filter(pk=task.pk).update(
+                created_at=start + timedelta(minutes=index), updated_at=start + timedelta(minutes=index),
+            )
+            self.tasks.append(task.pk)
+        self.archived = self.tasks[1::2]
+
+    def counts(self):
+        return dict(TaskStatusCount.objects.filter(count__gt=0).values_list('status', 'count'))
+
+    def archive(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return archive_batch(get_cutoff(90), 10)
+
+    def test_archive_batch_moves_old_done_tasks(self):
+        Task.objects.create(title='Recent', description='Body', status='DONE')
+        counts = self.counts()
+        self.assertEqual(archive_batch(get_cutoff(90), 3), self.archived[:3])
+        self.assertEqual(archive_batch(get_cutoff(90), 3), self.archived[3:])
+        self.assertEqual(archive_batch(get_cutoff(90), 3), [])
+
+        self.assertFalse(Task.objects.filter(pk__in=self.archived).exists())
+        self.assertEqual(sorted(ArchivedTask.objects.values_list('id', flat=True)), self.archived)
+        archived = ArchivedTask.objects.get(pk=self.archived[0])
+        self.assertEqual((archived.title, archived.status), ('Task 1', 'DONE'))
+        # Moving is not deleting: no tombstones, and the counters still count them.
+        self.assertFalse(TaskTombstone.objects.exists())
+        self.assertEqual(self.counts(), counts)
+
+    def test_large_batches_delete_in_chunks(self):
+        Task.objects.bulk_create([Task(title=f'Bulk {index}', description='Body', status='DONE') for index in range(1200)])
+        Task.objects.filter(title__startswith='Bulk').update(updated_at=timezone.now() - timedelta(days=100))
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(len(archive_batch(get_cutoff(90), 1200)), 1200)
+        deletes = [query['sql'] for query in captured.captured_queries if query['sql'].startswith('DELETE FROM api_task ')]
+        self.assertEqual([sql.count(',') + 1 for sql in deletes], [500, 500, 200])
+        self.assertEqual(len(archive_batch(get_cutoff(90), 1200)), 4)
+        self.assertEqual(ArchivedTask.objects.count(), 1204)
+        self.assertFalse(Task.objects.filter(status='DONE').exists())
+
+    def test_list_merges_archived_tasks_in_order(self):
+        self.archive()
+        for ordering, expected in (('created_at', self.tasks), ('-created_at', self.tasks[::-1])):
+            pages = [APIClient().get(f'/api/tasks/?include_archived=true&page_size=3&ordering={ordering}').json()]
+            while pages[-1]['next']:
+                pages.append(APIClient().get(f"/api/tasks/?include_archived=true&cursor={pages[-1]['next']}").json())
+            self.assertEqual([task['id'] for page in pages for task in page['tasks']], expected)
+
+            previous = APIClient().get(f"/api/tasks/?include_archived=true&cursor={pages[1]['previous']}").json()
+            self.assertEqual(previous['tasks'], pages[0]['tasks'])
+
+        tasks = APIClient().get('/api/tasks/').json()['tasks']
+        self.assertEqual([task['id'] for task in tasks], self.tasks[::2])
+
+    def test_archived_tasks_can_still_be_retrieved(self):
+        pk = self.archived[0]
+        before = APIClient().get(f'/api/tasks/{pk}/').json()['task']
+        self.archive()
+        for path in (f'/api/tasks/{pk}/', f'/api/async/tasks/{pk}/'):
+            response = APIClient().get(path)
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(response.json()['task'], before)
+        ArchivedTask.objects.filter(pk=pk).delete()
+        task_cache.invalidate_tasks([pk])
+        for path in (f'/api/tasks/{pk}/', f'/api/async/tasks/{pk}/'):
+            self.assertEqual(APIClient().get(path).status_code, 404, path)
+
+    def test_async_list_validators_include_archived_tasks(self):
+        self.archive()
+        sync = APIClient().get('/api/tasks/?include_archived=true')
+        response = APIClient().get('/api/async/tasks/?include_archived=true')
+        self.assertEqual(response.json(), sync.json())
+        self.assertEqual(response['ETag'], sync['ETag'])
+        self.assertNotEqual(response['ETag'], APIClient().get('/api/async/tasks/?include_archived=false')['ETag'])
+
+
+@override_settings(RESPONSE_COMPRESSION={'MIN_SIZE': 1024})
+class CompressionMiddlewareTests(ClearCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(title='Task', description='Long description. ' * 100)
+
+    def test_compressed_responses_keep_a_strong_etag_for_if_match(self):
+        client = APIClient(HTTP_ACCEPT_ENCODING='gzip')
+        for method, data in (('patch', {'title': 'Patched'}), ('put', {'title': 'Put', 'description': 'Body'})):
+            response = client.get(f'/api/tasks/{self.task.pk}/')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(json.loads(gzip.decompress(response.content))['task']['id'], self.task.pk)
+            etag = response['ETag']
+            self.assertTrue(etag.startswith('"'), etag)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                response = getattr(client, method)(
+                    f'/api/tasks/{self.task.pk}/', data, format='json', HTTP_IF_MATCH=etag,
+                )
+            self.assertEqual(response.status_code, 200, method)
+        self.assertEqual(Task.objects.get(pk=self.task.pk).title, 'Put')
+
+    def test_small_responses_and_other_codings_are_not_compressed(self):
+        response = APIClient(HTTP_ACCEPT_ENCODING='gzip').get('/api/tasks/cache-stats/')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = APIClient(HTTP_ACCEPT_ENCODING='identity').get(f'/api/tasks/{self.task.pk}/')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    async def test_async_responses_are_compressed(self):
+        async def get_response(request):
+            return HttpResponse(b'x' * 2048)
+        middleware = CompressionMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), b'x' * 2048)
+
+
+class RendererTests(ClearCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tasks = [Task.objects.create(title=f'Task {i}', description='Body') for i in range(2)]
+        Task.objects.filter(pk=cls.tasks[1].pk).update(status='DONE')
+
+    def data(self):
+        return {
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'aware': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'naive': datetime(2024, 5, 1, 12, 30, 15),
+            'date': date(2024, 5, 1),
+            'decimal': Decimal('1.50'),
+            'text': 'line\u2028separator',
+        }
+
+    def test_orjson_encodes_like_drf(self):
+        self.assertEqual(ORJSONRenderer().render(self.data()), JSONRenderer().render(self.data()))
+        self.assertEqual(json.loads(ORJSONRenderer().render(self.data()))['aware'], '2024-05-01T12:30:15.123456Z')
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_msgpack_encodes_like_json(self):
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render(self.data())), json.loads(JSONRenderer().render(self.data())))
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_msgpack_is_negotiated(self):
+        for path, params in ((f'/api/tasks/{self.tasks[0].pk}/', {}), ('/api/tasks/', {}), ('/api/tasks/search/', {'q': 'task'})):
+            expected = APIClient().get(path, params).json()
+            for response in (
+                APIClient().get(path, params, HTTP_ACCEPT='application/msgpack'),
+                APIClient().get(path, {**params, 'format': 'msgpack'}),
+            ):
+                self.assertEqual(response.status_code, 200, path)
+                self.assertEqual(response['Content-Type'], 'application/msgpack')
+                self.assertEqual(msgpack.unpackb(response.content), expected)
+        response = APIClient().get('/api/tasks/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    @override_settings(TASK_CHANGES_SETTLE_SECONDS=0)
+    def test_fields_trim_changes_and_search(self):
+        changes = APIClient().get('/api/tasks/changes/', {'fields': 'status,id'}).json()['changes']
+        self.assertEqual([change['task'] for change in changes], [
+            {'status': 'PENDING', 'id': self.tasks[0].pk}, {'status': 'DONE', 'id': self.tasks[1].pk},
+        ])
+        tasks = APIClient().get('/api/tasks/search/', {'q': 'task', 'fields': 'title'}).json()['tasks']
+        self.assertEqual(sorted(tasks, key=lambda task: task['title']), [{'title': 'Task 0'}, {'title': 'Task 1'}])
+        for path, params in (('/api/tasks/changes/', {}), ('/api/tasks/search/', {'q': 'task'})):
+            response = APIClient().get(path, {**params, 'fields': 'id,owner'})
+            self.assertEqual(response.status_code, 400, path)
+            self.assertIn('fields', response.json()['errors'])
+
+class TaskCacheTests(ClearCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        task_cache.reset_stats()
+        self.task = Task.objects.create(title='Cached', description='Body')
+
+    def title(self, path):
+        return APIClient().get(path).json()['task']['title']
+
+    def update(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().patch(f'/api/tasks/{self.task.pk}/', {'title': title}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_hits_and_misses_are_counted(self):
+        APIClient().get(f'/api/tasks/{self.task.pk}/')
+        APIClient().get(f'/api/tasks/{self.task.pk}/')
+        APIClient().get('/api/tasks/')
+        APIClient().get('/api/tasks/')
+        APIClient().get('/api/tasks/?status=DONE')
+        self.assertEqual(task_cache.get_stats(), {
+            'task': {'hits': 1, 'misses': 1},
+            'list': {'hits': 1, 'misses': 2},
+        })
+        response = APIClient().get('/api/tasks/cache-stats/')
+        self.assertEqual(response.json()['stats']['task'], {'hits': 1, 'misses': 1})
+
+    def test_writes_invalidate_the_task_and_the_lists(self):
+        self.assertEqual(self.title(f'/api/tasks/{self.task.pk}/'), 'Cached')
+        self.assertEqual(APIClient().get('/api/tasks/').json()['tasks'][0]['title'], 'Cached')
+        self.update('Updated')
+        self.assertEqual(self.title(f'/api/tasks/{self.task.pk}/'), 'Updated')
+        self.assertEqual(APIClient().get('/api/tasks/').json()['tasks'][0]['title'], 'Updated')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            APIClient().delete(f'/api/tasks/{self.task.pk}/')
+        self.assertEqual(APIClient().get(f'/api/tasks/{self.task.pk}/').status_code, 404)
+        self.assertEqual(APIClient().get('/api/tasks/').json()['tasks'], [])
+
+    def test_equivalent_ids_share_one_entry(self):
+        self.assertEqual(self.title(f'/api/tasks/0{self.task.pk}/'), 'Cached')
+        self.update('Updated')
+        self.assertEqual(self.title(f'/api/tasks/0{self.task.pk}/'), 'Updated')
+        self.assertEqual(task_cache.get_stats()['task'], {'hits': 0, 'misses': 2})
+
+    def test_invalid_ids_are_not_found(self):
+        for pk in ('abc', '1e3', '99999'):
+            response = APIClient().get(f'/api/tasks/{pk}/')
+            self.assertEqual(response.status_code, 404, pk)
+            self.assertEqual(response.json()['code'], 'API_TASK_NOT_FOUND')
+
+    def test_value_computed_across_a_write_is_not_kept(self):
+        key = task_cache.task_key(self.task.pk)
+
+        def compute():
+            # A concurrent write commits and invalidates after this read.
+            value = {'title': 'Stale'}
+            task_cache.invalidate_tasks([self.task.pk])
+            return value
+
+        self.assertEqual(task_cache.get_or_compute('task', key, compute), {'title': 'Stale'})
+        self.assertIsNone(task_cache.cache.get(key))
+        task_cache.get_or_compute('task', key, lambda: {'title': 'Fresh'})
+        self.assertEqual(task_cache.cache.get(key), {'title': 'Fresh'})
+
+
+class ConditionalRequestTests(ClearCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(title='Task', description='Body')
+        self.url = f'/api/tasks/{self.task.pk}/'
+        self.client = APIClient()
+
+    def test_unchanged_task_is_not_modified(self):
+        response = self.client.get(self.url)
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        since = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_matching_if_match_updates_the_task(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(self.url, {'title': 'Renamed'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url)['ETag'], response['ETag'])
+
+    def test_stale_if_match_is_rejected(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.url, {'title': 'First'}, format='json')
+        for method in (self.client.patch, self.client.put):
+            response = method(self.url, {'title': 'Second', 'description': 'Body'}, format='json', HTTP_IF_MATCH=etag)
+            self.assertEqual(response.status_code, 412)
+            self.assertEqual(response.json()['code'], 'API_TASK_PRECONDITION_FAILED')
+        self.assertEqual(Task.objects.get(pk=self.task.pk).title, 'First')
+
+    def test_list_etag_changes_when_a_task_changes(self):
+        etag = self.client.get('/api/tasks/')['ETag']
+        self.assertEqual(self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Filters are part of the validator.
+        self.assertNotEqual(self.client.get('/api/tasks/?status=PENDING')['ETag'], etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.url, {'title': 'Renamed'}, format='json')
+        response = self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/tasks/', {'title': 'Another', 'description': 'Body'}, format='json')
+        self.assertNotEqual(self.client.get('/api/tasks/')['ETag'], response['ETag'])
+
+
+@override_settings(TASK_CACHE={'ENABLED': False}, API_THROTTLE={'ENABLED': False})
+class ConcurrentIfMatchTests(TransactionTestCase):
+    def test_only_one_of_two_concurrent_writes_with_the_same_etag_succeeds(self):
+        task = Task.objects.create(title='Task', description='Body')
+        url = f'/api/tasks/{task.pk}/'
+        etag = task_validators(task.pk, task.updated_at)[0]
+        barrier = threading.Barrier(2)
+        responses = []
+
+        def send(title):
+            try:
+                barrier.wait()
+                responses.append(APIClient().patch(url, {'title': title}, format='json', HTTP_IF_MATCH=etag))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send, args=(title,)) for title in ('First', 'Second')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(response.status_code for response in responses), [200, 412])
+        winner = next(response for response in responses if response.status_code == 200)
+        self.assertEqual(Task.objects.using('default').get(pk=task.pk).title, winner.json()['task']['title'])
+
+
+class AsyncTaskViewTests(ClearCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        task_cache.reset_stats()
+        self.task = Task.objects.create(title='Task', description='Body')
+
+    def test_reads_match_and_share_the_sync_cache(self):
+        for path in (f'tasks/{self.task.pk}/', 'tasks/', 'tasks/?fields=id,title'):
+            sync = APIClient().get(f'/api/{path}')
+            response = APIClient().get(f'/api/async/{path}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), sync.json())
+            self.assertEqual(response['ETag'], sync['ETag'])
+        self.assertEqual(task_cache.get_stats(), {
+            'task': {'hits': 1, 'misses': 1},
+            'list': {'hits': 2, 'misses': 2},
+        })
+
+    def test_writes_invalidate_the_shared_cache(self):
+        APIClient().get(f'/api/async/tasks/{self.task.pk}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().patch(f'/api/async/tasks/{self.task.pk}/', {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(APIClient().get(f'/api/tasks/{self.task.pk}/').json()['task']['title'], 'Renamed')
+
+    def test_stale_if_match_is_rejected(self):
+        etag = APIClient().get(f'/api/async/tasks/{self.task.pk}/')['ETag']
+        Task.objects.get(pk=self.task.pk).save()
+        response = APIClient().patch(
+            f'/api/async/tasks/{self.task.pk}/', {'title': 'Renamed'}, format='json', HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response.json()['code'], 'API_TASK_PRECONDITION_FAILED')
+
+    def test_invalid_ids_are_not_found(self):
+        for method in ('get', 'put', 'patch', 'delete'):
+            response = getattr(APIClient(), method)('/api/async/tasks/abc/', {'title': 'Task'}, format='json')
+            self.assertEqual(response.status_code, 404, method)
+            self.assertEqual(response.json()['code'], 'API_TASK_NOT_FOUND')
+
+    def test_unexpected_write_errors_are_bad_requests(self):
+        with mock.patch.object(TaskSerializer, 'save', side_effect=ValueError('boom')):
+            response = APIClient().post('/api/async/tasks/', {'title': 'Task', 'description': 'Body'}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['code'], 'API_TASK_CREATE_ERROR')
+            response = APIClient().patch(f'/api/async/tasks/{self.task.pk}/', {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['code'], 'API_TASK_UPDATE_ERROR')
+
+    def test_creates_run_in_a_transaction(self):
+        with mock.patch('api.async_views.transaction.atomic', wraps=transaction.atomic) as atomic:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = APIClient().post('/api/async/tasks/', {'title': 'Created', 'description': 'Body'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        atomic.assert_called_once_with()
+        self.assertEqual(APIClient().get(f"/api/tasks/{response.json()['task']['id']}/").json()['task']['title'], 'Created')
+
+    def test_database_errors_are_server_errors(self):
+        client = APIClient(raise_request_exception=False)
+        with mock.patch.object(TaskSerializer, 'save', side_effect=OperationalError('database is locked')):
+            response = client.post('/api/async/tasks/', {'title': 'Task', 'description': 'Body'}, format='json')
+        self.assertEqual(response.status_code, 500)
+
+    @override_settings(API_THROTTLE={'SCOPES': {'read': {'RATE': 1, 'BURST': 1}, 'write': {'RATE': 1, 'BURST': 1}}})
+    def test_requests_share_the_rate_limits_of_the_drf_views(self):
+        client = APIClient()
+        self.assertEqual(client.get(f'/api/tasks/{self.task.pk}/').status_code, 200)
+        for path in (f'/api/async/tasks/{self.task.pk}/', '/api/async/tasks/'):
+            response = client.get(path)
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.json()['code'], 'API_RATE_LIMITED')
+            self.assertEqual(response['Retry-After'], '1')
+        statuses = [
+            client.post('/api/async/tasks/', {'title': 'Task', 'description': 'Body'}, format='json').status_code
+            for _ in range(2)
+        ]
+        self.assertEqual(statuses, [201, 429])
+
+
+@override_settings(PERFORMANCE_METRICS={'SERVER_TIMING': True}, TASK_CACHE={'ENABLED': False})
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.task = Task.objects.create(title='Task', description='Body')
+
+    def queries(self, response):
+        return int(re.search(r'"(\d+) queries"', response['Server-Timing']).group(1))
+
+    def test_runs_natively_under_wsgi_and_asgi(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertFalse(iscoroutinefunction(PerformanceMiddleware(lambda request: HttpResponse())))
+        self.assertTrue(iscoroutinefunction(PerformanceMiddleware(get_response)))
+
+    def test_sync_request_queries_are_counted(self):
+        response = APIClient().get(f'/api/tasks/{self.task.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(self.queries(response), 1)
+
+    async def test_async_request_queries_are_counted(self):
+        response = await self.async_client.get(f'/api/async/tasks/{self.task.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(self.queries(response), 1)
+
+
+@override_settings(TASK_EVENTS={'BROKER': 'api.events.InMemoryBroker', 'QUEUE_SIZE': 2, 'HEARTBEAT_SECONDS': 0.01})
+class TaskEventTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        task_events.reset()
+        self.addCleanup(task_events.reset)
+
+    def event(self, kind, *statuses):
+        return make_event(kind, {"kind": kind}, statuses)
+
+    async def drain(self, subscriber):
+        # Deliveries are scheduled on the subscriber's loop.
+        await asyncio.sleep(0)
+        events = []
+        while not subscriber.queue.empty():
+            event = subscriber.queue.get_nowait()
+            events.append(event if event is OVERFLOW else event['event'])
+        return events
+
+    async def test_events_fan_out_to_matching_subscribers(self):
+        broker = InMemoryBroker(get_options())
+        everything = broker.subscribe()
+        done = broker.subscribe(['DONE'])
+        broker.publish(self.event('created', 'PENDING'))
+        broker.publish(self.event('updated', 'DONE', 'PENDING'))
+        self.assertEqual(await self.drain(everything), ['task.created', 'task.updated'])
+        self.assertEqual(await self.drain(done), ['task.updated'])
+
+        broker.unsubscribe(done)
+        broker.publish(self.event('deleted', 'DONE'))
+        self.assertEqual(await self.drain(everything), ['task.deleted'])
+        self.assertEqual(await self.drain(done), [])
+
+    async def test_events_published_from_other_threads_are_delivered(self):
+        broker = InMemoryBroker(get_options())
+        subscriber = broker.subscribe()
+        thread = threading.Thread(target=broker.publish, args=[self.event('created', 'PENDING')])
+        thread.start()
+        event = await subscriber.get(1)
+        thread.join()
+        self.assertEqual(event['event'], 'task.created')
+
+    async def test_slow_subscribers_are_told_to_resync(self):
+        broker = InMemoryBroker(get_options())
+        subscriber = broker.subscribe()
+        for _ in range(3):
+            broker.publish(self.event('created', 'PENDING'))
+        self.assertEqual(await self.drain(subscriber), [OVERFLOW])
+
+        broker.publish(self.event('created', 'PENDING'))
+        subscriber.queue.put_nowait(OVERFLOW)
+        chunks = [chunk async for chunk in event_stream(broker, subscriber, get_options())]
+        self.assertEqual(chunks[0], b'retry: 3000\n\n')
+        self.assertTrue(chunks[1].startswith(b'event: overflow\n'))
+        self.assertIn(b'API_TASK_EVENTS_OVERFLOW', chunks[1])
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    async def test_idle_streams_get_heartbeats(self):
+        broker = InMemoryBroker(get_options())
+        subscriber = broker.subscribe()
+        stream = event_stream(broker, subscriber, get_options())
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        self.assertEqual(await anext(stream), b': heartbeat\n\n')
+        broker.publish(self.event('created', 'PENDING'))
+        self.assertEqual(await anext(stream), b'event: task.created\ndata: {"kind":"created"}\n\n')
+        await stream.aclose()
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    async def test_task_writes_reach_the_stream_after_commit(self):
+        subscriber = task_events.get().subscribe(['DONE'])
+
+        def write():
+            with self.captureOnCommitCallbacks(execute=True):
+                task = Task.objects.create(title='Task', description='Body')
+            with self.captureOnCommitCallbacks(execute=True):
+                task.status = 'DONE'
+                task.save()
+            return task.pk
+        pk = await sync_to_async(write)()
+
+        event = await subscriber.get(1)
+        self.assertEqual(event['event'], 'task.updated')
+        self.assertEqual(event['statuses'], ['DONE', 'PENDING'])
+        data = json.loads(event['data'])
+        self.assertEqual((data['task']['id'], data['previous_status']), (pk, 'PENDING'))
+        self.assertTrue(subscriber.queue.empty())
+
+    async def test_stream_rejects_bad_filters_and_excess_clients(self):
+        response = await self.async_client.get('/api/async/tasks/events/?status=LATE')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['code'], 'API_TASK_EVENTS_ERROR')
+        with override_settings(TASK_EVENTS={'MAX_SUBSCRIBERS': 0}):
+            task_events.reset()
+            response = await self.async_client.get('/api/async/tasks/events/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(json.loads(response.content)['code'], 'API_TASK_EVENTS_UNAVAILABLE')
+
+
+class TaskRowSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Task.objects.create(title='Plain', description='Plain description')
+        Task.objects.create(title='Unicode ✓ "quoted"', description='Line\nbreak\ttab \\ é', status='DONE')
+        Task.objects.create(title='', description='', status='IN_PROGRESS')
+
+    def assertSameJSON(self, queryset):
+        expected = dumps(TaskSerializer(queryset, many=True).data)
+        actual = dumps(TaskRowSerializer().serialize(TaskRowSerializer().values_list(queryset)))
+        self.assertEqual(actual.encode(), expected.encode())
+
+    def test_matches_task_serializer(self):
+        self.assertSameJSON(Task.objects.order_by('id'))
+
+    def test_matches_task_serializer_in_other_timezone(self):
+        with timezone.override('America/Sao_Paulo'):
+            self.assertSameJSON(Task.objects.order_by('id'))
+
+    def test_list_endpoint_uses_same_representation(self):
+        response = APIClient().get('/api/tasks/')
+        expected = TaskSerializer(Task.objects.order_by('created_at', 'id'), many=True).data
+        self.assertEqual(response.json()['tasks'], expected)
+
+
+class UserQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.groups = [Group.objects.create(name=f'group-{i}') for i in range(5)]
+        cls.permissions = list(Permission.objects.all()[:3])
+
+    def create_users(self, count):
+        for i in range(User.objects.count(), User.objects.count() + count):
+            user = User.objects.create(username=f'user-{i}')
+            user.groups.set(self.groups)
+            user.user_permissions.set(self.permissions)
+
+    def count_queries(self, method, *args, **kwargs):
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(APIClient(), method)(*args, **kwargs)
+        self.assertLess(response.status_code, 300, response.content)
+        return len(captured)
+
+    def test_list_query_count_is_independent_of_user_count(self):
+        self.create_users(2)
+        small = self.count_queries('get', '/api/users/')
+        self.create_users(20)
+        self.assertEqual(self.count_queries('get', '/api/users/'), small)
+
+    def test_list_prefetches_relations(self):
+        self.create_users(5)
+        with self.assertNumQueries(3):
+            APIClient().get('/api/users/')
+
+    def test_retrieve_prefetches_relations(self):
+        self.create_users(1)
+        user = User.objects.get()
+        with self.assertNumQueries(3):
+            response = APIClient().get(f'/api/users/{user.pk}/')
+        self.assertEqual(sorted(response.json()['user']['groups']), sorted(group.pk for group in self.groups))
+
+    def test_group_validation_query_count_is_independent_of_group_count(self):
+        self.create_users(1)
+        user = User.objects.get()
+        one = self.count_queries('patch', f'/api/users/{user.pk}/', {'groups': [self.groups[0].pk]}, format='json')
+        every = self.count_queries('patch', f'/api/users/{user.pk}/', {'groups': [g.pk for g in self.groups]}, format='json')
+        self.assertEqual(one, every)
+        self.assertEqual(user.groups.count(), len(self.groups))
+
+    def test_unknown_group_is_rejected(self):
+        self.create_users(1)
+        user = User.objects.get()
+        for method in ('put', 'patch'):
+            response = getattr(APIClient(), method)(
+                f'/api/users/{user.pk}/', {'username': user.username, 'groups': [self.groups[0].pk, 999]}, format='json',
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['code'], 'API_GROUP_NOT_FOUND')
+            self.assertEqual(response.json()['errors'], {'groups': ['One or more groups do not exist.']})
+        self.assertEqual(list(user.groups.all()), list(self.groups))
+
+    def test_other_invalid_groups_are_update_errors(self):
+        # Only ids that do not exist get API_GROUP_NOT_FOUND; any other
+        # invalid value is still an API_USER_UPDATE_ERROR.
+        self.create_users(1)
+        user = User.objects.get()
+        for groups in (['abc'], 'abc', [True]):
+            response = APIClient().patch(f'/api/users/{user.pk}/', {'groups': groups}, format='json')
+            self.assertEqual(response.status_code, 400, groups)
+            self.assertEqual(response.json()['code'], 'API_USER_UPDATE_ERROR', groups)
+        self.assertEqual(list(user.groups.all()), list(self.groups))
+
+
+@override_settings(
+    PASSWORD_HASHING_POOL={'EXECUTOR': 'thread', 'WORKERS': 1, 'MAX_PENDING': 1},
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class PasswordHashingPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = PasswordHashingPool()
+        self.addCleanup(self.pool.shutdown)
+
+    def test_hashes_are_usable(self):
+        hashed = self.pool.hash_many(['first-password', 'second-password'])
+        self.assertTrue(check_password('first-password', hashed[0]))
+        self.assertTrue(check_password('second-password', hashed[1]))
+        self.assertTrue(check_password('third-password', self.pool.hash('third-password')))
+
+    def test_failed_submit_releases_its_slot(self):
+        executor = self.pool.get_executor()
+        with mock.patch.object(executor, 'submit', side_effect=RuntimeError('cannot schedule new futures')):
+            with self.assertRaises(RuntimeError):
+                self.pool.hash('password')
+        # With MAX_PENDING at 1, a leaked slot would block this call forever.
+        self.assertTrue(self.pool.slots.acquire(timeout=1))
+        self.pool.slots.release()
+        self.assertTrue(check_password('password', self.pool.hash('password')))
+
+
+class BenchmarkCommandTests(SimpleTestCase):
+    def test_invalid_arguments_are_rejected_before_any_work(self):
+        for args in (['--tasks', '0'], ['--users', '0'], ['--requests', '0'], ['--concurrency', '0'], ['--threshold', '-1']):
+            with mock.patch('api.management.commands.benchmark.benchmark_databases') as databases:
+                with self.assertRaises(CommandError):
+                    call_command('benchmark', *args)
+            databases.assert_not_called()
+
+
+class TokenBucketTests(ClearCacheMixin, SimpleTestCase):
+    """A bucket of 2 tokens refilling 10 per second, read with a clock the tests move."""
+
+    def setUp(self):
+        super().setUp()
+        self.now = 1_000_000_000
+        self.buckets = TokenBuckets(clock=lambda: self.now)
+
+    def take(self, alias='default'):
+        return self.buckets.take('read:ip:1', 10, 2, alias)
+
+    def advance(self, seconds):
+        self.now += int(seconds * 1_000_000)
+
+    def test_burst_then_deny_then_refill(self):
+        for alias in ('default', None):
+            self.buckets = TokenBuckets(clock=lambda: self.now)
+            self.assertEqual([self.take(alias) for _ in range(3)], [(True, 0), (True, 0), (False, 0.1)])
+            self.advance(0.1)
+            self.assertEqual(self.take(alias), (True, 0))
+            self.assertEqual(self.take(alias), (False, 0.1))
+            self.advance(60)
+            self.assertEqual([self.take(alias)[0] for _ in range(3)], [True, True, False])
+            self.advance(60)
+
+    def test_rejected_requests_do_not_use_up_tokens(self):
+        cache = caches['default']
+        self.take()
+        self.take()
+        arrival = cache.get('api:throttle:read:ip:1')
+        for _ in range(5):
+            self.assertFalse(self.take()[0])
+        self.assertEqual(cache.get('api:throttle:read:ip:1'), arrival)
+        self.advance(0.1)
+        self.assertTrue(self.take()[0])
+
+    def test_cache_errors_fall_back_to_local_buckets(self):
+        with mock.patch.object(CacheBuckets, 'take', side_effect=ConnectionError('cache down')):
+            self.assertEqual([self.take()[0] for _ in range(3)], [True, True, False])
+        self.assertIn('read:ip:1', self.buckets.local.arrivals)
+
+    def test_reset_refills_only_the_given_buckets(self):
+        caches['default'].set('unrelated', 1)
+        for alias in ('default', None):
+            self.take(alias)
+            self.take(alias)
+            self.buckets.reset(['read:ip:1'], alias)
+            self.assertEqual([self.take(alias)[0] for _ in range(3)], [True, True, False])
+        self.assertEqual(caches['default'].get('unrelated'), 1)
+
+    @override_settings(API_THROTTLE={'SCOPES': {'read': {'RATE': 1, 'BURST': 1}}})
+    def test_limited_requests_get_a_429(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/tasks/cache-stats/').status_code, 200)
+        response = client.get('/api/tasks/cache-stats/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()['code'], 'API_RATE_LIMITED')
+        self.assertIn('Retry-After', response)
+
+    @override_settings(API_THROTTLE={'SCOPES': {'read': {'RATE': 1, 'BURST': 1}}})
+    def test_forwarded_for_does_not_pick_the_bucket(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/tasks/cache-stats/', HTTP_X_FORWARDED_FOR='10.0.0.1').status_code, 200)
+        self.assertEqual(client.get('/api/tasks/cache-stats/', HTTP_X_FORWARDED_FOR='10.0.0.2').status_code, 429)
+
+
+@override_settings(LOAD_SHEDDING={'MAX_IN_FLIGHT': 1, 'MAX_QUEUE_MS': 1000, 'RETRY_AFTER_SECONDS': 2})
+class LoadSheddingTests(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        request_load.reset()
+        self.addCleanup(request_load.reset)
+
+    def assertShed(self, response):
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(json.loads(response.content)['code'], 'API_OVERLOADED')
+        self.assertEqual(response['Retry-After'], '2')
+
+    def test_requests_over_the_limit_are_shed(self):
+        responses = []
+
+        def view(request):
+            responses.append(middleware(RequestFactory().get('/api/tasks/')))
+            return HttpResponse()
+        middleware = LoadSheddingMiddleware(view)
+        self.assertEqual(middleware(RequestFactory().get('/api/tasks/')).status_code, 200)
+        self.assertShed(responses[0])
+        self.assertEqual(request_load.in_flight, 0)
+
+    def test_requests_that_queued_too_long_are_shed(self):
+        middleware = LoadSheddingMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get('/api/tasks/', HTTP_X_REQUEST_START=f't={int((time.time() - 5) * 1000)}')
+        self.assertShed(middleware(request))
+        request = RequestFactory().get('/api/tasks/', HTTP_X_REQUEST_START=f't={int(time.time() * 1000)}')
+        self.assertEqual(middleware(request).status_code, 200)
+
+    def test_exempt_paths_are_never_shed(self):
+        middleware = LoadSheddingMiddleware(lambda request: HttpResponse())
+        request_load.enter(1, 1)
+        self.assertEqual(middleware(RequestFactory().get('/api/metrics/')).status_code, 200)
+        self.assertShed(middleware(RequestFactory().get('/api/tasks/')))
+
+    async def test_async_requests_count_while_they_are_awaited(self):
+        release = asyncio.Event()
+
+        async def view(request):
+            await release.wait()
+            return HttpResponse()
+        middleware = LoadSheddingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        first = asyncio.ensure_future(middleware(RequestFactory().get('/api/tasks/')))
+        await asyncio.sleep(0)
+        self.assertShed(await middleware(RequestFactory().get('/api/tasks/')))
+        release.set()
+        self.assertEqual((await first).status_code, 200)
+        self.assertEqual(request_load.in_flight, 0)
+
+
+def fail_job(running):
+    raise RuntimeError('boom')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class JobTests(TestCase):
+    def import_users(self, users):
+        return APIClient().post('/api/jobs/', {'kind': 'users.import', 'payload': {'users': users}}, format='json')
+
+    def test_user_import_passwords_are_hashed_by_the_worker(self):
+        users = [{'username': 'ann', 'password': 'secret-password'}, {'username': 'bob', 'password': 'other-password'}]
+        with mock.patch('api.jobs.password_hashing_pool.hash_many') as hash_many:
+            self.assertEqual(self.import_users(users).status_code, 202)
+        hash_many.assert_not_called()
+
+        run_job(claim('worker'), 'worker')
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.result), ('SUCCEEDED', {'created': 2, 'errors': []}))
+        self.assertTrue(User.objects.get(username='ann').check_password('secret-password'))
+        self.assertTrue(User.objects.get(username='bob').check_password('other-password'))
+        self.assertEqual([user.keys() - {'username'} for user in job.payload['users']], [set(), set()])
+
+    def test_user_import_purges_plaintext_before_creating_users(self):
+        self.import_users([{'username': 'ann', 'password': 'secret-password'}])
+        with mock.patch('api.jobs.bulk_create_users', side_effect=RuntimeError('boom')):
+            run_job(claim('worker'), 'worker')
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.payload['hashed']), ('QUEUED', 1))
+        self.assertNotIn('secret-password', json.dumps(job.payload))
+        self.assertTrue(check_password('secret-password', job.payload['users'][0]['password']))
+
+        # The retry creates the user from the stored hash.
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        run_job(claim('worker'), 'worker')
+        self.assertEqual(Job.objects.get().status, 'SUCCEEDED')
+        self.assertTrue(User.objects.get(username='ann').check_password('secret-password'))
+
+    def test_user_import_rejects_missing_and_invalid_passwords(self):
+        response = self.import_users([
+            {'username': 'ann', 'password': 'secret-password'}, {'username': 'bob'},
+            {'username': 'cid', 'password': ''}, {'username': 'dee', 'password': 123},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], {'payload': {'users': {
+            '1': {'password': ['This field is required.']},
+            '2': {'password': ['This field may not be blank.']},
+            '3': {'password': ['Not a valid string.']},
+        }}})
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS={'MAX_IMPORT_USERS': 1})
+    def test_user_import_size_is_capped(self):
+        response = self.import_users([{'username': 'ann', 'password': 'a'}, {'username': 'bob', 'password': 'b'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()['errors'], {'payload': {'users': ['Ensure this list has no more than 1 items.']}},
+        )
+        self.assertFalse(Job.objects.exists())
+
+    def test_expired_leases_are_taken_over(self):
+        job = enqueue('tasks.archive', {})
+        first = claim('worker-a')
+        self.assertIsNone(claim('worker-b'))
+
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        second = claim('worker-b')
+        self.assertEqual((second.pk, second.attempts, second.locked_by), (job.pk, 2, 'worker-b'))
+
+        # The first worker can no longer report progress or finish the job.
+        with self.assertRaises(LeaseLost):
+            RunningJob(first, 'worker-a').set_progress(1)
+        run_job(first, 'worker-a')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ('RUNNING', 'worker-b'))
+
+        run_job(second, 'worker-b')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ('SUCCEEDED', {'archived': 0}))
+
+    def test_a_job_claimed_meanwhile_is_not_claimed_again(self):
+        enqueue('tasks.archive', {})
+        stale = list(claimable_jobs(timezone.now()))
+        claim('worker-a')
+        with mock.patch.object(type(connection.features), 'has_select_for_update_skip_locked', False), \
+                mock.patch('api.jobs.claimable_jobs', return_value=stale):
+            self.assertIsNone(claim('worker-b'))
+
+    @override_settings(JOBS={'RETRY_BASE_SECONDS': 10, 'RETRY_MAX_SECONDS': 30})
+    def test_failures_are_retried_with_backoff(self):
+        self.assertEqual([retry_delay(attempts) for attempts in (1, 2, 3, 4)], [10, 20, 30, 30])
+
+        with mock.patch.dict(KINDS, {'test.fail': JobKind('test.fail', dict, fail_job)}):
+            job = enqueue('test.fail', {}, max_attempts=3)
+            delays = []
+            for _ in range(3):
+                before = timezone.now()
+                run_job(claim('worker'), 'worker')
+                job.refresh_from_db()
+                if job.status == 'QUEUED':
+                    delays.append(round((job.run_after - before).total_seconds()))
+                    self.assertIsNone(claim('worker'))
+                    Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(delays, [10, 20])
+        self.assertEqual((job.status, job.attempts), ('FAILED', 3))
+        self.assertIn('RuntimeError: boom', job.error)
+
+    def test_only_queued_jobs_can_be_cancelled(self):
+        running = enqueue('tasks.archive', {})
+        claim('worker')
+        queued = enqueue('tasks.archive', {})
+
+        response = APIClient().post(f'/api/jobs/{queued.pk}/cancel/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['job']['status'], 'CANCELLED')
+        self.assertIsNone(claim('worker'))
+
+        response = APIClient().post(f'/api/jobs/{running.pk}/cancel/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['code'], 'API_JOB_CANCEL_ERROR')
+        self.assertEqual(Job.objects.get(pk=running.pk).status, 'RUNNING')
+
+
+@override_settings(JOBS={'CLAIM_CANDIDATES': 3})
+class JobClaimConcurrencyTests(TransactionTestCase):
+    """Workers claiming from one queue at once, each from its own thread and connection."""
+
+    def claim_all(self, workers=4, jobs=20):
+        Job.objects.bulk_create([Job(kind='tasks.archive', run_after=timezone.now()) for _ in range(jobs)])
+        barrier = threading.Barrier(workers)
+        claimed = {}
+
+        def drain(worker_id):
+            try:
+                barrier.wait()
+                while (job := claim(worker_id)) is not None:
+                    claimed.setdefault(worker_id, []).append(job.pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=drain, args=[f'worker-{index}']) for index in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        pks = [pk for worker_pks in claimed.values() for pk in worker_pks]
+        self.assertEqual(sorted(pks), sorted(Job.objects.values_list('id', flat=True)))
+        self.assertEqual(set(Job.objects.values_list('status', 'attempts')), {('RUNNING', 1)})
+        for worker_id, worker_pks in claimed.items():
+            self.assertEqual(set(Job.objects.filter(locked_by=worker_id).values_list('id', flat=True)), set(worker_pks))
+
+    @skipUnless(connection.features.has_select_for_update_skip_locked, "Needs SELECT ... FOR UPDATE SKIP LOCKED.")
+    def test_skip_locked_claims_each_job_once(self):
+        self.claim_all()
+
+    def test_conditional_update_claims_each_job_once(self):
+        with mock.patch.object(type(connection.features), 'has_select_for_update_skip_locked', False):
+            self.claim_all()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def test_reads_go_to_a_replica(self):
+        self.assertIn(PrimaryReplicaRouter().db_for_read(Task), ['replica1', 'replica2'])
+
+    def test_writes_go_to_the_primary(self):
+        self.assertEqual(PrimaryReplicaRouter().db_for_write(Task), 'default')
+
+    def test_pinned_reads_go_to_the_primary(self):
+        with primary_reads():
+            self.assertEqual(PrimaryReplicaRouter().db_for_read(Task), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_reads_without_replicas_go_to_the_primary(self):
+        self.assertEqual(PrimaryReplicaRouter().db_for_read(Task), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_only_task_and_user_reads_go_to_a_replica(self):
+        router = PrimaryReplicaRouter()
+        for model in (Task, User, User.groups.through, Group, Permission):
+            self.assertEqual(router.db_for_read(model), 'replica1', model)
+        for model in (Job, IdempotencyRecord, TaskStatusCount, TaskDailyCount):
+            self.assertEqual(router.db_for_read(model), 'default', model)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_STICKY_SECONDS=5, REPLICA_STICKY_COOKIE='api_read_primary')
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    def run_request(self, request):
+        seen = []
+
+        def view(request):
+            seen.append(read_primary.get())
+            return HttpResponse()
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen[0], response
+
+    def test_reads_are_not_pinned(self):
+        pinned, response = self.run_request(RequestFactory().get('/api/tasks/'))
+        self.assertFalse(pinned)
+        self.assertNotIn('api_read_primary', response.cookies)
+
+    def test_writes_are_pinned_and_set_the_sticky_cookie(self):
+        pinned, response = self.run_request(RequestFactory().post('/api/tasks/'))
+        self.assertTrue(pinned)
+        self.assertEqual(response.cookies['api_read_primary']['max-age'], 5)
+
+    def test_reads_within_the_sticky_window_are_pinned(self):
+        request = RequestFactory().get('/api/tasks/')
+        request.COOKIES['api_read_primary'] = str(time.time() + 5)
+        self.assertTrue(self.run_request(request)[0])
+
+    def test_reads_after_the_sticky_window_are_not_pinned(self):
+        request = RequestFactory().get('/api/tasks/')
+        request.COOKIES['api_read_primary'] = str(time.time() - 1)
+        self.assertFalse(self.run_request(request)[0])
+
+    async def test_async_requests_are_pinned_in_the_view_threads(self):
+        seen = []
+
+        def view(request):
+            seen.append(read_primary.get())
+            return HttpResponse()
+
+        async def get_response(request):
+            return await sync_to_async(view)(request)
+        middleware = ReplicaRoutingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        response = await middleware(RequestFactory().post('/api/tasks/'))
+        self.assertEqual(response.cookies['api_read_primary']['max-age'], 5)
+        await middleware(RequestFactory().get('/api/tasks/'))
+        self.assertEqual(seen, [True, False])
+        self.assertFalse(read_primary.get())
+
+
+def has_separate_replica():
+    replica = settings.DATABASES.get('replica1')
+    return replica is not None and not replica.get('TEST', {}).get('MIRROR')
+
+
+@skipUnless(has_separate_replica(), "Run with --settings=task.settings_replica_test.")
+@override_settings(TASK_CACHE={'ENABLED': False})
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    The primary and the replica are separate SQLite files and nothing
+    replicates between them, so the data returned shows which one was read.
+    """
+    databases = {'default', 'replica1'} if has_separate_replica() else {'default'}
+
+    def list_titles(self, client):
+        return [task['title'] for task in client.get('/api/tasks/').json()['tasks']]
+
+    def test_list_and_retrieve_read_from_the_replica(self):
+        primary = Task.objects.using('default').create(title='Primary', description='')
+        Task.objects.using('replica1').create(id=primary.pk, title='Replica', description='')
+        client = APIClient()
+        self.assertEqual(self.list_titles(client), ['Replica'])
+        self.assertEqual(client.get(f'/api/tasks/{primary.pk}/').json()['task']['title'], 'Replica')
+
+    def test_user_list_reads_from_the_replica(self):
+        User.objects.using('replica1').create(username='replica-user')
+        usernames = [user['username'] for user in APIClient().get('/api/users/').json()['users']]
+        self.assertEqual(usernames, ['replica-user'])
+
+    def test_writes_go_to_the_primary(self):
+        response = APIClient().post('/api/tasks/', {'title': 'Written', 'description': 'Body'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Task.objects.using('default').filter(title='Written').exists())
+        self.assertFalse(Task.objects.using('replica1').exists())
+
+    def test_client_reads_its_own_writes_within_the_sticky_window(self):
+        client = APIClient()
+        client.post('/api/tasks/', {'title': 'Written', 'description': 'Body'}, format='json')
+        self.assertEqual(self.list_titles(client), ['Written'])
+        self.assertEqual(self.list_titles(APIClient()), [])
+
+        client.cookies['api_read_primary'] = str(time.time() - 1)
+        self.assertEqual(self.list_titles(client), [])
+
+
+class IdempotencyTests(TestCase):
+    def post_task(self, key, title='Task', client=None, **extra):
+        client = client or APIClient()
+        return client.post(
+            '/api/tasks/', {'title': title, 'description': 'Body'}, format='json', HTTP_IDEMPOTENCY_KEY=key, **extra,
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post_task('key-1')
+        retry = self.post_task('key-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Content-Type'], first['Content-Type'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Task.objects.count(), 1)
+
+    async def test_async_duplicates_wait_and_replay(self):
+        async def get_response(request):
+            return HttpResponse()
+        self.assertTrue(iscoroutinefunction(IdempotencyMiddleware(get_response)))
+
+        responses = await asyncio.gather(*[
+            self.async_client.post(
+                '/api/async/tasks/', {'title': 'Task', 'description': 'Body'},
+                content_type='application/json', headers={'Idempotency-Key': 'key-1'},
+            ) for _ in range(3)
+        ])
+        self.assertEqual([response.status_code for response in responses], [201] * 3)
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(sum(response.has_header('Idempotent-Replayed') for response in responses), 2)
+        self.assertEqual(await Task.objects.acount(), 1)
+
+        response = await self.async_client.post(
+            '/api/async/tasks/', {'title': 'Other', 'description': 'Body'},
+            content_type='application/json', headers={'Idempotency-Key': 'key-1'},
+        )
+        self.assertEqual(response.status_code, 422)
+
+    def test_requests_without_a_key_are_not_deduplicated(self):
+        APIClient().post('/api/tasks/', {'title': 'Task', 'description': 'Body'}, format='json')
+        APIClient().post('/api/tasks/', {'title': 'Task', 'description': 'Body'}, format='json')
+        self.assertEqual(Task.objects.count(), 2)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        self.post_task('key-1', title='First')
+        response = self.post_task('key-1', title='Second')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()['code'], 'API_IDEMPOTENCY_KEY_REUSED')
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_keys_are_scoped_to_the_client(self):
+        self.post_task('key-1', REMOTE_ADDR='10.0.0.1')
+        self.post_task('key-1', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_invalid_key_is_rejected(self):
+        response = self.post_task('k' * 256)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['code'], 'API_IDEMPOTENCY_KEY_INVALID')
+        self.assertFalse(Task.objects.exists())
+
+    def test_validation_errors_are_replayed(self):
+        client = APIClient()
+        first = client.post('/api/users/', {'username': 'bad name!'}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        retry = client.post('/api/users/', {'username': 'bad name!'}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(first.status_code, 400)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+    def test_database_errors_are_not_replayed(self):
+        client = APIClient(raise_request_exception=False)
+        with mock.patch.object(TaskSerializer, 'save', side_effect=OperationalError('database is locked')):
+            failed = self.post_task('key-1', client=client)
+        self.assertEqual(failed.status_code, 500)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+        retry = self.post_task('key-1', client=client)
+        self.assertEqual(retry.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', retry)
+        self.assertEqual(Task.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY={'WAIT_SECONDS': 0.1, 'POLL_SECONDS': 0.01})
+    def test_duplicate_of_a_running_request_gets_a_conflict(self):
+        self.post_task('key-1')
+        IdempotencyRecord.objects.update(status_code=None, locked_until=timezone.now() + timedelta(minutes=1))
+        response = self.post_task('key-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['code'], 'API_IDEMPOTENCY_IN_PROGRESS')
+        self.assertIn('Retry-After', response)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_abandoned_request_is_taken_over_after_its_lock_expires(self):
+        self.post_task('key-1')
+        IdempotencyRecord.objects.update(status_code=None, locked_until=timezone.now() - timedelta(seconds=1))
+        response = self.post_task('key-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(IdempotencyRecord.objects.get().status_code, 201)
+
+    def test_expired_records_run_again_and_are_pruned(self):
+        self.post_task('key-1')
+        IdempotencyRecord.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.post_task('key-1').status_code, 201)
+        self.assertEqual(Task.objects.count(), 2)
+        self.assertEqual(prune_idempotency_records(now=timezone.now() + timedelta(days=2)), 1)
+
+
+@override_settings(TASK_CACHE={'ENABLED': False}, API_THROTTLE={'ENABLED': False})
+class IdempotencyRetryStormTests(TransactionTestCase):
+    """Many clients retrying the same write at once, each from its own thread and connection."""
+
+    def storm(self, requests):
+        """Send every ``(path, data, key)`` at the same moment; returns the responses in order."""
+        barrier = threading.Barrier(len(requests))
+        responses = [None] * len(requests)
+
+        def send(index, path, data, key):
+            try:
+                barrier.wait()
+                responses[index] = APIClient().post(path, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send, args=(index, *request)) for index, request in enumerate(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_concurrent_task_retries_create_one_task(self):
+        responses = self.storm([('/api/tasks/', {'title': 'Task', 'description': 'Body'}, 'key-1')] * 16)
+        self.assertEqual([response.status_code for response in responses], [201] * 16)
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(sum(response.has_header('Idempotent-Replayed') for response in responses), 15)
+        self.assertEqual(Task.objects.using('default').count(), 1)
+
+    def test_concurrent_user_retries_create_one_user(self):
+        data = {'username': 'storm', 'password': 'secret-password'}
+        responses = self.storm([('/api/users/', data, 'key-1')] * 8)
+        self.assertEqual([response.status_code for response in responses], [201] * 8)
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(User.objects.using('default').filter(username='storm').count(), 1)
+
+    def test_concurrent_retries_of_many_keys_create_one_task_each(self):
+        requests = [
+            ('/api/tasks/', {'title': f'Task {index}', 'description': 'Body'}, f'key-{index}')
+            for index in range(5) for _ in range(4)
+        ]
+        responses = self.storm(requests)
+        self.assertEqual({response.status_code for response in responses}, {201})
+        self.assertEqual(sorted(Task.objects.using('default').values_list('title', flat=True)), [f'Task {index}' for index in range(5)])
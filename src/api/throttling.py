@@ -0,0 +1,193 @@
+"""
+Per-client rate limiting.
+
+Every client gets one token bucket per scope: ``read`` for safe requests,
+``write`` for the rest and ``bulk`` for the bulk and export actions. A
+bucket refills at ``RATE`` tokens per second and holds at most ``BURST``.
+
+Buckets are kept as a "theoretical arrival time" (GCRA, equivalent to a
+token bucket) in the cache configured by ``API_THROTTLE['CACHE_ALIAS']``, so
+all workers sharing that cache share the limits. Taking a token is one
+atomic ``incr``. When the cache is unavailable the buckets fall back to
+the memory of the current process.
+"""
+import math
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import Throttled
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+from .metrics import registry
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'default',
+    'SCOPES': {
+        'read': {'RATE': 50, 'BURST': 100},
+        'write': {'RATE': 10, 'BURST': 30},
+        'bulk': {'RATE': 1, 'BURST': 5},
+    },
+}
+
+BULK_ACTIONS = ('bulk', 'bulk_partial_update', 'bulk_destroy', 'export')
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'API_THROTTLE', {})}
+
+
+def now_us():
+    return int(time.time() * 1_000_000)
+
+
+class LocalBuckets:
+    """Buckets in the memory of this process."""
+    max_size = 100_000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.arrivals = {}
+
+    def take(self, key, interval, tolerance, now):
+        with self.lock:
+            if len(self.arrivals) >= self.max_size:
+                # Drop the buckets that have filled up again.
+                self.arrivals = {k: tat for k, tat in self.arrivals.items() if tat > now}
+            tat = max(self.arrivals.get(key, now), now) + interval
+            if tat - now <= tolerance:
+                self.arrivals[key] = tat
+            return tat
+
+    def delete(self, keys):
+        with self.lock:
+            for key in keys:
+                self.arrivals.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.arrivals.clear()
+
+
+class CacheBuckets:
+    """Buckets in a shared cache, updated with atomic ``incr``/``decr``."""
+    # ``incr`` keeps the expiry set when the key was added, so a client that
+    # never pauses gets a fresh bucket, one extra burst, once per timeout.
+    timeout = 3600
+
+    def take(self, cache, key, interval, tolerance, now):
+        timeout = max(self.timeout, math.ceil(tolerance / 1_000_000) + 1)
+        try:
+            tat = cache.incr(key, interval)
+        except ValueError:
+            if cache.add(key, now + interval, timeout):
+                return now + interval
+            tat = cache.incr(key, interval)
+        if tat < now + interval:
+            # The bucket refilled since the last request. Two requests
+            # racing here may both get the first token, which is harmless.
+            cache.set(key, now + interval, timeout)
+            return now + interval
+        if tat - now > tolerance:
+            # Rejected requests do not use up tokens.
+            cache.decr(key, interval)
+        return tat
+
+
+class TokenBuckets:
+    def __init__(self, clock=now_us):
+        # ``clock`` returns the time in microseconds.
+        self.clock = clock
+        self.local = LocalBuckets()
+        self.shared = CacheBuckets()
+
+    def take(self, key, rate, burst, alias=None):
+        """
+        Take a token from bucket ``key``. Returns ``(allowed, wait)`` with
+        the seconds until the next token when the bucket is empty.
+        """
+        interval = int(1_000_000 / rate)
+        tolerance = interval * burst
+        now = self.clock()
+        if alias:
+            try:
+                tat = self.shared.take(caches[alias], f'api:throttle:{key}', interval, tolerance, now)
+            except Exception:
+                registry.inc('api_throttle_cache_errors_total', {})
+                tat = self.local.take(key, interval, tolerance, now)
+        else:
+            tat = self.local.take(key, interval, tolerance, now)
+        excess = tat - now - tolerance
+        return excess <= 0, max(excess, 0) / 1_000_000
+
+    def reset(self, keys, alias=None):
+        """Refill buckets ``keys``, leaving the other keys of the cache alone."""
+        if alias:
+            caches[alias].delete_many([f'api:throttle:{key}' for key in keys])
+        self.local.delete(keys)
+
+
+token_buckets = TokenBuckets()
+registry.describe('api_requests_throttled_total', 'counter', 'Requests rejected by the per-client rate limits, by scope.')
+registry.describe('api_throttle_cache_errors_total', 'counter', 'Rate limit checks that fell back to process-local buckets.')
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Rate limits every client per scope. Authenticated clients are told apart
+    by user, anonymous ones by address. A view can pick its scope with a
+    ``throttle_scope`` attribute.
+    """
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        if getattr(view, 'action', None) in BULK_ACTIONS:
+            return 'bulk'
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def get_client(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        options = get_options()
+        if not options['ENABLED']:
+            return True
+        scope = self.get_scope(request, view)
+        limits = options['SCOPES'].get(scope)
+        if not limits:
+            return True
+        allowed, self.retry_after = token_buckets.take(
+            f'{scope}:{self.get_client(request)}', limits['RATE'], limits['BURST'], options['CACHE_ALIAS'],
+        )
+        if not allowed:
+            registry.inc('api_requests_throttled_total', {'scope': scope})
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+def exception_handler(exc, context):
+    """DRF's exception handler, with rate limited responses in the API's format."""
+    # rest_framework.views loads the throttle classes from this module.
+    from rest_framework.views import exception_handler as default_exception_handler
+
+    response = default_exception_handler(exc, context)
+    if isinstance(exc, Throttled) and response is not None:
+        response.data = rate_limited(exc.wait)
+    return response
+
+
+def rate_limited(wait):
+    return {
+        "code": "API_RATE_LIMITED",
+        "message": "Too many requests. Retry after the time given in the Retry-After header.",
+        "retry_after": wait
+    }
@@ -1,14 +1,27 @@
+from django.apps import apps
 from django.urls import path, include
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import routers
-from .views import TaskViewSet, UserViewSet
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from .views import JobViewSet, TaskViewSet, UserViewSet, metrics
+from .async_views import AsyncTaskListView, AsyncTaskDetailView, AsyncTaskEventsView
+from .schema import schema
 
 router = routers.DefaultRouter()
 router.register('tasks', TaskViewSet)
 router.register('users', UserViewSet)
+router.register('jobs', JobViewSet)
 
 urlpatterns = [
-    path('schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
+    path('schema/', schema, name='schema'),
+    path('metrics/', metrics, name='metrics'),
+    path('async/tasks/', csrf_exempt(AsyncTaskListView.as_view()), name='async-task-list'),
+    path('async/tasks/events/', AsyncTaskEventsView.as_view(), name='async-task-events'),
+    path('async/tasks/<str:pk>/', csrf_exempt(AsyncTaskDetailView.as_view()), name='async-task-detail'),
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
+
+# The API-only settings profile leaves out drf_spectacular and its Swagger UI.
+if apps.is_installed('drf_spectacular'):
+    from drf_spectacular.views import SpectacularSwaggerView
+
+    urlpatterns.insert(1, path('docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'))
@@ -1,17 +1,134 @@
 from rest_framework.response import Response
 from rest_framework import status, viewsets
-from django.db import transaction
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import DatabaseError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django.contrib.auth.models import User, Group
-from django.contrib.auth.hashers import make_password
-from .serializers import TaskSerializer, UserSerializer
-from .models import Task
+from .serializers import JobSerializer, TaskRowSerializer, TaskSerializer, UserSerializer
+from .models import JOB_STATUS_OPTIONS, ArchivedTask, Job, Task
+from .filters import TaskFilterBackend, include_archived, sparse_fields, task_filter_kwargs
+from .pagination import JobPagination, TaskCursorPagination, TaskSearchPagination
+from .search import search_tasks
+from .stats import get_days, get_stats
+from .changes import ResyncRequired, TaskChangeFeed
+from .streaming import json_array_stream, ndjson_stream
+from .cache import task_cache
+from .envelopes import (
+    task_create_failed, task_created, task_delete_failed, task_deleted, task_list, task_list_failed, task_list_invalid,
+    task_not_found, task_precondition_failed, task_retrieve_failed, task_retrieve_invalid, task_retrieved,
+    task_update_failed, task_updated,
+)
+from .conditional import if_match_passes, is_not_modified, list_validators, not_modified, set_validators, task_validators
+from .bulk import bulk_create_tasks, bulk_create_users, bulk_delete_tasks, bulk_update_tasks, get_items, is_atomic
+from .hashing import password_hashing_pool
+from .jobs import cancel, enqueue
+from .metrics import registry
 from rest_framework.permissions import IsAuthenticated
 
+task_rows = TaskRowSerializer()
 
-class TaskViewSet(viewsets.ModelViewSet):
+
+def task_pk(pk):
+    """
+    The task id in the URL as an integer, so ``/api/tasks/01/`` shares the
+    cache entry that writes to task 1 invalidate. Raises ``Task.DoesNotExist``
+    for anything that is not an id.
+    """
+    try:
+        return Task._meta.pk.to_python(pk)
+    except DjangoValidationError:
+        raise Task.DoesNotExist()
+
+
+def locked_task(pk):
+    """
+    The task, locked until the transaction ends, so that no other write
+    lands between the If-Match comparison and the save. SQLite ignores the
+    row lock, but only one transaction at a time can write to it.
+    """
+    return Task.objects.select_for_update().get(id=pk)
+
+
+def get_task_data(pk):
+    """A task, or else the archived task, as cached for ``retrieve``."""
+    try:
+        task = Task.objects.get(pk=pk)
+    except Task.DoesNotExist:
+        try:
+            task = ArchivedTask.objects.get(pk=pk)
+        except ArchivedTask.DoesNotExist:
+            raise Task.DoesNotExist()
+    return dict(TaskSerializer(task).data)
+
+
+def get_list_querysets(params):
+    """The filtered tasks, followed by the archived tasks if requested."""
+    lookups = task_filter_kwargs(params)
+    querysets = [Task.objects.filter(**lookups)]
+    if include_archived(params):
+        querysets.append(ArchivedTask.objects.filter(**lookups))
+    return querysets
+
+
+def get_list_page(params):
+    """One page of the task list, as cached for ``list``."""
+    rows = task_rows.select(sparse_fields(params, task_rows.field_names))
+    querysets = [rows.values_list(queryset, named=True) for queryset in get_list_querysets(params)]
+    paginator = TaskCursorPagination()
+    if len(querysets) == 1:
+        tasks = paginator.get_page(list(paginator.get_page_queryset(querysets[0], params)))
+    else:
+        tasks = paginator.paginate_querysets(querysets, params)
+    return {
+        "tasks": rows.serialize(tasks),
+        "next": paginator.get_next_cursor(),
+        "previous": paginator.get_previous_cursor()
+    }
+
+
+class BulkResponseMixin:
+    bulk_resource = None
+    bulk_label = None
+
+    def bulk_response(self, result, atomic, operation, data, success_status):
+        if result.errors and atomic:
+            return Response({
+                "code": f"API_{self.bulk_resource}_BULK_{operation}_ERROR",
+                "message": f"No {self.bulk_label} were changed because some items are invalid.",
+                "errors": result.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if result.errors:
+            return Response({
+                "code": f"API_{self.bulk_resource}_BULK_{operation}_PARTIAL",
+                "message": f"Some {self.bulk_label} could not be processed.",
+                **data,
+                "errors": result.errors
+            }, status=status.HTTP_207_MULTI_STATUS)
+        return Response({
+            "code": f"API_{self.bulk_resource}_BULK_{operation}_SUCCESS",
+            "message": f"{self.bulk_label.capitalize()} processed successfully",
+            **data
+        }, status=success_status)
+
+    def bulk_error(self, operation, e):
+        return Response({
+            "code": f"API_{self.bulk_resource}_BULK_{operation}_ERROR",
+            "message": "Invalid bulk request.",
+            "errors": e.detail
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class TaskViewSet(BulkResponseMixin, viewsets.ModelViewSet):
     serializer_class = TaskSerializer
     queryset = Task.objects.all()
     permission_classes = []
+    filter_backends = [TaskFilterBackend]
+    pagination_class = TaskCursorPagination
+    bulk_resource = "TASK"
+    bulk_label = "tasks"
 
     def create(self, request):
         serializer = self.get_serializer(data=request.data)
@@ -20,147 +137,305 @@ class TaskViewSet(viewsets.ModelViewSet):
 
             with transaction.atomic():
                 serializer.save()
-            return Response({
-                "code": "API_TASK_CREATE_SUCCESS",
-                "message": "Task created successfully",
-                "task": serializer.data
-            }, status=status.HTTP_201_CREATED)
+            return Response(*task_created(serializer.data))
+        except DatabaseError:
+            raise
         except Exception as e:
-            return Response({
-                "code": "API_TASK_CREATE_ERROR",
-                "message": "Failed to create task",
-                "errors": serializer.errors
-            }, status=status.HTTP_400_BAD_REQUEST)
+            return Response(*task_create_failed(serializer.errors))
 
     def update(self, request, pk=None):
         try:
-            task = Task.objects.get(id=pk)
-            serializer = self.get_serializer(task, data=request.data)
-            serializer.is_valid(raise_exception=True)
-
+            pk = task_pk(pk)
             with transaction.atomic():
-                serializer.save()
-            return Response({
-                "code": "API_TASK_UPDATE_SUCCESS",
-                "message": "Task updated successfully",
-                "task": serializer.data
-            }, status=status.HTTP_200_OK)
+                task = locked_task(pk)
+                if not if_match_passes(request, task_validators(task.pk, task.updated_at)[0]):
+                    return Response(*task_precondition_failed())
+                serializer = self.get_serializer(task, data=request.data)
+                serializer.is_valid(raise_exception=True)
+                task = serializer.save()
+            return set_validators(Response(*task_updated(serializer.data)), *task_validators(task.pk, task.updated_at))
         except Task.DoesNotExist:
-            return Response({
-                "code": "API_TASK_NOT_FOUND",
-                "message": "Task does not exist."
-            }, status=status.HTTP_404_NOT_FOUND)
+            return Response(*task_not_found())
+        except DatabaseError:
+            raise
         except Exception as e:
-            return Response({
-                "code": "API_TASK_UPDATE_ERROR",
-                "message": "Failed to update task",
-                "errors": serializer.errors
-            }, status=status.HTTP_400_BAD_REQUEST)
+            return Response(*task_update_failed(serializer.errors))
 
     def partial_update(self, request, pk=None):
         try:
-            task = Task.objects.get(id=pk)
-            serializer = self.get_serializer(task, data=request.data, partial=True)
-            serializer.is_valid(raise_exception=True)
-
+            pk = task_pk(pk)
             with transaction.atomic():
-                serializer.save()
-            return Response({
-                "code": "API_TASK_UPDATE_SUCCESS",
-                "message": "Task updated successfully",
-                "task": serializer.data
-            }, status=status.HTTP_200_OK)
+                task = locked_task(pk)
+                if not if_match_passes(request, task_validators(task.pk, task.updated_at)[0]):
+                    return Response(*task_precondition_failed())
+                serializer = self.get_serializer(task, data=request.data, partial=True)
+                serializer.is_valid(raise_exception=True)
+                task = serializer.save()
+            return set_validators(Response(*task_updated(serializer.data)), *task_validators(task.pk, task.updated_at))
         except Task.DoesNotExist:
-            return Response({
-                "code": "API_TASK_NOT_FOUND",
-                "message": "Task does not exist."
-            }, status=status.HTTP_404_NOT_FOUND)
+            return Response(*task_not_found())
+        except DatabaseError:
+            raise
         except Exception as e:
-            return Response({
-                "code": "API_TASK_UPDATE_ERROR",
-                "message": "Failed to update task",
-                "errors": serializer.errors
-            }, status=status.HTTP_400_BAD_REQUEST)
+            return Response(*task_update_failed(serializer.errors))
+
+    def get_task_rows(self):
+        """The row serializer for the fields requested with ``?fields=``."""
+        return task_rows.select(sparse_fields(self.request.query_params, task_rows.field_names))
 
     def retrieve(self, request, pk=None):
         try:
-            task = self.get_queryset().get(pk=pk)
-            serializer = self.get_serializer(task)
+            pk = task_pk(pk)
+            fields = sparse_fields(request.query_params, task_rows.field_names)
+            data = task_cache.get_task(pk, lambda: get_task_data(pk))
+            validators = task_validators(data["id"], data["updated_at"])
+            if is_not_modified(request, *validators):
+                return not_modified(*validators)
+
+            # The cache holds whole tasks, so single tasks are trimmed here.
+            task = {name: data[name] for name in fields} if fields else data
+            return set_validators(Response(*task_retrieved(task)), *validators)
+        except Task.DoesNotExist:
+            return Response(*task_not_found())
+        except ValidationError as e:
+            return Response(*task_retrieve_invalid(e.detail))
+        except DatabaseError:
+            raise
+        except Exception as e:
+            return Response(*task_retrieve_failed(e))
+
+    def destroy(self, request, pk=None):
+        try:
+            task = self.get_queryset().get(pk=task_pk(pk))
+            with transaction.atomic():
+                task.delete()
+
+            return Response(*task_deleted())
+        except Task.DoesNotExist:
+            return Response(*task_not_found())
+        except DatabaseError:
+            raise
+        except Exception as e:
+            return Response(*task_delete_failed(e))
+
+    def list(self, request):
+        try:
+            queryset, *archived = get_list_querysets(request.query_params)
+            validators = list_validators(queryset, request.query_params, *archived)
+            if is_not_modified(request, *validators):
+                return not_modified(*validators)
+            page = task_cache.get_list(request.query_params, lambda: get_list_page(request.query_params))
+
+            return set_validators(Response(*task_list(page)), *validators)
+        except ValidationError as e:
+            return Response(*task_list_invalid(e.detail))
+        except DatabaseError:
+            raise
+        except Exception as e:
+            return Response(*task_list_failed(e))
+
+    @action(detail=False, methods=['get'], pagination_class=TaskSearchPagination)
+    def search(self, request):
+        try:
+            query = request.query_params.get('q', '').strip()
+            if not query:
+                raise ValidationError({'q': ["This parameter is required."]})
+            rows = self.get_task_rows()
+            tasks = search_tasks(self.filter_queryset(self.get_queryset()), query)
+            page = self.paginate_queryset(rows.values_list(tasks, named=True))
 
             return Response({
-                "code": "API_TASK_RETRIEVE_SUCCESS",
-                "message": "Task retrieved successfully",
-                "task": serializer.data
+                "code": "API_TASK_SEARCH_SUCCESS",
+                "message": "Tasks retrieved successfully",
+                "tasks": rows.serialize(page),
+                "page": self.paginator.page,
+                "next": self.paginator.get_next_page(),
+                "previous": self.paginator.get_previous_page()
             }, status=status.HTTP_200_OK)
-        except Task.DoesNotExist:
+        except ValidationError as e:
             return Response({
-                "code": "API_TASK_NOT_FOUND",
-                "message": "Task not found"
-            }, status=status.HTTP_404_NOT_FOUND)
+                "code": "API_TASK_SEARCH_ERROR",
+                "message": "Invalid search parameters.",
+                "errors": e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except DatabaseError:
+            raise
         except Exception as e:
             return Response({
-                "code": "API_TASK_RETRIEVE_ERROR",
-                "message": "Failed to retrieve task.",
+                "code": "API_TASK_SEARCH_ERROR",
+                "message": "Failed to search tasks.",
                 "error": str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
-    def destroy(self, request, pk=None):
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
         try:
-            task = self.get_queryset().get(pk=pk)
-            with transaction.atomic():
-                task.delete()
+            stats = get_stats(get_days(request.query_params))
 
             return Response({
-                "code": "API_TASK_DELETE_SUCCESS",
-                "message": "Task deleted successfully"
-            }, status=status.HTTP_204_NO_CONTENT)
-        except Task.DoesNotExist:
+                "code": "API_TASK_STATS_SUCCESS",
+                "message": "Task statistics retrieved successfully",
+                "stats": stats
+            }, status=status.HTTP_200_OK)
+        except ValidationError as e:
             return Response({
-                "code": "API_TASK_NOT_FOUND",
-                "message": "Task not found"
-            }, status=status.HTTP_404_NOT_FOUND)
+                "code": "API_TASK_STATS_ERROR",
+                "message": "Invalid statistics parameters.",
+                "errors": e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except DatabaseError:
+            raise
         except Exception as e:
             return Response({
-                "code": "API_TASK_DELETE_ERROR",
-                "message": "Failed to delete task.",
+                "code": "API_TASK_STATS_ERROR",
+                "message": "Failed to retrieve task statistics.",
                 "error": str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
-    def list(self, request):
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
         try:
-            tasks = self.get_queryset()
-            serializer = self.get_serializer(tasks, many=True)
+            rows = self.get_task_rows()
+            changes, token, has_more = TaskChangeFeed().get_changes(
+                lambda tasks: rows.values_list(tasks, named=True), request.query_params, rows.serialize)
 
             return Response({
-                "code": "API_TASK_LIST_SUCCESS",
-                "message": "Tasks retrieved successfully",
-                "tasks": serializer.data
+                "code": "API_TASK_CHANGES_SUCCESS",
+                "message": "Task changes retrieved successfully",
+                "changes": changes,
+                "next": token,
+                "has_more": has_more
             }, status=status.HTTP_200_OK)
+        except ResyncRequired:
+            return Response({
+                "code": "API_TASK_CHANGES_RESYNC_REQUIRED",
+                "message": "The resume token is too old. Sync again without 'since'."
+            }, status=status.HTTP_410_GONE)
+        except ValidationError as e:
+            return Response({
+                "code": "API_TASK_CHANGES_ERROR",
+                "message": "Invalid change feed parameters.",
+                "errors": e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except DatabaseError:
+            raise
         except Exception as e:
             return Response({
-                "code": "API_TASK_LIST_ERROR",
-                "message": "Failed to retrieve tasks.",
+                "code": "API_TASK_CHANGES_ERROR",
+                "message": "Failed to retrieve task changes.",
                 "error": str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        return Response({
+            "code": "API_TASK_CACHE_STATS_SUCCESS",
+            "message": "Cache statistics retrieved successfully",
+            "stats": task_cache.get_stats()
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream every task matching the list filters, ordered by id, as
+        newline-delimited JSON (``application/x-ndjson``), or as a single
+        JSON document with ``?output=json``. The format is picked by
+        ``?output=`` alone: the Accept header is not used, so MessagePack is
+        not available here.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        try:
+            if output not in ('ndjson', 'json'):
+                raise ValidationError({'output': ["Must be one of: ndjson, json."]})
+            rows = self.get_task_rows()
+            tasks = self.filter_queryset(self.get_queryset()).order_by('id')
+        except ValidationError as e:
+            return Response({
+                "code": "API_TASK_EXPORT_ERROR",
+                "message": "Invalid export parameters.",
+                "errors": e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+        items = rows.iter_serialize(
+            rows.values_list(tasks).iterator(chunk_size=settings.TASK_EXPORT_CHUNK_SIZE)
+        )
+        if output == 'ndjson':
+            return StreamingHttpResponse(ndjson_stream(items), content_type='application/x-ndjson')
+        return StreamingHttpResponse(json_array_stream(items, {
+            "code": "API_TASK_EXPORT_SUCCESS",
+            "message": "Tasks exported successfully"
+        }, "tasks"), content_type='application/json')
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        try:
+            items = get_items(request.data, 'tasks')
+            atomic = is_atomic(request.data)
+        except ValidationError as e:
+            return self.bulk_error("CREATE", e)
+        result = bulk_create_tasks(items, atomic)
+        return self.bulk_response(result, atomic, "CREATE", {
+            "tasks": TaskSerializer(result.objects, many=True).data
+        }, status.HTTP_201_CREATED)
+
+    @bulk.mapping.patch
+    def bulk_partial_update(self, request):
+        try:
+            items = get_items(request.data, 'tasks')
+            atomic = is_atomic(request.data)
+        except ValidationError as e:
+            return self.bulk_error("UPDATE", e)
+        result = bulk_update_tasks(items, atomic)
+        return self.bulk_response(result, atomic, "UPDATE", {
+            "tasks": TaskSerializer(result.objects, many=True).data
+        }, status.HTTP_200_OK)
+
+    @bulk.mapping.delete
+    def bulk_destroy(self, request):
+        try:
+            ids = get_items(request.data, 'ids')
+            atomic = is_atomic(request.data)
+        except ValidationError as e:
+            return self.bulk_error("DELETE", e)
+        result = bulk_delete_tasks(ids, atomic)
+        return self.bulk_response(result, atomic, "DELETE", {
+            "ids": result.objects
+        }, status.HTTP_200_OK)
+
+
+class UserViewSet(BulkResponseMixin, viewsets.ModelViewSet):
+    queryset = User.objects.prefetch_related('groups', 'user_permissions')
     serializer_class = UserSerializer
     permission_classes = []
+    bulk_resource = "USER"
+    bulk_label = "users"
+
+    def validate(self, serializer):
+        """
+        ``is_valid(raise_exception=True)``, except that unknown group ids
+        raise ``Group.DoesNotExist`` for the API_GROUP_NOT_FOUND response.
+        """
+        if serializer.is_valid():
+            return
+        errors = serializer.errors.get('groups', [])
+        if any(getattr(error, 'code', None) == 'does_not_exist' for error in errors):
+            raise Group.DoesNotExist(errors[0])
+        raise ValidationError(serializer.errors)
 
     def create(self, request):
         serializer = self.get_serializer(data=request.data)
         try:
             serializer.is_valid(raise_exception=True)
+            serializer.validated_data['password'] = password_hashing_pool.hash(serializer.validated_data['password'])
             with transaction.atomic():
                 user = serializer.save()
-                user.groups.set(request.data.get('groups', []))
             return Response({
                 "code": "API_USER_CREATE_SUCCESS",
                 "message": "User created successfully.",
                 "user": serializer.data
             }, status=status.HTTP_201_CREATED)
+        except DatabaseError:
+            raise
         except Exception as e:
             return Response({
                 "code": "API_USER_CREATE_ERROR",
@@ -172,22 +447,14 @@ class UserViewSet(viewsets.ModelViewSet):
         try:
             user = User.objects.get(id=pk)
             serializer = self.get_serializer(user, data=request.data)
-            serializer.is_valid(raise_exception=True)
+            self.validate(serializer)
 
             new_password = serializer.validated_data.get('password')
             if new_password:
-                serializer.validated_data['password'] = make_password(new_password)
-
-            groups = request.data.get('groups')
-            if groups is not None:
-                for group_id in groups:
-                    if not Group.objects.filter(id=group_id).exists():
-                        raise Group.DoesNotExist
+                serializer.validated_data['password'] = password_hashing_pool.hash(new_password)
 
             with transaction.atomic():
                 user = serializer.save()
-                if groups is not None:
-                    user.groups.set(groups)
 
             return Response({
                 "code": "API_USER_UPDATE_SUCCESS",
@@ -206,6 +473,8 @@ class UserViewSet(viewsets.ModelViewSet):
                 "errors": {"groups": ["One or more groups do not exist."]},
                 "error": str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
+        except DatabaseError:
+            raise
         except Exception as e:
             return Response({
                 "code": "API_USER_UPDATE_ERROR",
@@ -217,22 +486,14 @@ class UserViewSet(viewsets.ModelViewSet):
         try:
             user = User.objects.get(id=pk)
             serializer = self.get_serializer(user, data=request.data, partial=True)
-            serializer.is_valid(raise_exception=True)
+            self.validate(serializer)
 
             new_password = serializer.validated_data.get('password')
             if new_password:
-                serializer.validated_data['password'] = make_password(new_password)
-
-            groups = request.data.get('groups')
-            if groups is not None:
-                for group_id in groups:
-                    if not Group.objects.filter(id=group_id).exists():
-                        raise Group.DoesNotExist
+                serializer.validated_data['password'] = password_hashing_pool.hash(new_password)
 
             with transaction.atomic():
                 user = serializer.save()
-                if groups is not None:
-                    user.groups.set(groups)
 
             return Response({
                 "code": "API_USER_UPDATE_SUCCESS",
@@ -251,6 +512,8 @@ class UserViewSet(viewsets.ModelViewSet):
                 "errors": {"groups": ["One or more groups do not exist."]},
                 "error": str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
+        except DatabaseError:
+            raise
         except Exception as e:
             return Response({
                 "code": "API_USER_UPDATE_ERROR",
@@ -273,6 +536,8 @@ class UserViewSet(viewsets.ModelViewSet):
                 "code": "API_USER_NOT_FOUND",
                 "message": "User not found"
             }, status=status.HTTP_404_NOT_FOUND)
+        except DatabaseError:
+            raise
         except Exception as e:
             return Response({
                 "code": "API_USER_RETRIEVE_ERROR",
@@ -295,6 +560,8 @@ class UserViewSet(viewsets.ModelViewSet):
                 "code": "API_USER_NOT_FOUND",
                 "message": "User not found"
             }, status=status.HTTP_404_NOT_FOUND)
+        except DatabaseError:
+            raise
         except Exception as e:
             return Response({
                 "code": "API_USER_DELETE_ERROR",
@@ -312,9 +579,126 @@ class UserViewSet(viewsets.ModelViewSet):
                 "message": "Users retrieved successfully",
                 "users": serializer.data
             }, status=status.HTTP_200_OK)
+        except DatabaseError:
+            raise
         except Exception as e:
             return Response({
                 "code": "API_USER_LIST_ERROR",
                 "message": "Failed to retrieve users.",
                 "error": str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        try:
+            items = get_items(request.data, 'users')
+            atomic = is_atomic(request.data)
+        except ValidationError as e:
+            return self.bulk_error("CREATE", e)
+        result = bulk_create_users(items, atomic)
+        users = self.get_queryset().filter(pk__in=[user.pk for user in result.objects]).order_by('pk')
+        return self.bulk_response(result, atomic, "CREATE", {
+            "users": UserSerializer(users, many=True).data
+        }, status.HTTP_201_CREATED)
+
+
+class JobViewSet(viewsets.GenericViewSet):
+    """Background jobs (see api/jobs.py): enqueue, follow progress, cancel."""
+    queryset = Job.objects.order_by('-id')
+    serializer_class = JobSerializer
+    permission_classes = []
+    pagination_class = JobPagination
+
+    def create(self, request):
+        try:
+            data = request.data if isinstance(request.data, dict) else {}
+            job = enqueue(data.get('kind'), data.get('payload'), data.get('max_attempts'))
+
+            return Response({
+                "code": "API_JOB_CREATE_SUCCESS",
+                "message": "Job queued successfully",
+                "job": self.get_serializer(job).data
+            }, status=status.HTTP_202_ACCEPTED)
+        except ValidationError as e:
+            return Response({
+                "code": "API_JOB_CREATE_ERROR",
+                "message": "Invalid job.",
+                "errors": e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except DatabaseError:
+            raise
+        except Exception as e:
+            return Response({
+                "code": "API_JOB_CREATE_ERROR",
+                "message": "Failed to queue job.",
+                "error": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    def retrieve(self, request, pk=None):
+        try:
+            job = self.get_queryset().get(pk=pk)
+
+            return Response({
+                "code": "API_JOB_RETRIEVE_SUCCESS",
+                "message": "Job retrieved successfully",
+                "job": self.get_serializer(job).data
+            }, status=status.HTTP_200_OK)
+        except (Job.DoesNotExist, ValueError):
+            return Response({
+                "code": "API_JOB_NOT_FOUND",
+                "message": "Job not found"
+            }, status=status.HTTP_404_NOT_FOUND)
+
+    def list(self, request):
+        try:
+            jobs = self.get_queryset()
+            job_status = request.query_params.get('status')
+            if job_status:
+                statuses = [value for value, _ in JOB_STATUS_OPTIONS]
+                if job_status not in statuses:
+                    raise ValidationError({'status': [f"Must be one of: {', '.join(statuses)}."]})
+                jobs = jobs.filter(status=job_status)
+            kind = request.query_params.get('kind')
+            if kind:
+                jobs = jobs.filter(kind=kind)
+            page = self.paginate_queryset(jobs)
+
+            return Response({
+                "code": "API_JOB_LIST_SUCCESS",
+                "message": "Jobs retrieved successfully",
+                "jobs": self.get_serializer(page, many=True).data,
+                "page": self.paginator.page,
+                "next": self.paginator.get_next_page(),
+                "previous": self.paginator.get_previous_page()
+            }, status=status.HTTP_200_OK)
+        except ValidationError as e:
+            return Response({
+                "code": "API_JOB_LIST_ERROR",
+                "message": "Invalid list parameters.",
+                "errors": e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        try:
+            job = self.get_queryset().get(pk=pk)
+        except (Job.DoesNotExist, ValueError):
+            return Response({
+                "code": "API_JOB_NOT_FOUND",
+                "message": "Job not found"
+            }, status=status.HTTP_404_NOT_FOUND)
+        if not cancel(job.pk):
+            return Response({
+                "code": "API_JOB_CANCEL_ERROR",
+                "message": "Only queued jobs can be cancelled."
+            }, status=status.HTTP_409_CONFLICT)
+        job.refresh_from_db()
+        return Response({
+            "code": "API_JOB_CANCEL_SUCCESS",
+            "message": "Job cancelled successfully",
+            "job": self.get_serializer(job).data
+        }, status=status.HTTP_200_OK)
+
+
+def metrics(request):
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,108 @@
+"""
+Database profiles selected with the DATABASE_PROFILE environment variable.
+
+sqlite        SQLite in WAL mode with connect-time pragmas (the default)
+sqlite-basic  SQLite with Django's defaults, for comparison
+postgres      PostgreSQL with persistent, health-checked connections
+postgres-pool PostgreSQL with a psycopg connection pool per process
+
+Connection details come from DATABASE_NAME, DATABASE_HOST, DATABASE_PORT,
+DATABASE_USER and DATABASE_PASSWORD. SQLite tests run against
+DATABASE_TEST_NAME, a file in the temporary directory by default.
+"""
+import tempfile
+from pathlib import Path
+import django
+from django.core.exceptions import ImproperlyConfigured
+
+# Applied by api.db to every new SQLite connection of the "sqlite" profile.
+# WAL lets readers run alongside the single writer, busy_timeout makes a
+# writer wait for the lock instead of failing with "database is locked",
+# and synchronous=NORMAL only syncs at checkpoints, which is safe in WAL mode.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+
+
+def sqlite_profile(env, base_dir, tuned):
+    database = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env.get('DATABASE_NAME') or base_dir / 'db.sqlite3',
+        # Tests use a file rather than Django's shared in-memory database,
+        # which fails concurrent writers instead of making them wait.
+        'TEST': {'NAME': env.get('DATABASE_TEST_NAME') or Path(tempfile.gettempdir()) / 'test-task.sqlite3'},
+    }
+    if not tuned:
+        return database, {}
+
+    database['CONN_MAX_AGE'] = int(env.get('DATABASE_CONN_MAX_AGE', 600))
+    database['OPTIONS'] = {'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000}
+    if django.VERSION >= (5, 1):
+        # Take the write lock when the transaction starts. A deferred
+        # transaction that reads first and writes later cannot wait for the
+        # lock and fails immediately when another writer holds it.
+        database['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+    return database, SQLITE_PRAGMAS
+
+
+def postgres_profile(env, pooled):
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env.get('DATABASE_NAME', 'task'),
+        'HOST': env.get('DATABASE_HOST', 'localhost'),
+        'PORT': env.get('DATABASE_PORT', '5432'),
+        'USER': env.get('DATABASE_USER', 'task'),
+        'PASSWORD': env.get('DATABASE_PASSWORD', ''),
+    }
+    if pooled:
+        if django.VERSION < (5, 1):
+            raise ImproperlyConfigured("The postgres-pool profile requires Django 5.1 or later.")
+        # Connections are returned to the pool at the end of each request,
+        # so CONN_MAX_AGE must stay at 0.
+        database['OPTIONS'] = {'pool': {
+            'min_size': int(env.get('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(env.get('DATABASE_POOL_MAX_SIZE', 20)),
+            'timeout': int(env.get('DATABASE_POOL_TIMEOUT', 10)),
+        }}
+    else:
+        database['CONN_MAX_AGE'] = int(env.get('DATABASE_CONN_MAX_AGE', 60))
+        database['CONN_HEALTH_CHECKS'] = True
+    return database, {}
+
+
+def get_database_settings(env, base_dir):
+    """Return ``(DATABASES['default'], SQLITE_PRAGMAS)`` for the selected profile."""
+    profile = env.get('DATABASE_PROFILE', 'sqlite')
+    if profile == 'sqlite':
+        return sqlite_profile(env, base_dir, tuned=True)
+    if profile == 'sqlite-basic':
+        return sqlite_profile(env, base_dir, tuned=False)
+    if profile == 'postgres':
+        return postgres_profile(env, pooled=False)
+    if profile == 'postgres-pool':
+        return postgres_profile(env, pooled=True)
+    raise ImproperlyConfigured(
+        f"Unknown DATABASE_PROFILE {profile!r}; use sqlite, sqlite-basic, postgres or postgres-pool."
+    )
+
+
+def get_replica_settings(env, primary):
+    """
+    Read replica aliases ``replica1``, ``replica2``, ... cloned from the
+    primary settings. SQLite replicas are listed as file paths in
+    DATABASE_REPLICA_NAMES, server replicas as hosts in DATABASE_REPLICA_HOSTS.
+    Under the test runner replicas mirror the primary test database.
+    """
+    if primary['ENGINE'].endswith('sqlite3'):
+        key, values = 'NAME', env.get('DATABASE_REPLICA_NAMES', '')
+    else:
+        key, values = 'HOST', env.get('DATABASE_REPLICA_HOSTS', '')
+    return {
+        f'replica{index}': {**primary, key: value, 'TEST': {'MIRROR': 'default'}}
+        for index, value in enumerate(filter(None, values.split(',')), start=1)
+    }
@@ -10,7 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
+from importlib.util import find_spec
 from pathlib import Path
+from .db_profiles import get_database_settings, get_replica_settings
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +47,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.LoadSheddingMiddleware',
+    'api.middleware.PerformanceMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.routers.ReplicaRoutingMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -52,8 +59,16 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.idempotency.IdempotencyMiddleware',
 ]
 
+# Per-request instrumentation exposed on /api/metrics/ (see api/middleware.py)
+PERFORMANCE_METRICS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': float(os.environ.get('PERFORMANCE_METRICS_SAMPLE_RATE', '1.0')),
+    'SERVER_TIMING': os.environ.get('PERFORMANCE_METRICS_SERVER_TIMING', '') == '1',
+}
+
 ROOT_URLCONF = 'task.urls'
 
 TEMPLATES = [
@@ -78,11 +93,62 @@ WSGI_APPLICATION = 'task.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# DATABASE_PROFILE selects the connection setup, see task/db_profiles.py.
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'sqlite')
+
+DEFAULT_DATABASE, SQLITE_PRAGMAS = get_database_settings(os.environ, BASE_DIR)
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+    'default': DEFAULT_DATABASE,
+    **get_replica_settings(os.environ, DEFAULT_DATABASE),
+}
+
+# Reads of the task and user models (REPLICA_READ_MODELS in api/routers.py)
+# go to the replicas; other reads, writes and read-your-writes requests go to
+# the primary. A client that wrote is pinned to the primary for
+# REPLICA_STICKY_SECONDS (see api/routers.py).
+DATABASE_ROUTERS = ['api.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+REPLICA_STICKY_COOKIE = 'api_read_primary'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+#
+# TASK_CACHE_URL selects a shared backend in production, e.g.
+# redis://127.0.0.1:6379/0 or memcached://127.0.0.1:11211. Without it every
+# worker uses its own local-memory cache.
+
+TASK_CACHE_URL = os.environ.get('TASK_CACHE_URL', '')
+
+if TASK_CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': TASK_CACHE_URL,
+        }
+    }
+elif TASK_CACHE_URL.startswith('memcached://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': TASK_CACHE_URL.removeprefix('memcached://'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
+
+# Read-through cache for task retrieve/list (see api/cache.py)
+TASK_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LOCK_TIMEOUT': 5,
 }
 
 
@@ -104,6 +170,15 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing runs on a bounded pool (see api/hashing.py), which caps
+# how many hashes run at once; requests still wait for their own. EXECUTOR is
+# "thread", "process" or "inline"; WORKERS defaults to the number of CPUs.
+PASSWORD_HASHING_POOL = {
+    'EXECUTOR': os.environ.get('PASSWORD_HASHING_EXECUTOR', 'thread'),
+    'WORKERS': None,
+    'MAX_PENDING': 256,
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
@@ -132,6 +207,9 @@ CORS_ALLOW_HEADERS = (
     "accept",
     "authorization",
     "content-type",
+    "if-match",
+    "if-modified-since",
+    "if-none-match",
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
@@ -146,11 +224,30 @@ CORS_ALLOW_METHODS = (
     "PUT",
 )
 
+CORS_EXPOSE_HEADERS = (
+    "etag",
+    "last-modified",
+)
+
 CORS_ALLOWED_ORIGINS = []
 
-# drf_spectacular settings
 REST_FRAMEWORK = {
+    # drf_spectacular settings
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Per-client token buckets, see API_THROTTLE below
+    'DEFAULT_THROTTLE_CLASSES': ['api.throttling.TokenBucketThrottle'],
+    'EXCEPTION_HANDLER': 'api.throttling.exception_handler',
+    # Throttled clients are told apart by REMOTE_ADDR. Behind reverse proxies
+    # set API_NUM_PROXIES to their number to read the address from
+    # X-Forwarded-For instead; that header is never trusted as sent.
+    'NUM_PROXIES': int(os.environ.get('API_NUM_PROXIES', 0)),
+    # JSON through orjson and, when msgpack is installed, MessagePack for
+    # clients sending Accept: application/msgpack (see api/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        *(['api.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
@@ -160,3 +257,117 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
 }
 
+# /api/schema/ serves the files written here by `manage.py build_api_schema`
+# and only generates the schema itself when they are missing.
+API_SCHEMA_DIR = Path(os.environ.get('API_SCHEMA_DIR', BASE_DIR / 'schema'))
+
+
+# Per-client rate limits (see api/throttling.py). Each scope is a token
+# bucket refilled at RATE requests per second that holds up to BURST. The
+# buckets live in the cache, so set TASK_CACHE_URL to share them between
+# workers; without a reachable cache every process limits on its own.
+API_THROTTLE = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'default',
+    'SCOPES': {
+        'read': {'RATE': 50, 'BURST': 100},
+        'write': {'RATE': 10, 'BURST': 30},
+        'bulk': {'RATE': 1, 'BURST': 5},
+    },
+}
+
+# Load shedding per worker process (see api/middleware.py). Requests beyond
+# MAX_IN_FLIGHT, or that waited longer than MAX_QUEUE_MS in the proxy
+# according to X-Request-Start, get an immediate 503.
+LOAD_SHEDDING = {
+    'ENABLED': True,
+    'MAX_IN_FLIGHT': int(os.environ.get('LOAD_SHEDDING_MAX_IN_FLIGHT', 64)),
+    'TARGET_LATENCY_MS': 500,
+    'MAX_QUEUE_MS': 2000,
+    'RETRY_AFTER_SECONDS': 1,
+    'EXEMPT_PATHS': ('/api/metrics/',),
+}
+
+# Response compression (see api/middleware.py). Bodies of at least MIN_SIZE
+# bytes are sent with brotli when the client accepts it and the brotli
+# package is installed, else gzip. Turn it off when the proxy compresses.
+RESPONSE_COMPRESSION = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+}
+
+
+# Idempotency-Key support for POST, PUT and PATCH (see api/idempotency.py).
+# Responses are replayed to retries for TTL_SECONDS; a duplicate of a
+# request still running waits up to WAIT_SECONDS, then gets a 409.
+# LOCK_SECONDS must exceed the longest request.
+IDEMPOTENCY = {
+    'ENABLED': True,
+    'TTL_SECONDS': int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 60 * 60)),
+    'LOCK_SECONDS': 60,
+    'WAIT_SECONDS': 5,
+    'POLL_SECONDS': 0.05,
+}
+
+
+# Task list pagination
+TASK_LIST_PAGE_SIZE = 50
+TASK_LIST_MAX_PAGE_SIZE = 500
+
+# Number of rows fetched per database round trip by /api/tasks/export/
+TASK_EXPORT_CHUNK_SIZE = 2000
+
+# Bulk task endpoints (/api/tasks/bulk/)
+TASK_BULK_BATCH_SIZE = 500
+TASK_BULK_MAX_ITEMS = 50000
+
+# Task change feed (/api/tasks/changes/)
+# Changes newer than this many seconds are held back until concurrent
+# transactions that stamped an earlier updated_at have had time to commit.
+# Bulk writes stamp their rows as their last write, so this must cover the
+# stamp, the bulk receivers and the commit for TASK_BULK_MAX_ITEMS tasks
+# (about 3s for 50000 tasks on SQLite), not the whole transaction.
+TASK_CHANGES_SETTLE_SECONDS = 5
+# Tombstones older than this are pruned by `manage.py prune_task_tombstones`;
+# clients whose resume token is older must sync from scratch.
+TASK_TOMBSTONE_RETENTION_DAYS = 30
+
+# Task archive (see api/archive.py)
+# `manage.py archive_tasks` moves DONE tasks not updated for AGE_DAYS to the
+# archive table, BATCH_SIZE per transaction with a PAUSE_SECONDS break
+# between batches.
+TASK_ARCHIVE = {
+    'AGE_DAYS': int(os.environ.get('TASK_ARCHIVE_AGE_DAYS', 90)),
+    'BATCH_SIZE': 1000,
+    'PAUSE_SECONDS': 0.05,
+}
+
+# Background jobs (/api/jobs/, run by `manage.py run_jobs`, see api/jobs.py)
+# A worker must renew its claim within LEASE_SECONDS or another worker takes
+# the job over. Failed attempts are retried after RETRY_BASE_SECONDS, doubling
+# up to RETRY_MAX_SECONDS. PROCESSES defaults to the number of CPUs. A
+# users.import job takes at most MAX_IMPORT_USERS users.
+JOBS = {
+    'LEASE_SECONDS': 300,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BASE_SECONDS': 10,
+    'RETRY_MAX_SECONDS': 3600,
+    'POLL_SECONDS': 1,
+    'PROCESSES': None,
+    'MAX_IMPORT_USERS': 10000,
+}
+
+# Task event stream (/api/async/tasks/events/, see api/events.py)
+# The in-memory broker only reaches clients connected to the same process;
+# with several workers set TASK_EVENTS_BROKER_URL to share events via Redis.
+TASK_EVENTS_BROKER_URL = os.environ.get('TASK_EVENTS_BROKER_URL', '')
+
+TASK_EVENTS = {
+    'BROKER': 'api.events.RedisBroker' if TASK_EVENTS_BROKER_URL else 'api.events.InMemoryBroker',
+    'BROKER_URL': TASK_EVENTS_BROKER_URL,
+    'QUEUE_SIZE': 256,
+    'MAX_SUBSCRIBERS': 10000,
+    'HEARTBEAT_SECONDS': 15,
+}
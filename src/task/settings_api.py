@@ -0,0 +1,42 @@
+"""
+API-only settings for production workers:
+
+    DJANGO_SETTINGS_MODULE=task.settings_api gunicorn task.wsgi
+
+Leaves out the admin, sessions, messages, static files and drf_spectacular,
+the middleware that only serves them, and the browsable API. Build the
+schema served on /api/schema/ beforehand with the full settings:
+
+    python manage.py build_api_schema
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK, TEMPLATES
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in (
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'drf_spectacular',
+)]
+
+# CSRF protection only matters for cookie authentication, which this
+# profile does not offer.
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in (
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+)]
+
+TEMPLATES = [{**TEMPLATES[0], 'OPTIONS': {'context_processors': []}}]
+
+REST_FRAMEWORK = {
+    **{key: value for key, value in REST_FRAMEWORK.items() if key != 'DEFAULT_SCHEMA_CLASS'},
+    'DEFAULT_RENDERER_CLASSES': [
+        renderer for renderer in REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']
+        if renderer != 'rest_framework.renderers.BrowsableAPIRenderer'
+    ],
+    'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework.authentication.BasicAuthentication'],
+}
@@ -0,0 +1,24 @@
+"""
+Settings for running the read replica tests against two SQLite files:
+
+    python manage.py test api --settings=task.settings_replica_test
+
+Nothing replicates between the files, which lets the tests tell which
+database served a request.
+"""
+import tempfile
+from pathlib import Path
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+TEST_DIR = Path(tempfile.gettempdir())
+
+DATABASES = {
+    'default': {**DATABASES['default'], 'TEST': {'NAME': TEST_DIR / 'test-primary.sqlite3'}},
+    'replica1': {
+        **DATABASES['default'],
+        'NAME': TEST_DIR / 'replica1.sqlite3',
+        'TEST': {'NAME': TEST_DIR / 'test-replica1.sqlite3'},
+    },
+}
+DATABASE_REPLICAS = ['replica1']
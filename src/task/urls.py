@@ -1,7 +1,11 @@
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
 
 urlpatterns = [
     path('api/', include('api.urls')),
-    path('admin/', admin.site.urls),
 ]
+
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.append(path('admin/', admin.site.urls))